@@ -0,0 +1,74 @@
+"""
+Microbenchmark of the per-turn argument validation of the env's evaluators.
+
+Every turn, `ParallelSotopiaEnv` passes its whole inbox to each evaluator and
+aggregates their responses. This times that step over growing inboxes, with
+every call validated and with the internal calls trusted (the default).
+
+    python examples/benchmark_validate_call.py --turns 20 --turns 100
+"""
+
+import timeit
+
+import typer
+
+from sotopia.envs.evaluators import (
+    RuleBasedTerminatedEvaluator,
+    unweighted_aggregate_evaluate,
+)
+from sotopia.messages import AgentAction, Message, SimpleMessage
+from sotopia.utils import set_trust_internal_calls, trusted_internal_calls
+
+app = typer.Typer()
+
+
+def build_inbox(turns: int) -> list[tuple[str, Message]]:
+    inbox: list[tuple[str, Message]] = []
+    for turn_number in range(1, turns + 1):
+        inbox.append(("Environment", SimpleMessage(message=f"Turn #{turn_number}")))
+        inbox.append(
+            (
+                "Alice" if turn_number % 2 else "Bob",
+                AgentAction(action_type="speak", argument=f"Message {turn_number}"),
+            )
+        )
+    return inbox
+
+
+def evaluate_turn(
+    evaluator: RuleBasedTerminatedEvaluator, inbox: list[tuple[str, Message]]
+) -> None:
+    with trusted_internal_calls():
+        unweighted_aggregate_evaluate(evaluator(turn_number=1, messages=inbox))
+
+
+@app.command()
+def main(
+    turns: list[int] = typer.Option([10, 20, 50, 100], help="inbox sizes, in turns"),
+    repeat: int = typer.Option(200, help="evaluations per inbox size"),
+) -> None:
+    evaluator = RuleBasedTerminatedEvaluator(max_turn_number=1000)
+    print(f"{'turns':>6} {'validated (us)':>15} {'trusted (us)':>13} {'speedup':>8}")
+    for turn_count in turns:
+        inbox = build_inbox(turn_count)
+        timings = []
+        for trusted in (False, True):
+            set_trust_internal_calls(trusted)
+            timings.append(
+                min(
+                    timeit.repeat(
+                        lambda: evaluate_turn(evaluator, inbox), number=repeat, repeat=5
+                    )
+                )
+                / repeat
+                * 1e6
+            )
+        validated, trusted_time = timings
+        print(
+            f"{turn_count:>6} {validated:>15.1f} {trusted_time:>13.1f} {validated / trusted_time:>7.1f}x"
+        )
+    set_trust_internal_calls(True)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,80 @@
+"""
+Load test of the waiting room against a real Redis.
+
+Thousands of clients poll `WaitingRoom.join` concurrently, as the chat server
+sees them, until every one of them is paired. This checks that each client is
+matched exactly once and reports how long the matchmaking took. The waiting
+room uses its own keys, so it does not touch the chat server's clients.
+
+    REDIS_OM_URL=redis://localhost:6379 python examples/benchmark_waiting_room.py --clients 2000
+"""
+
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import typer
+
+from sotopia.database import WaitingRoom, WaitingRoomMatch
+
+app = typer.Typer()
+
+
+class BenchmarkWaitingRoom(WaitingRoom):
+    key_prefix = "sotopia:waiting_room_benchmark"
+    channel = "sotopia:waiting_room_benchmark:matches"
+
+
+@app.command()
+def main(
+    clients: int = typer.Option(2000, help="number of concurrent joiners"),
+    poll_interval: float = typer.Option(0.01, help="seconds between two polls"),
+    redis_url: str = typer.Option(
+        os.environ.get("REDIS_OM_URL", "redis://localhost:6379"),
+        help="the Redis to run against",
+    ),
+) -> None:
+    waiting_room = BenchmarkWaitingRoom(
+        timeout=3600, db=redis.Redis.from_url(redis_url)
+    )
+    waiting_room.clear()
+    client_ids = [f"benchmark_client_{uuid.uuid4()}" for _ in range(clients)]
+    matches: list[WaitingRoomMatch] = []
+
+    def poll_until_matched(client_id: str) -> tuple[str, int]:
+        joins = 0
+        while True:
+            session_id, match = waiting_room.join(client_id)
+            joins += 1
+            if match is not None:
+                matches.append(match)
+            if session_id:
+                return session_id, joins
+            time.sleep(poll_interval)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            session_ids, joins = zip(*executor.map(poll_until_matched, client_ids))
+    finally:
+        waiting_room.clear()
+    elapsed = time.perf_counter() - start
+
+    # everyone is paired exactly once, with the session id of their match
+    assert len(set(session_ids)) == clients
+    assert all(len(match.client_ids) == 2 for match in matches)
+    assert Counter(
+        client_id for match in matches for client_id in match.client_ids
+    ) == Counter(client_ids)
+    total_joins = sum(joins)
+    print(
+        f"matched {clients} clients in {elapsed:.2f}s: "
+        f"{total_joins} joins, {total_joins / elapsed:.0f} joins/s"
+    )
+
+
+if __name__ == "__main__":
+    app()
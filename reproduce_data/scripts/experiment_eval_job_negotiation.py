@@ -256,8 +256,8 @@ def run_async_server_in_batch(
     
 
     # agent_1_filter = lambda agent: AgentProfile.get(agent).occupation == "Hiring Manager"
-    agent_1_filter = lambda agent: AgentProfile.get(agent).first_name == "AI"
-    agent_2_filter = lambda agent: AgentProfile.get(agent).occupation == "Candidate"
+    agent_1_filter = lambda agent: agent.first_name == "AI"
+    agent_2_filter = lambda agent: agent.occupation == "Candidate"
     filters = [agent_1_filter, agent_2_filter]
     print(len(env_ids))
     logging.info("Total number of envs: ", len(env_ids))
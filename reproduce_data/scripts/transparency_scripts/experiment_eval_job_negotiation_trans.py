@@ -287,8 +287,8 @@ def run_async_server_in_batch(
         rich_handler = logger.handlers[0]
         logger.removeHandler(rich_handler)
 
-    agent_1_filter = lambda agent: AgentProfile.get(agent).first_name == "AI"
-    agent_2_filter = lambda agent: AgentProfile.get(agent).occupation == "Candidate"
+    agent_1_filter = lambda agent: agent.first_name == "AI"
+    agent_2_filter = lambda agent: agent.occupation == "Candidate"
     filters = [agent_1_filter, agent_2_filter]
 
     logging.info("Total number of envs: %d", len(env_ids))
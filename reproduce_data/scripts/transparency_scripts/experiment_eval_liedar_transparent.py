@@ -262,7 +262,7 @@ def run_async_server_in_batch(
     
 
     # agent_1_filter = lambda agent: AgentProfile.get(agent).occupation == "Hiring Manager"
-    agent_1_filter = lambda agent: AgentProfile.get(agent).first_name == "AI"
+    agent_1_filter = lambda agent: agent.first_name == "AI"
     print("Agent 1 filter", agent_1_filter)
     allowed_pks = [
     '01H5TNE5PP870BS5HP2FPPKS2Y',
@@ -281,7 +281,7 @@ def run_async_server_in_batch(
     ]
 
     # candidate_profiles = [agent for agent in agent_profiles if agent.pk in allowed_pks]
-    agent_2_filter = lambda agent: AgentProfile.get(agent).pk in allowed_pks
+    agent_2_filter = lambda agent: agent.pk in allowed_pks
     print("Agent 2 filter", agent_2_filter)
     # agent_2_filter = lambda agent: AgentProfile.get(agent).occupation == "Candidate"
     filters = [agent_1_filter, agent_2_filter]
@@ -214,28 +214,31 @@ async def async_start_server_with_session_ids(session_ids: list[str]) -> None:
                 session_id, agent_env_combo_pk, "right"
             )
 
-    match len(session_ids):
-        case 1:
-            await _assign_left_or_right_and_run(session_ids[0])
-        case 2:
-            if await r.llen("chat_server_combos_double") == 0:
-                await gather(
-                    *[
-                        _assign_left_or_right_and_run(session_id)
-                        for session_id in session_ids
-                    ]
+    try:
+        match len(session_ids):
+            case 1:
+                await _assign_left_or_right_and_run(session_ids[0])
+            case 2:
+                if await r.llen("chat_server_combos_double") == 0:
+                    await gather(
+                        *[
+                            _assign_left_or_right_and_run(session_id)
+                            for session_id in session_ids
+                        ]
+                    )
+                else:
+                    agent_env_combo_pk: str = (
+                        await r.rpop("chat_server_combos_double")
+                    ).decode("utf-8")
+                    await _start_server_with_two_session_ids_and_agent_env_combo(
+                        session_ids, agent_env_combo_pk
+                    )
+            case _:
+                raise ValueError(
+                    f"Only 1 or 2 session ids are supported, but got {len(session_ids)}"
                 )
-            else:
-                agent_env_combo_pk: str = (
-                    await r.rpop("chat_server_combos_double")
-                ).decode("utf-8")
-                await _start_server_with_two_session_ids_and_agent_env_combo(
-                    session_ids, agent_env_combo_pk
-                )
-        case _:
-            raise ValueError(
-                f"Only 1 or 2 session ids are supported, but got {len(session_ids)}"
-            )
+    finally:
+        await redis_agent.aclose_http_session()
 
 
 @app.command()
@@ -5,10 +5,9 @@ import random
 import subprocess
 import typing
 import uuid
-from datetime import datetime
+import weakref
 from typing import Literal, cast
 
-import pydantic
 import pytest
 from fastapi import Body
 from fastapi.applications import FastAPI
@@ -16,16 +15,18 @@ from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.testclient import TestClient
 from redis import Redis
-from redis.lock import Lock
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio import Redis as AsyncRedis
 from redis_om import Migrator
 from starlette.responses import Response
 
 from sotopia.database import (
     AgentProfile,
     EpisodeLog,
-    MatchingInWaitingRoom,
     MessageTransaction,
+    SessionMessageStream,
     SessionTransaction,
+    WaitingRoom,
 )
 
 Migrator().run()
@@ -42,7 +43,30 @@ app.add_middleware(
 
 conn = Redis.from_url(os.environ["REDIS_OM_URL"])
 
+# Longest a /wait request is held before returning no message
+MAX_WAIT_SECONDS = 60.0
+# A blocked XREAD holds its connection, so this bounds the /wait requests
+# blocked at once; the ones over it queue for a connection
+MAX_WAIT_CONNECTIONS = int(os.environ.get("MAX_WAIT_CONNECTIONS", 1000))
+
+_wait_conns: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedis[bytes]]" = weakref.WeakKeyDictionary()
+
+
+def _get_wait_conn() -> "AsyncRedis[bytes]":
+    """The async client of the /wait requests, one per event loop (i.e. one under uvicorn)."""
+    loop = asyncio.get_running_loop()
+    wait_conn = _wait_conns.get(loop)
+    if wait_conn is None:
+        wait_conn = _wait_conns[loop] = AsyncRedis(
+            connection_pool=BlockingConnectionPool.from_url(
+                os.environ["REDIS_OM_URL"], max_connections=MAX_WAIT_CONNECTIONS
+            )
+        )
+    return wait_conn
+
+
 WAITING_ROOM_TIMEOUT = float(os.environ.get("WAITING_ROOM_TIMEOUT", 1.0))
+waiting_room = WaitingRoom(timeout=WAITING_ROOM_TIMEOUT, db=conn)
 
 
 @app.post("/connect/{session_id}/{role}/{id}")
@@ -75,11 +99,15 @@ async def connect(
             session_transaction = session_transactions[0]
             session_transaction.client_id = id
             session_transaction.save()
-            return session_transaction.message_list
+            return session_transaction.message_list + _stream(session_id).range()
         else:
             raise HTTPException(status_code=500, detail="Session exists")
 
 
+def _stream(session_id: str) -> SessionMessageStream:
+    return SessionMessageStream(session_id, db=conn)
+
+
 async def _get_single_exist_session(session_id: str) -> SessionTransaction:
     session_transactions = cast(
         list[SessionTransaction],
@@ -100,7 +128,12 @@ async def send(
     session_id: str,
     sender_id: str,
     message: str = Body(...),
+    full_history: bool = False,
 ) -> list[MessageTransaction]:
+    """
+    Append `message` to the session and return it, with the stream id to
+    `/get` or `/wait` after; `full_history` returns the whole history instead.
+    """
     session_transaction = await _get_single_exist_session(session_id)
     sender: str = ""
     if sender_id == session_transaction.server_id:
@@ -116,18 +149,12 @@ async def send(
     else:
         raise HTTPException(status_code=401, detail="Unauthorized sender")
 
-    session_transaction.message_list.append(
-        MessageTransaction(
-            timestamp_str=str(datetime.now().timestamp()),
-            sender=sender,
-            message=message,
-        )
-    )
-    try:
-        session_transaction.save()
-    except pydantic.error_wrappers.ValidationError:
-        raise HTTPException(status_code=500, detail="timestamp error")
-    return session_transaction.message_list
+    # an O(1) append instead of rewriting the session
+    stream = _stream(session_id)
+    sent = stream.append(sender, message)
+    if full_history:
+        return session_transaction.message_list + stream.range()
+    return [sent]
 
 
 @app.put("/lock/{session_id}/{server_id}/{lock}")
@@ -143,9 +170,31 @@ async def lock(
 
 
 @app.get("/get/{session_id}")
-async def get(session_id: str) -> list[MessageTransaction]:
+async def get(session_id: str, after_id: str = "") -> list[MessageTransaction]:
+    """The messages after the stream entry `after_id`, or the whole history."""
     session_transaction = await _get_single_exist_session(session_id)
-    return session_transaction.message_list
+    messages = _stream(session_id).range(after_id)
+    # sessions created before the messages moved to streams
+    return messages if after_id else session_transaction.message_list + messages
+
+
+@app.get("/wait/{session_id}")
+async def wait(
+    session_id: str, after_id: str = "0", timeout: float = MAX_WAIT_SECONDS
+) -> list[MessageTransaction]:
+    """
+    The messages after the stream entry `after_id`, blocking until one is
+    sent or `timeout` seconds have passed (then the list is empty).
+    """
+    await _get_single_exist_session(session_id)
+    response = await _get_wait_conn().xread(
+        {_stream(session_id).key: after_id or "0"},
+        block=max(1, int(min(timeout, MAX_WAIT_SECONDS) * 1000)),
+    )
+    if not response:
+        return []
+    [(_, entries)] = response
+    return SessionMessageStream.parse_entries(entries)
 
 
 @app.delete("/delete/{session_id}/{server_id}")
@@ -154,6 +203,7 @@ async def delete(session_id: str, server_id: str) -> str:
     if server_id != session_transaction.server_id:
         raise HTTPException(status_code=401, detail="Unauthorized sender")
     session_transaction.delete(session_transaction.pk)
+    _stream(session_id).delete()
     return "success"
 
 
@@ -177,72 +227,18 @@ def _start_server(session_ids: list[str]) -> None:
 
 @app.get("/enter_waiting_room/{sender_id}")
 async def enter_waiting_room(sender_id: str) -> str:
-    matchings_in_waiting_room = cast(
-        list[MatchingInWaitingRoom],
-        MatchingInWaitingRoom.find().all(),
-    )
-    for matching_in_waiting_room in matchings_in_waiting_room:
-        if sender_id in matching_in_waiting_room.client_ids:
-            index = matching_in_waiting_room.client_ids.index(sender_id)
-            match index:
-                case 0:
-                    if len(matching_in_waiting_room.client_ids) > 1:
-                        _start_server(matching_in_waiting_room.session_ids)
-                        matching_in_waiting_room.session_id_retrieved[0] = "true"
-                        return matching_in_waiting_room.session_ids[0]
-                    else:
-                        if (
-                            datetime.now().timestamp()
-                            - matching_in_waiting_room.timestamp
-                            > WAITING_ROOM_TIMEOUT
-                        ):
-                            MatchingInWaitingRoom.delete(matching_in_waiting_room.pk)
-                            _start_server(matching_in_waiting_room.session_ids)
-                            return matching_in_waiting_room.session_ids[0]
-                        else:
-                            return ""
-                case 1:
-                    if matching_in_waiting_room.session_id_retrieved[0]:
-                        if (
-                            datetime.now().timestamp()
-                            - matching_in_waiting_room.timestamp
-                            > WAITING_ROOM_TIMEOUT
-                        ):
-                            MatchingInWaitingRoom.delete(matching_in_waiting_room.pk)
-                            _start_server(matching_in_waiting_room.session_ids[1:])
-                            return matching_in_waiting_room.session_ids[1]
-                        else:
-                            return ""
-                    else:
-                        matching_in_waiting_room.session_id_retrieved[1] = "true"
-                        MatchingInWaitingRoom.delete(matching_in_waiting_room.pk)
-                        return matching_in_waiting_room.session_ids[1]
-                case _:
-                    assert False, f"{matching_in_waiting_room} has more than 2 clients, not expected"
-    else:
-        lock = Lock(conn, "lock:check_available_spots")
-        with lock:
-            matchings_in_waiting_room = cast(
-                list[MatchingInWaitingRoom],
-                MatchingInWaitingRoom.find().all(),
-            )
-            for matching_in_waiting_room in matchings_in_waiting_room:
-                if len(matching_in_waiting_room.client_ids) == 1:
-                    matching_in_waiting_room.timestamp = datetime.now().timestamp()
-                    matching_in_waiting_room.client_ids.append(sender_id)
-                    matching_in_waiting_room.session_ids.append(str(uuid.uuid4()))
-                    matching_in_waiting_room.session_id_retrieved.append("")
-                    matching_in_waiting_room.save()
-                    return ""
-
-        matching_in_waiting_room = MatchingInWaitingRoom(
-            timestamp=datetime.now().timestamp(),
-            client_ids=[sender_id],
-            session_ids=[str(uuid.uuid4())],
-            session_id_retrieved=[""],
-        )
-        matching_in_waiting_room.save()
-        return ""
+    """Poll until the returned session id is not empty."""
+    session_id, match = waiting_room.join(sender_id)
+    if match is not None:
+        # only the request that formed the match starts its server
+        _start_server(match.session_ids)
+    return session_id
+
+
+@app.delete("/leave_waiting_room/{sender_id}")
+async def leave_waiting_room(sender_id: str) -> str:
+    waiting_room.leave(sender_id)
+    return "success"
 
 
 class PrettyJSONResponse(Response):
@@ -309,6 +305,8 @@ def test_send_message() -> None:
         json="hello",
     )
     assert response.status_code == 200
+    [sent] = response.json()
+    assert sent["sender"] == "server" and sent["message"] == "hello"
 
     sessions = cast(
         list[SessionTransaction],
@@ -317,11 +315,49 @@ def test_send_message() -> None:
     assert len(sessions) == 1
     assert sessions[0].server_id == server_id
     assert sessions[0].client_id == ""
-    assert len(sessions[0].message_list) == 1
 
-    message = sessions[0].message_list[0]
-    assert message.sender == "server"
-    assert message.message == "hello"
+    response = client.get(f"/get/{session_id}")
+    assert response.status_code == 200
+    assert response.json() == [sent]
+    response = client.get(f"/get/{session_id}", params={"after_id": sent["stream_id"]})
+    assert response.json() == []
+
+    # /send returns the whole history of the session only when asked to
+    response = client.post(f"/send/{session_id}/{server_id}", json="hi")
+    assert [message["message"] for message in response.json()] == ["hi"]
+    response = client.post(
+        f"/send/{session_id}/{server_id}",
+        json="bye",
+        params={"full_history": True},
+    )
+    assert [message["message"] for message in response.json()] == [
+        "hello",
+        "hi",
+        "bye",
+    ]
+    client.delete(f"/delete/{session_id}/{server_id}")
+
+
+def test_wait() -> None:
+    session_id = str(uuid.uuid4())
+    server_id = str(uuid.uuid4())
+    response = client.post(f"/connect/{session_id}/server/{server_id}")
+    assert response.status_code == 200
+    response = client.post(f"/send/{session_id}/{server_id}", json="hello")
+    assert response.status_code == 200
+    stream_id = response.json()[-1]["stream_id"]
+
+    # a message after `after_id` is returned right away
+    response = client.get(f"/wait/{session_id}", params={"timeout": 5})
+    assert response.status_code == 200
+    assert [message["message"] for message in response.json()] == ["hello"]
+    # otherwise nothing is returned after the timeout
+    response = client.get(
+        f"/wait/{session_id}", params={"after_id": stream_id, "timeout": 0.2}
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+    client.delete(f"/delete/{session_id}/{server_id}")
 
 
 @pytest.mark.asyncio
@@ -9,7 +9,7 @@ from sotopia.generation_utils.generate import (
     agenerate_goal,
     agenerate_script,
 )
-from sotopia.messages import AgentAction, Observation
+from sotopia.messages import AgentAction, Message, Observation
 from sotopia.messages.message_classes import ScriptBackground
 
 
@@ -36,6 +36,21 @@ class LLMAgent(BaseAgent[Observation, AgentAction]):
         )
         self.model_name = model_name
         self.script_like = script_like
+        # natural language rendering of each inbox message, kept in sync with
+        # the inbox so that the prompt history is not re-rendered every turn
+        self._rendered_inbox: list[str] = []
+
+    def recv_message(self, source: str, message: Message) -> None:
+        super().recv_message(source, message)
+        self._rendered_inbox.append(message.to_natural_language())
+
+    def reset_inbox(self) -> None:
+        super().reset_inbox()
+        self._rendered_inbox = []
+
+    def rendered_history(self, start: int = 0) -> str:
+        """The inbox messages from index `start` on, one rendered message per line."""
+        return "\n".join(self._rendered_inbox[start:])
 
     @property
     def goal(self) -> str:
@@ -60,9 +75,8 @@ class LLMAgent(BaseAgent[Observation, AgentAction]):
         if self._goal is None:
             self._goal = await agenerate_goal(
                 self.model_name,
-                background=self.inbox[0][
-                    1
-                ].to_natural_language(),  # Only consider the first message for now
+                # Only consider the first message for now
+                background=self._rendered_inbox[0],
             )
 
         if len(obs.available_actions) == 1 and "none" in obs.available_actions:
@@ -70,7 +84,7 @@ class LLMAgent(BaseAgent[Observation, AgentAction]):
         else:
             action = await agenerate_action(
                 self.model_name,
-                history="\n".join(f"{y.to_natural_language()}" for x, y in self.inbox),
+                history=self.rendered_history(),
                 turn_number=obs.turn_number,
                 action_types=obs.available_actions,
                 agent=self.agent_name,
@@ -114,9 +128,7 @@ class ScriptWritingAgent(LLMAgent):
 
     async def aact(self, obs: Observation) -> AgentAction:
         self.recv_message("Environment", obs)
-        message_to_compose = [y for idx, (x, y) in enumerate(self.inbox) if idx != 0]
-
-        history = "\n".join(f"{y.to_natural_language()}" for y in message_to_compose)
+        history = self.rendered_history(start=1)
 
         action, prompt = await agenerate_script(
             model_name=self.model_name,
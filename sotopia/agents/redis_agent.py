@@ -1,16 +1,47 @@
 import asyncio
 import logging
 import os
+import weakref
 from uuid import uuid4
 
 import aiohttp
 import pydantic
-import requests
 
 from sotopia.agents import BaseAgent
 from sotopia.database import AgentProfile, MessageTransaction
 from sotopia.messages import AgentAction, Observation
 
+# Seconds to wait for the client to post their message before leaving
+CLIENT_MESSAGE_TIMEOUT = 300.0
+# Seconds a single long-polling request is held by the server
+LONG_POLL_SECONDS = 30.0
+
+_http_sessions: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, aiohttp.ClientSession
+] = weakref.WeakKeyDictionary()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """The aiohttp session shared by the RedisAgents running on the current event loop."""
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        session = _http_sessions[loop] = aiohttp.ClientSession()
+    return session
+
+
+async def aclose_http_session() -> None:
+    """Close the shared session of the current event loop, e.g. before the loop shuts down."""
+    session = _http_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def _parse_message_list(
+    message_list: list[dict[str, str]],
+) -> list[MessageTransaction]:
+    return [MessageTransaction.parse_obj(x) for x in message_list]
+
 
 class RedisAgent(BaseAgent[Observation, AgentAction]):
     """An agent use redis as a message broker."""
@@ -32,21 +63,74 @@ class RedisAgent(BaseAgent[Observation, AgentAction]):
         self.sender_id = str(uuid4())
         self.model_name = "redis"
         print(f"session id: {self.session_id}")
-        print("step 1: connect to the server")
         assert (
             "FASTAPI_URL" in os.environ
         ), "To use redis agent, you have to launch a FastAPI server and set FASTAPI_URL"
         self._URL = os.environ["FASTAPI_URL"]
-        response = requests.request(
-            "POST",
-            f"{self._URL}/connect/{self.session_id}/server/{self.sender_id}",
-        )
-        assert (
-            response.status_code == 200 and response.text == "[]"
-        ), "Failed to connect to the server"
+        self._background_tasks: set[asyncio.Task[None]] = set()
+        # connect right away when constructed in async code, otherwise on the first action
+        self._connection: asyncio.Task[None] | None = None
+        try:
+            self._connection = asyncio.get_running_loop().create_task(self._aconnect())
+        except RuntimeError:
+            pass
         logging.info(f"Session ID: {self.session_id}")
         # logging.info(f"Sender ID: {self.sender_id}")
 
+    async def _aconnect(self) -> None:
+        print("step 1: connect to the server")
+        async with get_http_session().post(
+            f"{self._URL}/connect/{self.session_id}/server/{self.sender_id}"
+        ) as response:
+            assert (
+                response.status == 200 and await response.text() == "[]"
+            ), "Failed to connect to the server"
+
+    async def _ensure_connected(self) -> None:
+        if self._connection is None:
+            self._connection = asyncio.ensure_future(self._aconnect())
+        await self._connection
+
+    async def _send(
+        self, data: str | None = None, json: str | None = None
+    ) -> list[MessageTransaction]:
+        async with get_http_session().post(
+            f"{self._URL}/send/{self.session_id}/{self.sender_id}",
+            data=data,
+            json=json,
+        ) as response:
+            assert response.status == 200, response
+            return _parse_message_list(await response.json())
+
+    async def _set_client_lock(self, lock: str) -> None:
+        async with get_http_session().put(
+            f"{self._URL}/lock/{self.session_id}/{self.sender_id}/{lock}"
+        ) as response:
+            assert response.status == 200, response
+
+    async def _wait_for_client_message(
+        self, last_stream_id: str
+    ) -> MessageTransaction | None:
+        """Block on the session's stream until the client posts after `last_stream_id`, or None on timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CLIENT_MESSAGE_TIMEOUT
+        while (remaining := deadline - loop.time()) > 0:
+            async with get_http_session().get(
+                f"{self._URL}/wait/{self.session_id}",
+                params={
+                    "after_id": last_stream_id,
+                    "timeout": str(min(remaining, LONG_POLL_SECONDS)),
+                },
+            ) as response:
+                assert response.status == 200, response
+                new_messages = _parse_message_list(await response.json())
+            for message in new_messages:
+                if message.sender == "client":
+                    return message
+            if new_messages:
+                last_stream_id = new_messages[-1].stream_id
+        return None
+
     def act(
         self,
         obs: Observation,
@@ -58,87 +142,30 @@ class RedisAgent(BaseAgent[Observation, AgentAction]):
         obs: Observation,
     ) -> AgentAction:
         self.recv_message("Environment", obs)
+        await self._ensure_connected()
 
         if len(obs.available_actions) == 1 and "none" in obs.available_actions:
             if obs.turn_number == 0:
-                async with aiohttp.ClientSession() as session:
-                    print("step 2: post observation to the message list")
-                    response = await session.request(
-                        "POST",
-                        f"{self._URL}/send/{self.session_id}/{self.sender_id}",
-                        data=obs.to_natural_language(),
-                    )
-                    assert response.status == 200, response
-                    sorted_message_list: list[tuple[float, str, str]] = list(
-                        map(
-                            lambda x: MessageTransaction.parse_obj(x).to_tuple(),
-                            await response.json(),
-                        )
-                    )
-                    last_timestamp = sorted_message_list[-1][0]
+                print("step 2: post observation to the message list")
+                await self._send(data=obs.to_natural_language())
             return AgentAction(action_type="none", argument="")
         else:
-            async with aiohttp.ClientSession() as session:
-                # 1. post observation to the message list
-                response = await session.request(
-                    "POST",
-                    f"{self._URL}/send/{self.session_id}/{self.sender_id}",
-                    data=obs.to_natural_language(),
-                )
-                assert response.status == 200, response
-                sorted_message_list = list(
-                    map(
-                        lambda x: MessageTransaction.parse_obj(x).to_tuple(),
-                        await response.json(),
-                    )
-                )
-                last_timestamp = sorted_message_list[-1][0]
+            # 1. post observation to the message list
+            sent_messages = await self._send(data=obs.to_natural_language())
+            last_stream_id = sent_messages[-1].stream_id
 
-                print("step 2: unlock the server for the client")
-                # 2. unlock the server for the client
-                response = await session.request(
-                    "PUT",
-                    f"{self._URL}/lock/{self.session_id}/{self.sender_id}/action",
-                )
-                assert response.status == 200, response
+            print("step 2: unlock the server for the client")
+            # 2. unlock the server for the client
+            await self._set_client_lock("action")
 
-                print("step 3: wait for the client to post their message")
-                # 3. wait for the client to post their message
-                for _ in range(300):
-                    response = await session.request(
-                        "GET",
-                        f"{self._URL}/get/{self.session_id}",
-                    )
-                    # print(f"get response: {response}")
-                    assert response.status == 200, response
-                    sorted_message_list = list(
-                        map(
-                            lambda x: MessageTransaction.parse_obj(x).to_tuple(),
-                            await response.json(),
-                        )
-                    )
-                    if (
-                        sorted_message_list[-1][0] > last_timestamp
-                        and sorted_message_list[-1][1] == "client"
-                    ):
-                        # 3.a if the client has posted their message, lock the server for the client
-                        response = await session.request(
-                            "PUT",
-                            f"{self._URL}/lock/{self.session_id}/{self.sender_id}/no%20action",
-                        )
-                        assert response.status == 200, response
-                        break
-                    else:
-                        # 3.b if the client has not posted their message, wait for 0.1 second and retry
-                        await asyncio.sleep(1)
-                else:
-                    response = await session.request(
-                        "PUT",
-                        f"{self._URL}/lock/{self.session_id}/{self.sender_id}/no%20action",
-                    )
-                    self.reset("Someone has left or the conversation is too long.")
-                    return AgentAction(action_type="leave", argument="")
-            action_string = sorted_message_list[-1][2]
+            print("step 3: wait for the client to post their message")
+            # 3. wait for the client to post their message, then lock the server for the client
+            client_message = await self._wait_for_client_message(last_stream_id)
+            await self._set_client_lock("no%20action")
+            if client_message is None:
+                await self.areset("Someone has left or the conversation is too long.")
+                return AgentAction(action_type="leave", argument="")
+            action_string = client_message.message
             try:
                 action = AgentAction.model_validate_json(action_string)
                 return action
@@ -148,23 +175,43 @@ class RedisAgent(BaseAgent[Observation, AgentAction]):
                         action_string
                     )
                 )
-                return AgentAction(
-                    action_type="speak", argument=sorted_message_list[-1][2]
-                )
+                return AgentAction(action_type="speak", argument=action_string)
 
-    def reset(
+    async def areset(
         self,
         reset_reason: str = "",
     ) -> None:
         super().reset()
-        try:
-            if reset_reason != "":
-                response = requests.request(
-                    "POST",
-                    f"{self._URL}/send/{self.session_id}/{self.sender_id}",
-                    json=reset_reason,
-                )
-                assert response.status_code == 200
+        if reset_reason != "":
+            await self._asend_reset_reason(reset_reason)
 
+    async def _asend_reset_reason(self, reset_reason: str) -> None:
+        try:
+            await self._ensure_connected()
+            await self._send(json=reset_reason)
         except Exception as e:
             logging.error(f"Failed to reset RedisAgent {self.sender_id}: {e}")
+
+    def reset(
+        self,
+        reset_reason: str = "",
+    ) -> None:
+        super().reset()
+        if reset_reason == "":
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+
+            async def send_and_close() -> None:
+                try:
+                    await self._asend_reset_reason(reset_reason)
+                finally:
+                    await aclose_http_session()
+
+            asyncio.run(send_and_close())
+            return
+        # do not block the running event loop on the request
+        task = loop.create_task(self._asend_reset_reason(reset_reason))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
@@ -1,4 +1,5 @@
 from datetime import datetime
+import gin
 import requests
 import rich
 from sotopia.database.persistent_profile import EnvironmentList
@@ -6,10 +7,12 @@ import asyncio
 import logging
 import json
 import math
+import multiprocessing
+import time
+import uuid
 import numpy as np
-from itertools import chain
-from collections import defaultdict
-from typing import OrderedDict
+from functools import lru_cache
+from typing import Any, Iterable, Literal, OrderedDict, Sized
 
 from rich.logging import RichHandler
 
@@ -18,9 +21,11 @@ from tqdm import tqdm
 from sotopia.agents import LLMAgent
 from sotopia.database import (
     AgentProfile,
+    CompletionLedger,
     EnvAgentComboStorage,
     EnvironmentProfile,
     EpisodeLog,
+    EpisodeQueue,
     SotopiaDimensions,
 )
 from sotopia.database.serialization import get_rewards_from_episode
@@ -30,12 +35,16 @@ from sotopia.envs.evaluators import (
     RuleBasedTerminatedEvaluator,
 )
 from sotopia.envs.parallel import ParallelSotopiaEnv
+from sotopia.generation_utils import set_rate_limit_share
 from sotopia.messages import AgentAction, Observation
 from sotopia.samplers import (
-    BaseSampler,
     EnvAgentCombo,
 )
-from sotopia.server import run_async_server
+from sotopia.server import (
+    InvalidEpisodeError,
+    arun_episode_queue_worker,
+    arun_one_episode,
+)
 from sotopia.logging import FileHandler
 
 import typer
@@ -71,89 +80,128 @@ dimension_range_mapping = OrderedDict(
 )
 
 
+def _t_two_sided_probability(t: float, df: int) -> float:
+    """P(|T| <= t) for Student's t distribution with integer `df` degrees of freedom.
+
+    Closed-form finite series from Abramowitz & Stegun 26.7.3 and 26.7.4.
+    """
+    theta = math.atan(t / math.sqrt(df))
+    cos_squared = math.cos(theta) ** 2
+    if df % 2 == 1:
+        series, term = 0.0, 1.0
+        for k in range(1, (df - 1) // 2 + 1):
+            series += term
+            term *= cos_squared * (2 * k) / (2 * k + 1)
+            if term < 1e-17 * series:
+                break
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * series)
+    series, term = 0.0, 1.0
+    for k in range(1, df // 2 + 1):
+        series += term
+        term *= cos_squared * (2 * k - 1) / (2 * k)
+        if term < 1e-17 * series:
+            break
+    return math.sin(theta) * series
+
+
+@lru_cache(maxsize=None)
+def t_critical_value(df: int, confidence_level: float = 0.95) -> float:
+    """The two-sided critical value of Student's t distribution, e.g. 2.093 for df=19 at 95%."""
+    assert df >= 1, "the t distribution needs at least one degree of freedom"
+    low, high = 0.0, 1.0
+    while _t_two_sided_probability(high, df) < confidence_level:
+        low, high = high, high * 2
+    # the probability is monotonic in t, bisect down to float precision
+    for _ in range(100):
+        mid = (low + high) / 2
+        if _t_two_sided_probability(mid, df) < confidence_level:
+            low = mid
+        else:
+            high = mid
+        if high - low <= 1e-12 * high:
+            break
+    return high
+
+
 def get_avg_reward(
-    episodes: list[EpisodeLog], model_name: str
+    episodes: list[EpisodeLog],
+    model_name: str,
+    ci_method: Literal["t", "bootstrap"] = "t",
+    bootstrap_samples: int = 10000,
+    seed: int | None = None,
 ) -> dict[str, tuple[float, float]]:
     """
     input: list of EpisodeLog, model_name
 
+    ci_method: "t" for the t interval with the per-setting variances averaged, "bootstrap" for the half-width of the percentile interval of `bootstrap_samples` resamples of the episodes
+
     return: dictionary of {dimension: (avg_reward, margin_of_error (in 95% confidence interval))}, plus the distinct setting number and episode count (in the same format, but with 0 margin of error)
     """
-    rewards_dict = defaultdict(
-        list
-    )  # {pk: [rewards]}, {pk}_{i} denotes the i-th agent is the test agent
-    avg_reward_dict = {}
-    avg_margin_dict = {}
-    avg_variance_dict = {}
+    confidence_level = 0.95
+    # {environment}_{i} denotes the i-th agent is the test agent
+    settings: dict[str, int] = {}
+    setting_indices: list[int] = []
+    rewards_list: list[dict[str, float]] = []
     for episode in episodes:
         assert episode.models is not None, "episode.models should not be None"
-        if episode.models[1] == model_name:
-            reward = get_rewards_from_episode(episode)[0][1]
-            rewards_dict[f"{episode.environment}_0"].append(reward)
-        else:
-            reward = get_rewards_from_episode(episode)[1][1]
-            rewards_dict[f"{episode.environment}_1"].append(reward)
-    dimensions = list(rewards_dict.values())[0][0].keys()
-
-    def calc_variance(local_rewards_list: list[dict[str, float]]) -> dict[str, float]:
-        # get the variance within a list, discarded
-        local_var_reward_dict = {}
-        local_dimensions = local_rewards_list[0].keys()
-        assert set(local_dimensions) == set(dimensions), "dimensions should be the same"
-        for dimension in local_dimensions:
-            rewards = [reward[dimension] for reward in local_rewards_list]
-            avg_reward = sum(rewards) / len(rewards)
-            if len(rewards) == 1:
-                variance = 0.0
-            else:
-                variance = sum([(reward - avg_reward) ** 2 for reward in rewards]) / (
-                    len(rewards) - 1
-                )
-            local_var_reward_dict[dimension] = variance
-
-        return local_var_reward_dict
-
-    def calc_average(list_to_average: list[float]) -> float:
-        return sum(list_to_average) / len(list_to_average)
-
-    rewards_list = list(chain(*rewards_dict.values()))
-
-    variance_reward_list = [calc_variance(rewards) for rewards in rewards_dict.values()]
-    for dimension in rewards_list[0].keys():
-        avg_reward_dict[dimension] = calc_average(
-            [reward[dimension] for reward in rewards_list]
+        agent_index = 0 if episode.models[1] == model_name else 1
+        rewards_list.append(get_rewards_from_episode(episode)[agent_index][1])
+        setting = f"{episode.environment}_{agent_index}"
+        setting_indices.append(settings.setdefault(setting, len(settings)))
+    dimensions = list(rewards_list[0].keys())
+    for reward in rewards_list:
+        assert set(reward.keys()) == set(dimensions), "dimensions should be the same"
+
+    # episodes x dimensions
+    rewards = np.array(
+        [[reward[dimension] for dimension in dimensions] for reward in rewards_list],
+        dtype=np.float64,
+    )
+    episode_count = rewards.shape[0]
+    avg_rewards = rewards.mean(axis=0)
+
+    if ci_method == "bootstrap":
+        rng = np.random.default_rng(seed)
+        # how many times each episode is drawn in each resample
+        draws = rng.multinomial(
+            episode_count, np.full(episode_count, 1 / episode_count), bootstrap_samples
         )
-        avg_variance_dict[dimension] = calc_average(
-            [variance[dimension] for variance in variance_reward_list]
-        )  # average the variances for an estimation of the variance
-
-    for dimension in rewards_list[0].keys():
-        # calculate the margin of error by the averaged mean and variance
-        avg_variance = avg_variance_dict[dimension]
-
-        combined_variance = avg_variance
-        combined_sem = math.sqrt(
-            combined_variance / len(rewards_list)
-        )  # sem = sqrt(variance / n), we use the averaged variance under different settings
-
-        confidence_level = 0.95
-        t_samples = np.random.standard_t(df=len(rewards_list) - 1, size=1000000)
-
-        overall_t_value = np.percentile(
-            t_samples, 100 * (1 - (1 - confidence_level) / 2)
+        resampled_means = draws @ rewards / episode_count
+        tail = 100 * (1 - confidence_level) / 2
+        low, high = np.percentile(resampled_means, [tail, 100 - tail], axis=0)
+        margins = (high - low) / 2
+    else:
+        setting_index_array = np.array(setting_indices)
+        setting_counts = np.bincount(setting_index_array, minlength=len(settings))
+        setting_sums = np.zeros((len(settings), len(dimensions)))
+        np.add.at(setting_sums, setting_index_array, rewards)
+        setting_means = setting_sums / setting_counts[:, None]
+        squared_deviations = np.zeros((len(settings), len(dimensions)))
+        np.add.at(
+            squared_deviations,
+            setting_index_array,
+            (rewards - setting_means[setting_index_array]) ** 2,
         )
-
-        margin = overall_t_value * combined_sem
-        avg_margin_dict[dimension] = margin
+        # sample variance within each setting, 0 for settings with one episode
+        setting_variances = (
+            squared_deviations / np.maximum(setting_counts - 1, 1)[:, None]
+        )
+        # average the variances for an estimation of the variance,
+        # sem = sqrt(variance / n)
+        sems = np.sqrt(setting_variances.mean(axis=0) / episode_count)
+        if episode_count > 1:
+            margins = t_critical_value(episode_count - 1, confidence_level) * sems
+        else:
+            margins = np.full(len(dimensions), math.nan)
 
     return_rewards_dict = {
-        key: (avg_reward_dict[key], avg_margin_dict[key])
-        for key in avg_reward_dict.keys()
+        dimension: (float(avg_rewards[i]), float(margins[i]))
+        for i, dimension in enumerate(dimensions)
     }
     return_rewards_dict = {
         **return_rewards_dict,
-        "setting_num": (float(len(variance_reward_list)), 0.0),
-        "episode_count": (float(len(rewards_list)), 0.0),
+        "setting_num": (float(len(settings)), 0.0),
+        "episode_count": (float(episode_count), 0.0),
     }
 
     return return_rewards_dict
@@ -203,91 +251,13 @@ def _set_up_logs(
     )
 
 
-def preprocess_episode_data(
-    episode_list_with_tag: list[EpisodeLog],
-) -> dict[tuple[str, tuple[str, ...], tuple[str, ...]], bool]:
-    """Preprocess episodes into a dictionary for quick lookup."""
-    episode_dict = {}
-    for episode in episode_list_with_tag:
-        assert isinstance(episode, EpisodeLog), "episode should be an EpisodeLog"
-        assert episode.models is not None, "episode.models should not be None"
-        episode_key = (
-            episode.environment,
-            tuple(episode.agents),
-            tuple(episode.models),
-        )
-        episode_dict[episode_key] = True
-    return episode_dict
-
-
-def check_existing_episodes(
-    env_id: str,
-    agent_ids: list[str],
-    models: dict[str, str],
-    index: str,
-    episode_dict: dict[tuple[str, tuple[str, ...], tuple[str, ...]], bool],
-) -> bool:
-    models_list = (
+def _models_for_index(models: dict[str, str], index: str) -> tuple[str, str, str]:
+    """The (env, agent 1, agent 2) models, with the test model as the `index`-th agent."""
+    return (
         (models["env"], models["test_model"], models["partner_model"])
         if index == "0"
         else (models["env"], models["partner_model"], models["test_model"])
     )
-    episode_key = (env_id, tuple(agent_ids), models_list)
-    return episode_dict.get(episode_key, False)
-
-
-def run_async_benchmark_in_batch(
-    *,
-    env_agent_combo_list: list[EnvAgentCombo[Observation, AgentAction]],
-    batch_size: int = 1,
-    tag: str = "",
-    push_to_db: bool = False,
-    verbose: bool = False,
-) -> None:
-    env_agent_combo_batch: list[EnvAgentCombo[Observation, AgentAction]] = []
-    loop = asyncio.get_event_loop()
-    for env_agent_combo in tqdm(
-        env_agent_combo_list,
-        desc="Running all envs in batch",
-    ):
-        env_agent_combo_batch.append(env_agent_combo)
-        if len(env_agent_combo_batch) == batch_size:
-            logging.info(
-                f"Running batch of {batch_size} episodes: {env_agent_combo_batch}"
-            )
-            loop.run_until_complete(
-                run_async_server(
-                    sampler=BaseSampler[Observation, AgentAction](),
-                    env_agent_combo_list=env_agent_combo_batch,
-                    push_to_db=push_to_db,
-                    tag=tag,
-                )
-            )
-            env_agent_combo_batch = []
-    else:
-        if env_agent_combo_batch:
-            logging.info(
-                f"Running batch of {batch_size} episodes: {env_agent_combo_batch}"
-            )
-            loop.run_until_complete(
-                run_async_server(
-                    sampler=BaseSampler[Observation, AgentAction](),
-                    env_agent_combo_list=env_agent_combo_batch,
-                    push_to_db=push_to_db,
-                    tag=tag,
-                )
-            )
-        # remove episodes that has bad rewards
-        simulated_episodes = EpisodeLog.find(EpisodeLog.tag == tag).all()
-        valid_episodes = [
-            not isinstance(relevant_episode.rewards[0], float)  # type: ignore
-            for relevant_episode in simulated_episodes
-        ]
-        for valid, episode in zip(valid_episodes, simulated_episodes):
-            if not valid:
-                pk = episode.pk
-                assert isinstance(pk, str)
-                EpisodeLog.delete(pk)
 
 
 def benchmark_display(
@@ -324,62 +294,270 @@ def benchmark_display(
     return model_rewards_dict
 
 
-def _list_all_env_agent_combo_not_in_db(
+def _list_env_agent_combo_storage_not_in_db(
     model_names: dict[str, str],
     env_agent_combo_storage_index_list: list[tuple[EnvAgentComboStorage, str]],
-    tag: str = "",
-    task: str = "",
-) -> list[EnvAgentCombo[Observation, AgentAction]]:
-    """Iterate over each environment and return the first env-agent combo not in the database."""
-    assert tag, "tag should not be empty"
-
-    # Preprocess the episodes for fast lookup
-    episode_list_with_tag: list[EpisodeLog] = EpisodeLog.find(
-        EpisodeLog.tag == tag
-    ).all()  # type: ignore
-    episode_dict = preprocess_episode_data(episode_list_with_tag)
-    list_of_env_agent_combo_storage = []
-    for env_agent_combo_storage, index in env_agent_combo_storage_index_list:
-        agent_ids = env_agent_combo_storage.agent_ids
-        env_id = env_agent_combo_storage.env_id
-        if check_existing_episodes(
-            env_id=env_id,
-            agent_ids=agent_ids,
-            models=model_names,
-            index=index,
-            episode_dict=episode_dict,
-        ):
+    ledger: CompletionLedger,
+) -> list[tuple[EnvAgentComboStorage, str]]:
+    """The env-agent combos (with the index of the test agent) that have no episode in the completion ledger."""
+    completed = ledger.contains_many(
+        CompletionLedger.combo_key(
+            env_agent_combo_storage.env_id,
+            env_agent_combo_storage.agent_ids,
+            _models_for_index(model_names, index),
+        )
+        for env_agent_combo_storage, index in env_agent_combo_storage_index_list
+    )
+    missing_list = []
+    for (env_agent_combo_storage, index), is_completed in zip(
+        env_agent_combo_storage_index_list, completed
+    ):
+        if is_completed:
             logging.info(
-                f"Episode for {env_id} with agents {agent_ids} using {list(model_names.values())} already exists"
+                f"Episode for {env_agent_combo_storage.env_id} with agents {env_agent_combo_storage.agent_ids} using {list(model_names.values())} already exists"
             )
             continue
-        env_profile = EnvironmentProfile.get(env_id)
-        env = ParallelSotopiaEnv(
-            env_profile=env_profile,
-            action_order="round-robin",
-            evaluators=[
-                RuleBasedTerminatedEvaluator(max_turn_number=20, max_stale_turn=2),
-            ],
-            terminal_evaluators=[
-                EpisodeLLMEvaluator(
-                    model_names["env"],
-                    EvaluationForTwoAgents[SotopiaDimensions],
-                ),
-            ],
+        missing_list.append((env_agent_combo_storage, index))
+    return missing_list
+
+
+def _build_env_agent_combo(
+    env_agent_combo_storage: EnvAgentComboStorage,
+    index: str,
+    model_names: dict[str, str],
+) -> EnvAgentCombo[Observation, AgentAction]:
+    agent_ids = env_agent_combo_storage.agent_ids
+    env_profile = EnvironmentProfile.get(env_agent_combo_storage.env_id)
+    env = ParallelSotopiaEnv(
+        env_profile=env_profile,
+        action_order="round-robin",
+        evaluators=[
+            RuleBasedTerminatedEvaluator(max_turn_number=20, max_stale_turn=2),
+        ],
+        terminal_evaluators=[
+            EpisodeLLMEvaluator(
+                model_names["env"],
+                EvaluationForTwoAgents[SotopiaDimensions],
+            ),
+        ],
+    )
+    agent_profiles = [AgentProfile.get(id) for id in agent_ids]
+    # make sure the second agent (i.e., the agent being benchmarked) is always the indexed agent
+    agents = [
+        LLMAgent(agent_profile=agent_profile, model_name=agent_model)
+        for agent_profile, agent_model in zip(
+            agent_profiles,
+            [model_names["test_model"], model_names["partner_model"]]
+            if index == "0"
+            else [model_names["partner_model"], model_names["test_model"]],
         )
-        agent_profiles = [AgentProfile.get(id) for id in agent_ids]
-        # make sure the second agent (i.e., the agent being benchmarked) is always the indexed agent
-        agents = [
-            LLMAgent(agent_profile=agent_profile, model_name=agent_model)
-            for agent_profile, agent_model in zip(
-                agent_profiles,
-                [model_names["test_model"], model_names["partner_model"]]
-                if index == "0"
-                else [model_names["partner_model"], model_names["test_model"]],
+    ]
+    return (env, agents)
+
+
+def _has_valid_rewards(episode: EpisodeLog) -> bool:
+    # the evaluator falls back to a float reward when it fails to rate the episode
+    return not isinstance(episode.rewards[0], float)
+
+
+async def arun_benchmark_pipeline(
+    *,
+    env_agent_combo_storage_index_list: Iterable[tuple[EnvAgentComboStorage, str]],
+    model_names: dict[str, str],
+    max_concurrency: int = 10,
+    max_attempts: int = 5,
+    tag: str = "",
+    push_to_db: bool = False,
+) -> list[tuple[EnvAgentComboStorage, str]]:
+    """
+    Run the benchmark combos through a pool of `max_concurrency` workers.
+
+    Each worker builds the env and agents of its next combo only when it
+    starts it, and a new episode starts as soon as one finishes. An episode
+    whose evaluation failed is not saved and is retried right away, as is
+    one that raised, up to `max_attempts` runs per combo.
+    The combos can be a lazy iterable.
+
+    Returns:
+        list[tuple[EnvAgentComboStorage, str]]: The combos that never completed.
+    """
+    assert max_concurrency > 0, "max_concurrency must be positive"
+    combo_iter = iter(env_agent_combo_storage_index_list)
+    failed: list[tuple[EnvAgentComboStorage, str]] = []
+    total = (
+        len(env_agent_combo_storage_index_list)
+        if isinstance(env_agent_combo_storage_index_list, Sized)
+        else None
+    )
+    progress = tqdm(total=total, desc="Running all envs")
+
+    async def worker() -> None:
+        for env_agent_combo_storage, index in combo_iter:
+            succeeded = False
+            for attempt in range(1, max_attempts + 1):
+                env, agents = _build_env_agent_combo(
+                    env_agent_combo_storage, index, model_names
+                )
+                try:
+                    await arun_one_episode(
+                        env=env,
+                        agent_list=agents,
+                        tag=tag,
+                        push_to_db=push_to_db,
+                        episode_validator=_has_valid_rewards,
+                        raise_on_save_error=True,
+                    )
+                    succeeded = True
+                    break
+                except InvalidEpisodeError as e:
+                    logging.warning(
+                        f"Attempt {attempt}/{max_attempts} for {env_agent_combo_storage.env_id} with agents {env_agent_combo_storage.agent_ids}: {e}"
+                    )
+                except Exception as e:
+                    logging.error(
+                        f"Attempt {attempt}/{max_attempts} for {env_agent_combo_storage.env_id} with agents {env_agent_combo_storage.agent_ids} failed: {e}"
+                    )
+            if not succeeded:
+                failed.append((env_agent_combo_storage, index))
+            progress.update(1)
+
+    try:
+        await asyncio.gather(
+            *(
+                worker()
+                for _ in range(
+                    max_concurrency if total is None else min(max_concurrency, total)
+                )
             )
-        ]
-        list_of_env_agent_combo_storage.append((env, agents))
-    return list_of_env_agent_combo_storage  # type: ignore
+        )
+    finally:
+        progress.close()
+    return failed
+
+
+def _set_up_worker_logs(log_level: int, log_files: list[str]) -> None:
+    """Give a spawned worker the root log level and log files of its parent, which it does not inherit."""
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    for log_file in log_files:
+        file_handler = FileHandler(log_file)
+        file_handler.setFormatter(logging.Formatter(FORMAT, datefmt="[%X]"))
+        root_logger.addHandler(file_handler)
+
+
+def _benchmark_worker_process(
+    tag: str,
+    run_id: str,
+    model_names: dict[str, str],
+    max_concurrency: int,
+    push_to_db: bool,
+    rate_limit_share: float,
+    gin_config: str,
+    log_level: int,
+    log_files: list[str],
+) -> None:
+    """Entry point of a `benchmark --workers N` process: run combos from the run's queue until it is drained."""
+    # a spawned process starts from a fresh interpreter, without the parent's bindings
+    gin.parse_config(gin_config, skip_unknown=True)
+    _set_up_worker_logs(log_level, log_files)
+    set_rate_limit_share(rate_limit_share)
+    asyncio.run(
+        arun_episode_queue_worker(
+            EpisodeQueue(tag, run_id=run_id),
+            build_env_agent_combo=lambda item: _build_env_agent_combo(
+                EnvAgentComboStorage(
+                    env_id=item["env_id"], agent_ids=item["agent_ids"]
+                ),
+                item["index"],
+                model_names,
+            ),
+            max_concurrency=max_concurrency,
+            max_attempts=5,
+            push_to_db=push_to_db,
+            episode_validator=_has_valid_rewards,
+        )
+    )
+
+
+def run_benchmark_in_workers(
+    *,
+    env_agent_combo_storage_index_list: list[tuple[EnvAgentComboStorage, str]],
+    model_names: dict[str, str],
+    workers: int,
+    max_concurrency: int = 10,
+    tag: str = "",
+    push_to_db: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Shard the combos across `workers` processes through an `EpisodeQueue` of this run.
+
+    Each process runs its own event loop with `max_concurrency / workers`
+    episodes in flight and the same share of the rate limits, and gets the
+    gin bindings and the root log level and log files of this process.
+
+    Returns:
+        list[dict[str, Any]]: The queue items of the combos that never completed.
+    """
+    assert workers > 0, "workers must be positive"
+    # the completion ledger already decided what is missing, so each run gets a
+    # fresh queue, which does not touch the queues of other runs with the tag
+    run_id = uuid.uuid4().hex
+    queue = EpisodeQueue(tag, run_id=run_id)
+    total = queue.push(
+        (
+            {
+                "env_id": env_agent_combo_storage.env_id,
+                "agent_ids": env_agent_combo_storage.agent_ids,
+                "index": index,
+            }
+            for env_agent_combo_storage, index in env_agent_combo_storage_index_list
+        ),
+        item_id=lambda item: CompletionLedger.combo_key(
+            item["env_id"],
+            item["agent_ids"],
+            _models_for_index(model_names, item["index"]),
+        ),
+    )
+    root_logger = logging.getLogger()
+    log_files = [
+        handler.baseFilename
+        for handler in root_logger.handlers
+        if isinstance(handler, logging.FileHandler)
+    ]
+    # spawn rather than fork, so no event loop or connection leaks into the workers
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_benchmark_worker_process,
+            args=(
+                tag,
+                run_id,
+                model_names,
+                max(1, math.ceil(max_concurrency / workers)),
+                push_to_db,
+                1 / workers,
+                gin.config_str(),
+                root_logger.level,
+                log_files,
+            ),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    with tqdm(total=total, desc=f"Running all envs in {workers} workers") as bar:
+        while any(process.is_alive() for process in processes):
+            time.sleep(1)
+            progress = queue.progress()
+            bar.n = progress["completed"] + progress["failed"]
+            bar.refresh()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            logging.error(f"Worker {process.pid} exited with code {process.exitcode}")
+    failures = queue.failures()
+    queue.clear()
+    return failures
 
 
 def display_in_table(
@@ -442,7 +620,9 @@ def benchmark(
     evaluator_model: str = typer.Option(
         "gpt-4o", help="The evaluator model you want to use."
     ),
-    batch_size: int = typer.Option(10, help="The batch size you want to use."),
+    batch_size: int = typer.Option(
+        10, help="The number of episodes running concurrently."
+    ),
     task: str = typer.Option("hard", help="The task id you want to benchmark."),
     url: str = typer.Option("", help="The url to fetch the benchmark combo."),
     print_logs: bool = typer.Option(False, help="Print logs."),
@@ -450,6 +630,10 @@ def benchmark(
     output_to_jsonl: bool = typer.Option(False, help="Output to jsonl."),
     push_to_db: bool = typer.Option(False, help="Push to db."),
     save_dir: str = typer.Option(".", help="The directory to save the output."),
+    workers: int = typer.Option(
+        1,
+        help="The number of worker processes to shard the episodes across, each with its own event loop.",
+    ),
 ) -> None:
     if only_show_performance:
         benchmark_display(
@@ -491,30 +675,40 @@ def benchmark(
             "test_model": model,
             "partner_model": partner_model,
         }
-        env_agent_combo_list = _list_all_env_agent_combo_not_in_db(
+        ledger = CompletionLedger(tag)
+        ledger.sync()
+        missing_list = _list_env_agent_combo_storage_not_in_db(
             model_names=model_names,
-            tag=tag,
             env_agent_combo_storage_index_list=env_agent_combo_storage_index_list,
-            task=task,
+            ledger=ledger,
         )
-        number_of_fix_turns = 0
-        while True:
-            run_async_benchmark_in_batch(
-                env_agent_combo_list=env_agent_combo_list,
-                batch_size=batch_size,
+        failed_list: list[Any]
+        if workers > 1:
+            failed_list = run_benchmark_in_workers(
+                env_agent_combo_storage_index_list=missing_list,
+                model_names=model_names,
+                workers=workers,
+                max_concurrency=batch_size,
                 tag=tag,
-                verbose=False,
                 push_to_db=push_to_db,
             )
-            env_agent_combo_list = _list_all_env_agent_combo_not_in_db(
-                model_names=model_names,
-                tag=tag,
-                env_agent_combo_storage_index_list=env_agent_combo_storage_index_list,
-                task=task,
+        else:
+            failed_list = asyncio.run(
+                arun_benchmark_pipeline(
+                    env_agent_combo_storage_index_list=missing_list,
+                    model_names=model_names,
+                    max_concurrency=batch_size,
+                    tag=tag,
+                    push_to_db=push_to_db,
+                )
+            )
+        if failed_list:
+            typer.echo(
+                typer.style(
+                    f"{len(failed_list)} combos failed for {model}",
+                    fg=typer.colors.RED,
+                )
             )
-            number_of_fix_turns += 1
-            if len(env_agent_combo_list) == 0 or number_of_fix_turns >= 5:
-                return
 
     benchmark_display(
         models, partner_model, evaluator_model, task, output_to_jsonl=output_to_jsonl
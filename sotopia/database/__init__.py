@@ -5,7 +5,10 @@ import redis
 import os
 from redis_om import JsonModel, Migrator
 from .annotators import Annotator
+from .bulk_fetch import ProfileCache, fetch_many
+from .completion_ledger import CompletionLedger, record_completed_episode
 from .env_agent_combo_storage import EnvAgentComboStorage
+from .episode_queue import EpisodeLease, EpisodeQueue
 from .logs import (
     AnnotationForEpisode,
     BaseEpisodeLog,
@@ -31,6 +34,7 @@ from .serialization import (
     episodes_to_csv,
     episodes_to_jsonl,
     get_rewards_from_episode,
+    iter_episodes,
     jsonl_to_agentprofiles,
     jsonl_to_envagnetcombostorage,
     jsonl_to_environmentprofiles,
@@ -39,8 +43,12 @@ from .serialization import (
     relationshipprofiles_to_csv,
     relationshipprofiles_to_jsonl,
 )
-from .session_transaction import MessageTransaction, SessionTransaction
-from .waiting_room import MatchingInWaitingRoom
+from .session_transaction import (
+    MessageTransaction,
+    SessionMessageStream,
+    SessionTransaction,
+)
+from .waiting_room import MatchingInWaitingRoom, WaitingRoom, WaitingRoomMatch
 from .aggregate_annotations import map_human_annotations_to_episode_logs
 from .evaluation_dimensions import (
     EvaluationDimensionBuilder,
@@ -62,6 +70,8 @@ __all__ = [
     "BaseEpisodeLog",
     "NonStreamingSimulationStatus",
     "EnvAgentComboStorage",
+    "EpisodeLease",
+    "EpisodeQueue",
     "AnnotationForEpisode",
     "Annotator",
     "BaseRelationshipProfile",
@@ -69,8 +79,11 @@ __all__ = [
     "RelationshipType",
     "RedisCommunicationMixin",
     "SessionTransaction",
+    "SessionMessageStream",
     "MessageTransaction",
     "MatchingInWaitingRoom",
+    "WaitingRoom",
+    "WaitingRoomMatch",
     "agentprofiles_to_csv",
     "agentprofiles_to_jsonl",
     "environmentprofiles_to_csv",
@@ -81,6 +94,7 @@ __all__ = [
     "envagnetcombostorage_to_jsonl",
     "episodes_to_csv",
     "episodes_to_jsonl",
+    "iter_episodes",
     "map_human_annotations_to_episode_logs",
     "jsonl_to_agentprofiles",
     "jsonl_to_environmentprofiles",
@@ -88,6 +102,10 @@ __all__ = [
     "jsonl_to_relationshipprofiles",
     "jsonl_to_envagnetcombostorage",
     "get_rewards_from_episode",
+    "ProfileCache",
+    "fetch_many",
+    "CompletionLedger",
+    "record_completed_episode",
     "EvaluationDimensionBuilder",
     "CustomEvaluationDimension",
     "BaseCustomEvaluationDimension",
@@ -0,0 +1,87 @@
+from typing import Generic, Iterable, Iterator, Mapping, TypeVar
+
+from redis_om import JsonModel
+from redis_om.model.model import NotFoundError
+
+InheritedJsonModel = TypeVar("InheritedJsonModel", bound=JsonModel)
+
+# Number of keys per JSON.MGET round-trip
+MGET_CHUNK_SIZE = 1000
+
+
+def fetch_many(
+    model: type[InheritedJsonModel],
+    pks: Iterable[str],
+    chunk_size: int = MGET_CHUNK_SIZE,
+) -> dict[str, InheritedJsonModel]:
+    """
+    Fetch many records of `model` with one JSON.MGET round-trip per `chunk_size` pks.
+
+    Records that do not exist are left out of the returned dict.
+    """
+    pk_list = list(dict.fromkeys(pks))
+    db = model.db()
+    records: dict[str, InheritedJsonModel] = {}
+    for start in range(0, len(pk_list), chunk_size):
+        chunk = pk_list[start : start + chunk_size]
+        documents = db.json().mget(  # type: ignore[no-untyped-call]
+            [model.make_primary_key(pk) for pk in chunk], "."
+        )
+        for pk, document in zip(chunk, documents):
+            if document is not None:
+                records[pk] = model.model_validate(document)
+    return records
+
+
+class ProfileCache(Mapping[str, InheritedJsonModel], Generic[InheritedJsonModel]):
+    """
+    In-memory, read-through view of the records of one model, keyed by pk.
+
+    Use `prefetch` to load many records at once; a missing pk is fetched
+    with `model.get` on access, which raises `NotFoundError` as usual.
+    """
+
+    def __init__(self, model: type[InheritedJsonModel]) -> None:
+        self.model = model
+        self._records: dict[str, InheritedJsonModel] = {}
+        self._loaded_all = False
+
+    def prefetch(self, pks: Iterable[str], refresh: bool = False) -> None:
+        """Load all `pks` not cached yet (or all of them if `refresh`) in bulk."""
+        missing = [pk for pk in pks if refresh or pk not in self._records]
+        if missing:
+            self._records.update(fetch_many(self.model, missing))
+
+    def add(self, records: Iterable[InheritedJsonModel]) -> None:
+        """Cache records that were already loaded, e.g. passed in as candidates."""
+        for record in records:
+            # records that were never saved have no pk to be looked up by
+            if record.pk:
+                self._records[record.pk] = record
+
+    def load_all(self, refresh: bool = False) -> list[InheritedJsonModel]:
+        """Load every record of the model, scanning the pks once."""
+        if refresh or not self._loaded_all:
+            self.prefetch(self.model.all_pks(), refresh=refresh)
+            self._loaded_all = True
+        return list(self._records.values())
+
+    def __getitem__(self, pk: str) -> InheritedJsonModel:
+        if pk not in self._records:
+            self._records[pk] = self.model.get(pk)
+        return self._records[pk]
+
+    def get_or_none(self, pk: str) -> InheritedJsonModel | None:
+        try:
+            return self[pk]
+        except NotFoundError:
+            return None
+
+    def __contains__(self, pk: object) -> bool:
+        return pk in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
@@ -0,0 +1,248 @@
+"""
+Columnar (Parquet) export of episode logs for analysis.
+
+An export directory holds three datasets, each partitioned by tag
+(`<root>/<table>/tag=<tag>/part-*.parquet`):
+
+- `episodes`: one row per episode
+- `turns`: one row per message, i.e. the flattened `EpisodeLog.messages`
+- `rewards`: one row per agent, with one float column per reward dimension
+
+Exports are incremental: only episodes whose pk is not in the export yet are
+written, as new files. This module needs `pyarrow` (`pip install sotopia[columnar]`),
+so it is not imported by `sotopia.database`.
+"""
+
+import os
+import uuid
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Iterable
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .bulk_fetch import fetch_many
+from .logs import EpisodeLog
+from .serialization import EXPORT_BATCH_SIZE, iter_episodes
+
+TABLES = ("episodes", "turns", "rewards")
+
+# Partition value of episodes without a tag, read back as a null tag
+NULL_TAG_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+TAG_PARTITION_SCHEMA = pa.schema([("tag", pa.string())])
+
+EPISODES_SCHEMA = pa.schema(
+    [
+        ("episode_id", pa.string()),
+        ("environment_id", pa.string()),
+        ("agent_ids", pa.list_(pa.string())),
+        ("models", pa.list_(pa.string())),
+        ("num_turns", pa.int32()),
+        ("reasoning", pa.string()),
+        ("rewards_prompt", pa.string()),
+    ]
+)
+
+TURNS_SCHEMA = pa.schema(
+    [
+        ("episode_id", pa.string()),
+        ("turn_index", pa.int32()),
+        ("message_index", pa.int32()),
+        ("sender", pa.string()),
+        ("receiver", pa.string()),
+        ("content", pa.string()),
+    ]
+)
+
+# The dimension columns are appended to these per export batch
+REWARDS_BASE_SCHEMA = pa.schema(
+    [
+        ("episode_id", pa.string()),
+        ("environment_id", pa.string()),
+        ("agent_index", pa.int32()),
+        ("agent_id", pa.string()),
+        ("overall", pa.float64()),
+    ]
+)
+
+
+def _tag_partition(tag: str | None) -> str:
+    return f"tag={quote(tag, safe='') if tag else NULL_TAG_PARTITION}"
+
+
+def episodes_to_arrow(episodes: Iterable[EpisodeLog]) -> dict[str, pa.Table]:
+    """Convert episodes to the `episodes`, `turns` and `rewards` tables (without the tag column).
+
+    Args:
+        episodes (Iterable[EpisodeLog]): The episodes.
+
+    Returns:
+        dict[str, pa.Table]: The tables by name.
+    """
+    episode_rows: list[dict[str, Any]] = []
+    turn_rows: list[dict[str, Any]] = []
+    reward_rows: list[dict[str, Any]] = []
+    dimensions: dict[str, None] = {}
+    for episode in episodes:
+        episode_rows.append(
+            {
+                "episode_id": episode.pk,
+                "environment_id": episode.environment,
+                "agent_ids": episode.agents,
+                "models": episode.models or [],
+                "num_turns": len(episode.messages),
+                "reasoning": episode.reasoning,
+                "rewards_prompt": episode.rewards_prompt,
+            }
+        )
+        for turn_index, turn in enumerate(episode.messages):
+            for message_index, (sender, receiver, content) in enumerate(turn):
+                turn_rows.append(
+                    {
+                        "episode_id": episode.pk,
+                        "turn_index": turn_index,
+                        "message_index": message_index,
+                        "sender": sender,
+                        "receiver": receiver,
+                        "content": content,
+                    }
+                )
+        for agent_index, reward in enumerate(episode.rewards):
+            scores: dict[str, float]
+            if isinstance(reward, (int, float)):
+                overall, scores = float(reward), {}
+            else:
+                overall, scores = reward
+            dimensions.update(dict.fromkeys(scores))
+            reward_rows.append(
+                {
+                    "episode_id": episode.pk,
+                    "environment_id": episode.environment,
+                    "agent_index": agent_index,
+                    "agent_id": episode.agents[agent_index]
+                    if agent_index < len(episode.agents)
+                    else None,
+                    "overall": overall,
+                    **{dimension: float(score) for dimension, score in scores.items()},
+                }
+            )
+
+    rewards_schema = REWARDS_BASE_SCHEMA
+    for dimension in dimensions:
+        if rewards_schema.get_field_index(dimension) == -1:
+            rewards_schema = rewards_schema.append(pa.field(dimension, pa.float64()))
+    return {
+        "episodes": pa.Table.from_pylist(episode_rows, schema=EPISODES_SCHEMA),
+        "turns": pa.Table.from_pylist(turn_rows, schema=TURNS_SCHEMA),
+        "rewards": pa.Table.from_pylist(reward_rows, schema=rewards_schema),
+    }
+
+
+def write_episodes_to_parquet(episodes: Iterable[EpisodeLog], root: str) -> int:
+    """Append episodes to the export at `root`, one new file per table and tag.
+
+    Args:
+        episodes (Iterable[EpisodeLog]): The episodes.
+        root (str): The export directory.
+
+    Returns:
+        int: The number of episodes written.
+    """
+    episodes_by_tag: defaultdict[str | None, list[EpisodeLog]] = defaultdict(list)
+    for episode in episodes:
+        episodes_by_tag[episode.tag or None].append(episode)
+
+    part_name = f"part-{uuid.uuid4().hex}.parquet"
+    for tag, tag_episodes in episodes_by_tag.items():
+        for table_name, table in episodes_to_arrow(tag_episodes).items():
+            if table.num_rows == 0:
+                continue
+            directory = os.path.join(root, table_name, _tag_partition(tag))
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(table, os.path.join(directory, part_name))
+    return sum(len(tag_episodes) for tag_episodes in episodes_by_tag.values())
+
+
+def read_parquet_table(
+    root: str,
+    table_name: str,
+    columns: list[str] | None = None,
+    filter: ds.Expression | None = None,
+) -> pa.Table:
+    """Read one table of the export at `root`.
+
+    The tag is available as the `tag` column. Filters on it only open the
+    matching partitions, and other filters are pushed down to the Parquet
+    row groups, e.g. `read_parquet_table(root, "rewards", filter=ds.field("tag") == "my_tag")`.
+
+    Args:
+        root (str): The export directory.
+        table_name (str): One of "episodes", "turns" and "rewards".
+        columns (list[str], optional): The columns to read. Defaults to all of them.
+        filter (ds.Expression, optional): Only read the matching rows. Defaults to all of them.
+
+    Returns:
+        pa.Table: The table, empty if nothing was exported yet.
+    """
+    assert table_name in TABLES, f"Unknown table {table_name}, expected one of {TABLES}"
+    path = os.path.join(root, table_name)
+    if not os.path.isdir(path):
+        return pa.table({})
+    partitioning = ds.partitioning(TAG_PARTITION_SCHEMA, flavor="hive")
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+    # Reward dimensions may differ between export batches, so the schema is
+    # the union of all the files' schemas rather than the first file's.
+    schema = pa.unify_schemas(
+        [fragment.physical_schema for fragment in dataset.get_fragments()]
+        + [TAG_PARTITION_SCHEMA]
+    )
+    dataset = ds.dataset(
+        path, schema=schema, format="parquet", partitioning=partitioning
+    )
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def exported_episode_pks(root: str) -> set[str]:
+    """The pks of the episodes already in the export at `root`."""
+    table = read_parquet_table(root, "episodes", columns=["episode_id"])
+    if table.num_rows == 0:
+        return set()
+    return set(table.column("episode_id").to_pylist())
+
+
+def export_episodes_to_parquet(
+    root: str, tag: str | None = None, batch_size: int = EXPORT_BATCH_SIZE
+) -> int:
+    """Export the episodes in Redis that are not in the export at `root` yet.
+
+    Without a tag, only the new episode keys are fetched (one JSON.MGET per
+    batch); with a tag, the tag's episodes are paged and the exported ones skipped.
+
+    Args:
+        root (str): The export directory.
+        tag (str, optional): Only export the episodes with this tag. Defaults to all episodes.
+        batch_size (int, optional): The number of episodes per round-trip and per file. Defaults to EXPORT_BATCH_SIZE.
+
+    Returns:
+        int: The number of episodes written.
+    """
+    exported_pks = exported_episode_pks(root)
+    written = 0
+    if tag is None:
+        new_pks = (pk for pk in EpisodeLog.all_pks() if pk not in exported_pks)
+        while batch := list(islice(new_pks, batch_size)):
+            written += write_episodes_to_parquet(
+                fetch_many(EpisodeLog, batch).values(), root
+            )
+        return written
+    new_episodes = (
+        episode
+        for episode in iter_episodes(tag=tag, batch_size=batch_size)
+        if episode.pk not in exported_pks
+    )
+    while episode_batch := list(islice(new_episodes, batch_size)):
+        written += write_episodes_to_parquet(episode_batch, root)
+    return written
@@ -0,0 +1,96 @@
+import json
+from typing import Iterable, Sequence
+
+from .logs import EpisodeLog
+
+# Number of members per SADD/SMISMEMBER round-trip
+LEDGER_CHUNK_SIZE = 1000
+
+
+class CompletionLedger(object):
+    """
+    Redis set of the env-agent-model combos that already have an episode with `tag`.
+
+    The set is updated as episodes are saved (see `record_completed_episode`),
+    so finding the combos that still need to run is one SMISMEMBER over the
+    pending combos instead of re-reading every episode with the tag.
+    `sync` builds the set from the episodes in the database, and rebuilds it
+    whenever the number of episodes with the tag is not the one the set was
+    built from, e.g. after episodes were saved or deleted outside the ledger.
+    """
+
+    key_prefix = "sotopia:completed_combos:"
+
+    def __init__(self, tag: str) -> None:
+        assert tag, "the completion ledger needs a non-empty tag"
+        self.tag = tag
+        self.key = f"{self.key_prefix}{tag}"
+        self.synced_key = f"{self.key}:synced"
+        self._db = EpisodeLog.db()
+
+    @staticmethod
+    def combo_key(env_id: str, agent_ids: Sequence[str], models: Sequence[str]) -> str:
+        return json.dumps([env_id, list(agent_ids), list(models)])
+
+    @classmethod
+    def episode_combo_key(cls, episode: EpisodeLog) -> str:
+        assert episode.models is not None, "episode.models should not be None"
+        return cls.combo_key(episode.environment, episode.agents, episode.models)
+
+    def _episode_count(self) -> int:
+        return EpisodeLog.find(EpisodeLog.tag == self.tag).count()
+
+    def sync(self, force: bool = False) -> None:
+        """Rebuild the set from the episodes in the database, unless it is up to date."""
+        episode_count = self._episode_count()
+        synced_count = self._db.get(self.synced_key)
+        if (
+            not force
+            and synced_count is not None
+            and int(synced_count) == episode_count
+        ):
+            return
+        combo_keys = set()
+        episodes = EpisodeLog.find(EpisodeLog.tag == self.tag).all()
+        for episode in episodes:
+            assert isinstance(episode, EpisodeLog)
+            if episode.models is not None:
+                combo_keys.add(self.episode_combo_key(episode))
+        pipeline = self._db.pipeline()
+        pipeline.delete(self.key)
+        combo_key_list = list(combo_keys)
+        for start in range(0, len(combo_key_list), LEDGER_CHUNK_SIZE):
+            pipeline.sadd(self.key, *combo_key_list[start : start + LEDGER_CHUNK_SIZE])
+        pipeline.set(self.synced_key, len(episodes))
+        pipeline.execute()
+
+    def add(self, episode: EpisodeLog) -> None:
+        """Add a newly saved episode, keeping the synced episode count in step with it."""
+        self._db.sadd(self.key, self.episode_combo_key(episode))
+        if self._db.exists(self.synced_key):
+            self._db.incr(self.synced_key)
+
+    def remove(self, episode: EpisodeLog) -> None:
+        self._db.srem(self.key, self.episode_combo_key(episode))
+
+    def contains_many(self, combo_keys: Iterable[str]) -> list[bool]:
+        """Whether each of `combo_keys` is completed, in order."""
+        combo_key_list = list(combo_keys)
+        completed: list[bool] = []
+        for start in range(0, len(combo_key_list), LEDGER_CHUNK_SIZE):
+            completed.extend(
+                bool(is_member)
+                for is_member in self._db.smismember(  # type: ignore[no-untyped-call]
+                    self.key, combo_key_list[start : start + LEDGER_CHUNK_SIZE]
+                )
+            )
+        return completed
+
+    def __len__(self) -> int:
+        return int(self._db.scard(self.key))
+
+
+def record_completed_episode(episode: EpisodeLog) -> None:
+    """Add a saved episode to the completion ledger of its tag, if it has one."""
+    if episode.tag and episode.models is not None:
+        CompletionLedger(episode.tag).add(episode)
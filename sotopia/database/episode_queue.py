@@ -0,0 +1,301 @@
+import hashlib
+import json
+import uuid
+from typing import Any, Callable, Iterable, NamedTuple
+
+import redis
+
+from .logs import EpisodeLog
+
+# Seconds a claimed item stays leased without a heartbeat
+DEFAULT_LEASE_SECONDS = 300.0
+
+# Lease deadlines are read off the Redis server clock, so workers on machines
+# with skewed clocks agree on when a lease expires.
+_NOW = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+"""
+
+# Expired leases go back to the pending list, then the next item that is
+# not completed yet is leased to the caller.
+_CLAIM_SCRIPT = (
+    _NOW
+    + """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, item_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], item_id)
+    redis.call('HDEL', KEYS[3], item_id)
+    redis.call('RPUSH', KEYS[1], item_id)
+end
+while true do
+    local item_id = redis.call('LPOP', KEYS[1])
+    if not item_id then
+        return nil
+    end
+    if redis.call('SISMEMBER', KEYS[4], item_id) == 0 then
+        redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), item_id)
+        redis.call('HSET', KEYS[3], item_id, ARGV[2])
+        local attempt = redis.call('HINCRBY', KEYS[5], item_id, 1)
+        return {item_id, redis.call('HGET', KEYS[6], item_id), attempt}
+    end
+end
+"""
+)
+
+_PUSH_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+    return 0
+end
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+_HEARTBEAT_SCRIPT = (
+    _NOW
+    + """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+)
+
+_COMPLETE_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('SADD', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[4], 'completed', 1)
+return 1
+"""
+
+_FAIL_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if ARGV[3] == '1' then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+else
+    redis.call('HINCRBY', KEYS[4], 'failed', 1)
+    redis.call('RPUSH', KEYS[5], ARGV[1])
+end
+return 1
+"""
+
+
+def _to_str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def default_item_id(item: dict[str, Any]) -> str:
+    """Content-addressed id of a queue item, so pushing the same item twice is a no-op."""
+    return hashlib.sha256(json.dumps(item, sort_keys=True).encode()).hexdigest()
+
+
+class EpisodeLease(NamedTuple):
+    item_id: str
+    item: dict[str, Any]
+    token: str
+    attempt: int
+
+
+class EpisodeQueue(object):
+    """
+    Redis-backed work queue of the episodes to run under a tag.
+
+    Items are JSON-serializable dicts describing one episode, e.g. an
+    `EnvAgentComboStorage` pk and the models to run it with. Any number of
+    processes, on any number of machines, can `claim` items: a claim is a
+    lease that expires after `lease_seconds` unless renewed with `heartbeat`,
+    and expired leases go back to the queue. An item id is only pushed and
+    completed once, so re-running a producer or a crashed worker is safe.
+
+    Args:
+        tag (str): the tag of the episodes, which namespaces the queue
+        lease_seconds (float): how long a claim lasts without a heartbeat
+        db (redis.Redis, optional): the Redis client, defaults to the one of `EpisodeLog`
+        run_id (str): separates the queues of runs with the same tag, e.g. two benchmark runs at once
+    """
+
+    key_prefix = "sotopia:episode_queue:"
+
+    def __init__(
+        self,
+        tag: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        db: "redis.Redis[bytes] | None" = None,
+        run_id: str = "",
+    ) -> None:
+        assert tag, "the episode queue needs a non-empty tag"
+        self.tag = tag
+        self.run_id = run_id
+        self.lease_seconds = lease_seconds
+        prefix = f"{self.key_prefix}{tag}"
+        if run_id:
+            prefix = f"{prefix}:run:{run_id}"
+        self.items_key = f"{prefix}:items"
+        self.pending_key = f"{prefix}:pending"
+        self.leases_key = f"{prefix}:leases"
+        self.owners_key = f"{prefix}:owners"
+        self.attempts_key = f"{prefix}:attempts"
+        self.done_key = f"{prefix}:done"
+        self.failed_key = f"{prefix}:failed"
+        self.progress_key = f"{prefix}:progress"
+        self._db = db if db is not None else EpisodeLog.db()
+        self._claim = self._db.register_script(_CLAIM_SCRIPT)
+        self._push = self._db.register_script(_PUSH_SCRIPT)
+        self._heartbeat = self._db.register_script(_HEARTBEAT_SCRIPT)
+        self._complete = self._db.register_script(_COMPLETE_SCRIPT)
+        self._fail = self._db.register_script(_FAIL_SCRIPT)
+
+    def push(
+        self,
+        items: Iterable[dict[str, Any]],
+        item_id: Callable[[dict[str, Any]], str] = default_item_id,
+    ) -> int:
+        """Append the items that were never pushed or completed, and return how many were."""
+        pushed = 0
+        for item in items:
+            pushed += int(
+                self._push(
+                    keys=[self.items_key, self.done_key, self.pending_key],
+                    args=[item_id(item), json.dumps(item)],
+                )
+            )
+        return pushed
+
+    def claim(self) -> EpisodeLease | None:
+        """Lease the next pending item, or return None if there is none right now."""
+        token = uuid.uuid4().hex
+        claimed = self._claim(
+            keys=[
+                self.pending_key,
+                self.leases_key,
+                self.owners_key,
+                self.done_key,
+                self.attempts_key,
+                self.items_key,
+            ],
+            args=[self.lease_seconds, token],
+        )
+        if claimed is None:
+            return None
+        claimed_id, payload, attempt = claimed
+        return EpisodeLease(
+            item_id=_to_str(claimed_id),
+            item=json.loads(payload),
+            token=token,
+            attempt=int(attempt),
+        )
+
+    def heartbeat(self, lease: EpisodeLease) -> bool:
+        """Extend the lease; False if it expired and the item may have been claimed again."""
+        return bool(
+            self._heartbeat(
+                keys=[self.leases_key, self.owners_key],
+                args=[lease.item_id, lease.token, self.lease_seconds],
+            )
+        )
+
+    def holds(self, lease: EpisodeLease) -> bool:
+        """Whether `lease` is still the current lease of its item."""
+        owner = self._db.hget(self.owners_key, lease.item_id)
+        return owner is not None and _to_str(owner) == lease.token
+
+    def complete(self, lease: EpisodeLease) -> bool:
+        """Mark the item as completed; False if the lease was lost or the item was already completed."""
+        return bool(
+            self._complete(
+                keys=[
+                    self.leases_key,
+                    self.owners_key,
+                    self.done_key,
+                    self.progress_key,
+                ],
+                args=[lease.item_id, lease.token],
+            )
+        )
+
+    def fail(self, lease: EpisodeLease, requeue: bool = False) -> bool:
+        """Release the item, back to the queue if `requeue` or to the failures otherwise."""
+        return bool(
+            self._fail(
+                keys=[
+                    self.leases_key,
+                    self.owners_key,
+                    self.pending_key,
+                    self.progress_key,
+                    self.failed_key,
+                ],
+                args=[lease.item_id, lease.token, "1" if requeue else "0"],
+            )
+        )
+
+    def retry_failed(self) -> int:
+        """Move the failed items back to the queue, e.g. when resuming a sweep."""
+        failed_ids = self._db.lrange(self.failed_key, 0, -1)
+        if not failed_ids:
+            return 0
+        pipeline = self._db.pipeline()
+        pipeline.delete(self.failed_key)
+        pipeline.hdel(self.attempts_key, *failed_ids)
+        pipeline.hincrby(self.progress_key, "failed", -len(failed_ids))
+        pipeline.rpush(self.pending_key, *failed_ids)
+        pipeline.execute()
+        return len(failed_ids)
+
+    def progress(self) -> dict[str, int]:
+        """The number of `pending`, `leased`, `completed` and `failed` items."""
+        pipeline = self._db.pipeline()
+        pipeline.llen(self.pending_key)
+        pipeline.zcard(self.leases_key)
+        pipeline.hgetall(self.progress_key)
+        pending, leased, counts = pipeline.execute()
+        counts = {_to_str(field): int(count) for field, count in counts.items()}
+        return {
+            "pending": int(pending),
+            "leased": int(leased),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+        }
+
+    def is_drained(self) -> bool:
+        """Whether no item is pending or leased, i.e. no more work can show up."""
+        progress = self.progress()
+        return progress["pending"] == 0 and progress["leased"] == 0
+
+    def failures(self) -> list[dict[str, Any]]:
+        failed_ids = self._db.lrange(self.failed_key, 0, -1)
+        if not failed_ids:
+            return []
+        return [
+            json.loads(payload)
+            for payload in self._db.hmget(self.items_key, failed_ids)
+            if payload is not None
+        ]
+
+    def clear(self) -> None:
+        self._db.delete(
+            self.items_key,
+            self.pending_key,
+            self.leases_key,
+            self.owners_key,
+            self.attempts_key,
+            self.done_key,
+            self.failed_key,
+            self.progress_key,
+        )
+
+    def __len__(self) -> int:
+        return int(self._db.llen(self.pending_key))
@@ -48,6 +48,14 @@ class BaseEpisodeLog(BaseModel):
         """
 
         agent_profiles = [AgentProfile.get(pk=uuid_str) for uuid_str in self.agents]
+        return agent_profiles, self.render_messages_for_humans()
+
+    def render_messages_for_humans(self) -> list[str]:
+        """The messages and rewards part of `render_for_humans`, without fetching the agent profiles.
+
+        Returns:
+            list[str]: The messages and rewards in each turn.
+        """
         messages_and_rewards = []
         for idx, turn in enumerate(self.messages):
             messages_in_this_turn = []
@@ -78,7 +86,7 @@ class BaseEpisodeLog(BaseModel):
         messages_and_rewards.append(
             f"The rewards are:\nAgent 1: {self.rewards[0]}\nAgent 2: {self.rewards[1]}"
         )
-        return agent_profiles, messages_and_rewards
+        return messages_and_rewards
 
 
 class EpisodeLog(BaseEpisodeLog, JsonModel):
@@ -1,10 +1,12 @@
 import csv
 import json
-from typing import Any
+from itertools import islice
+from typing import Any, Iterable, Iterator, Mapping
 
 from pydantic import BaseModel
 from redis_om.model.model import Field
 
+from .bulk_fetch import ProfileCache, fetch_many
 from .env_agent_combo_storage import EnvAgentComboStorage
 from .logs import EpisodeLog
 from .persistent_profile import (
@@ -77,6 +79,10 @@ class EnvAgentComboStorageWithID(BaseModel):
     agent_ids: list[str] = Field(default=[], index=True)
 
 
+# Number of episodes read from Redis and written out at a time during an export
+EXPORT_BATCH_SIZE = 500
+
+
 def _map_gender_to_adj(gender: str) -> str:
     gender_to_adj = {
         "Man": "male",
@@ -100,40 +106,68 @@ def get_rewards_from_episode(
     return [episode.rewards[0], episode.rewards[1]]
 
 
-def get_scenario_from_episode(episode: EpisodeLog) -> str:
+def _get_environment_profile(
+    pk: str, environment_profiles: Mapping[str, EnvironmentProfile] | None
+) -> EnvironmentProfile:
+    if environment_profiles is None:
+        return EnvironmentProfile.get(pk=pk)
+    return environment_profiles[pk]
+
+
+def _get_agent_profile(
+    pk: str, agent_profiles: Mapping[str, AgentProfile] | None
+) -> AgentProfile:
+    if agent_profiles is None:
+        return AgentProfile.get(pk=pk)
+    return agent_profiles[pk]
+
+
+def get_scenario_from_episode(
+    episode: EpisodeLog,
+    environment_profiles: Mapping[str, EnvironmentProfile] | None = None,
+) -> str:
     """Get the scenario from the episode.
 
     Args:
         episode (EpisodeLog): The episode.
+        environment_profiles (Mapping[str, EnvironmentProfile], optional): Already loaded profiles by pk. Defaults to fetching from Redis.
 
     Returns:
         str: The scenario.
     """
-    return EnvironmentProfile.get(pk=episode.environment).scenario
+    return _get_environment_profile(episode.environment, environment_profiles).scenario
 
 
-def get_codename_from_episode(episode: EpisodeLog) -> str:
+def get_codename_from_episode(
+    episode: EpisodeLog,
+    environment_profiles: Mapping[str, EnvironmentProfile] | None = None,
+) -> str:
     """Get the codename from the episode.
 
     Args:
         episode (EpisodeLog): The episode.
+        environment_profiles (Mapping[str, EnvironmentProfile], optional): Already loaded profiles by pk. Defaults to fetching from Redis.
 
     Returns:
         str: The codename.
     """
-    return EnvironmentProfile.get(pk=episode.environment).codename
+    return _get_environment_profile(episode.environment, environment_profiles).codename
 
 
-def get_agents_background_from_episode(episode: EpisodeLog) -> dict[str, str]:
+def get_agents_background_from_episode(
+    episode: EpisodeLog,
+    agent_profiles: Mapping[str, AgentProfile] | None = None,
+) -> dict[str, str]:
     """Get the agents' background from the episode.
 
     Args:
         episode (EpisodeLog): The episode.
+        agent_profiles (Mapping[str, AgentProfile], optional): Already loaded profiles by pk. Defaults to fetching from Redis.
 
     Returns:
         list[str]: The agents' background.
     """
-    agents = [AgentProfile.get(pk=agent) for agent in episode.agents]
+    agents = [_get_agent_profile(agent, agent_profiles) for agent in episode.agents]
 
     return {
         f"{profile.first_name} {profile.last_name}": f"{profile.first_name} {profile.last_name} is a {profile.age}-year-old {_map_gender_to_adj(profile.gender)} {profile.occupation.lower()}. {profile.gender_pronoun} pronouns. {profile.public_info} Personality and values description: {profile.personality_and_values} {profile.first_name}'s secrets: {profile.secret}"
@@ -143,10 +177,12 @@ def get_agents_background_from_episode(episode: EpisodeLog) -> dict[str, str]:
 
 def get_agent_name_to_social_goal_from_episode(
     episode: EpisodeLog,
+    agent_profiles: Mapping[str, AgentProfile] | None = None,
+    environment_profiles: Mapping[str, EnvironmentProfile] | None = None,
 ) -> dict[str, str]:
-    agents = [AgentProfile.get(agent) for agent in episode.agents]
+    agents = [_get_agent_profile(agent, agent_profiles) for agent in episode.agents]
     agent_names = [agent.first_name + " " + agent.last_name for agent in agents]
-    environment = EnvironmentProfile.get(episode.environment)
+    environment = _get_environment_profile(episode.environment, environment_profiles)
     agent_goals = {
         agent_names[0]: environment.agent_goals[0],
         agent_names[1]: environment.agent_goals[1],
@@ -158,7 +194,7 @@ def get_social_interactions_from_episode(
     episode: EpisodeLog,
 ) -> str:
     assert isinstance(episode.tag, str)
-    list_of_social_interactions = episode.render_for_humans()[1]
+    list_of_social_interactions = episode.render_messages_for_humans()
     if len(list_of_social_interactions) < 3:
         return ""
     if "script" in episode.tag.split("_"):
@@ -196,73 +232,165 @@ def _serialize_data_to_csv(data: dict[str, list[Any]], csv_file_path: str) -> No
             writer.writerow(row)
 
 
+def iter_episodes(
+    tag: str | None = None, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[EpisodeLog]:
+    """Lazily read episodes from Redis, `batch_size` at a time.
+
+    Without a tag, the episode keys are scanned and the episodes are fetched
+    with one JSON.MGET per batch; with a tag, the RediSearch results are paged.
+    Either way only one batch of episodes is held in memory.
+
+    Args:
+        tag (str, optional): Only read the episodes with this tag. Defaults to all episodes.
+        batch_size (int, optional): The number of episodes per round-trip. Defaults to EXPORT_BATCH_SIZE.
+
+    Yields:
+        EpisodeLog: The episodes.
+    """
+    if tag is None:
+        pks = EpisodeLog.all_pks()
+        while batch := list(islice(pks, batch_size)):
+            yield from fetch_many(EpisodeLog, batch).values()
+        return
+    offset = 0
+    while True:
+        page = EpisodeLog.find(EpisodeLog.tag == tag).page(
+            offset=offset, limit=batch_size
+        )
+        for episode in page:
+            assert isinstance(episode, EpisodeLog)
+            yield episode
+        if len(page) < batch_size:
+            return
+        offset += batch_size
+
+
+def _iter_episode_batches(
+    episodes: Iterable[EpisodeLog],
+    environment_profiles: ProfileCache[EnvironmentProfile],
+    agent_profiles: ProfileCache[AgentProfile],
+    batch_size: int,
+) -> Iterator[list[EpisodeLog]]:
+    """Split `episodes` into batches, prefetching the profiles each batch refers to."""
+    episode_iter = iter(episodes)
+    while batch := list(islice(episode_iter, batch_size)):
+        environment_profiles.prefetch(episode.environment for episode in batch)
+        agent_profiles.prefetch(agent for episode in batch for agent in episode.agents)
+        yield batch
+
+
+_EPISODE_CSV_COLUMNS = [
+    "episode_id",
+    "environment_id",
+    "agent_ids",
+    "experiment_tag",
+    "experiment_model_name_pairs",
+    "raw_messages",
+    "raw_rewards_prompt",
+    "raw_rewards",
+    "scenario",
+    "codename",
+    "agents_background",
+    "social_goals",
+    "social_interactions",
+    "reasoning",
+    "rewards",
+]
+
+
 def episodes_to_csv(
-    episodes: list[EpisodeLog], csv_file_path: str = "episodes.csv"
+    episodes: Iterable[EpisodeLog],
+    csv_file_path: str = "episodes.csv",
+    batch_size: int = EXPORT_BATCH_SIZE,
 ) -> None:
     """Save episodes to a csv file.
 
+    Rows are written batch by batch, so `episodes` can be a lazy iterable
+    such as `iter_episodes()`.
+
     Args:
-        episodes (list[EpisodeLog]): List of episodes.
+        episodes (Iterable[EpisodeLog]): The episodes.
         filepath (str, optional): The file path. Defaults to "episodes.csv".
+        batch_size (int, optional): The number of episodes whose profiles are fetched at once. Defaults to EXPORT_BATCH_SIZE.
     """
-    data: dict[str, list[Any]] = {
-        "episode_id": [episode.pk for episode in episodes],
-        "environment_id": [episode.environment for episode in episodes],
-        "agent_ids": [episode.agents for episode in episodes],
-        "experiment_tag": [episode.tag for episode in episodes],
-        "experiment_model_name_pairs": [episode.models for episode in episodes],
-        "raw_messages": [episode.messages for episode in episodes],
-        "raw_rewards_prompt": [episode.rewards_prompt for episode in episodes],
-        "raw_rewards": [episode.rewards for episode in episodes],
-        "scenario": [get_scenario_from_episode(episode) for episode in episodes],
-        "codename": [get_codename_from_episode(episode) for episode in episodes],
-        "agents_background": [
-            get_agents_background_from_episode(episode) for episode in episodes
-        ],
-        "social_goals": [
-            get_agent_name_to_social_goal_from_episode(episode) for episode in episodes
-        ],
-        "social_interactions": [
-            get_social_interactions_from_episode(episode) for episode in episodes
-        ],
-        "reasoning": [episode.reasoning for episode in episodes],
-        "rewards": [get_rewards_from_episode(episode) for episode in episodes],
-    }
-
-    # Serialize data to a csv file without pandas
-    _serialize_data_to_csv(data, csv_file_path)
+    environment_profiles = ProfileCache(EnvironmentProfile)
+    agent_profiles = ProfileCache(AgentProfile)
+    with open(csv_file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(_EPISODE_CSV_COLUMNS)
+        for batch in _iter_episode_batches(
+            episodes, environment_profiles, agent_profiles, batch_size
+        ):
+            writer.writerows(
+                [
+                    episode.pk,
+                    episode.environment,
+                    episode.agents,
+                    episode.tag,
+                    episode.models,
+                    episode.messages,
+                    episode.rewards_prompt,
+                    episode.rewards,
+                    get_scenario_from_episode(episode, environment_profiles),
+                    get_codename_from_episode(episode, environment_profiles),
+                    get_agents_background_from_episode(episode, agent_profiles),
+                    get_agent_name_to_social_goal_from_episode(
+                        episode, agent_profiles, environment_profiles
+                    ),
+                    get_social_interactions_from_episode(episode),
+                    episode.reasoning,
+                    get_rewards_from_episode(episode),
+                ]
+                for episode in batch
+            )
 
 
 def episodes_to_jsonl(
-    episodes: list[EpisodeLog], jsonl_file_path: str = "episodes.jsonl"
+    episodes: Iterable[EpisodeLog],
+    jsonl_file_path: str = "episodes.jsonl",
+    batch_size: int = EXPORT_BATCH_SIZE,
 ) -> None:
     """Save episodes to a json file.
 
+    Lines are written batch by batch, so `episodes` can be a lazy iterable
+    such as `iter_episodes()`.
+
     Args:
-        episodes (list[EpisodeLog]): List of episodes.
+        episodes (Iterable[EpisodeLog]): The episodes.
         filepath (str, optional): The file path. Defaults to "episodes.json".
+        batch_size (int, optional): The number of episodes whose profiles are fetched at once. Defaults to EXPORT_BATCH_SIZE.
     """
+    environment_profiles = ProfileCache(EnvironmentProfile)
+    agent_profiles = ProfileCache(AgentProfile)
     with open(jsonl_file_path, "w") as f:
-        for episode in episodes:
-            data = TwoAgentEpisodeWithScenarioBackgroundGoals(
-                episode_id=episode.pk,
-                environment_id=episode.environment,
-                agent_ids=episode.agents,
-                experiment_tag=episode.tag,
-                experiment_model_name_pairs=episode.models,
-                raw_messages=episode.messages,
-                raw_rewards_prompt=episode.rewards_prompt,
-                raw_rewards=episode.rewards,
-                scenario=get_scenario_from_episode(episode),
-                codename=get_codename_from_episode(episode),
-                agents_background=get_agents_background_from_episode(episode),
-                social_goals=get_agent_name_to_social_goal_from_episode(episode),
-                social_interactions=get_social_interactions_from_episode(episode),
-                reasoning=episode.reasoning,
-                rewards=get_rewards_from_episode(episode),
-            )
-            json.dump(dict(data), f)
-            f.write("\n")
+        for batch in _iter_episode_batches(
+            episodes, environment_profiles, agent_profiles, batch_size
+        ):
+            for episode in batch:
+                data = TwoAgentEpisodeWithScenarioBackgroundGoals(
+                    episode_id=episode.pk,
+                    environment_id=episode.environment,
+                    agent_ids=episode.agents,
+                    experiment_tag=episode.tag,
+                    experiment_model_name_pairs=episode.models,
+                    raw_messages=episode.messages,
+                    raw_rewards_prompt=episode.rewards_prompt,
+                    raw_rewards=episode.rewards,
+                    scenario=get_scenario_from_episode(episode, environment_profiles),
+                    codename=get_codename_from_episode(episode, environment_profiles),
+                    agents_background=get_agents_background_from_episode(
+                        episode, agent_profiles
+                    ),
+                    social_goals=get_agent_name_to_social_goal_from_episode(
+                        episode, agent_profiles, environment_profiles
+                    ),
+                    social_interactions=get_social_interactions_from_episode(episode),
+                    reasoning=episode.reasoning,
+                    rewards=get_rewards_from_episode(episode),
+                )
+                json.dump(dict(data), f)
+                f.write("\n")
 
 
 def agentprofiles_to_csv(
@@ -1,14 +1,20 @@
+from datetime import datetime
+from typing import Any
+
+import redis
 from pydantic import field_validator
 from redis_om import EmbeddedJsonModel, JsonModel
 from redis_om.model.model import Field
 
-from .auto_expires_mixin import AutoExpireMixin
+from .auto_expires_mixin import DEFAULT_EXPIRE_TIME, AutoExpireMixin
 
 
 class MessageTransaction(EmbeddedJsonModel):
     timestamp_str: str = Field(index=True)
     sender: str = Field(index=True)
     message: str
+    # id of the entry in the session's `SessionMessageStream`, if it is stored there
+    stream_id: str = Field(default="")
 
     def to_tuple(self) -> tuple[float, str, str]:
         return (
@@ -24,10 +30,12 @@ class SessionTransaction(AutoExpireMixin, JsonModel):
     server_id: str = Field(index=True)
     client_action_lock: str = Field(default="no action")
     message_list: list[MessageTransaction] = Field(
+        default_factory=lambda: [],
         description="""List of messages in this session.
     Each message is a tuple of (timestamp, sender_id, message)
     The message list should be sorted by timestamp.
-    """
+    New sessions keep their messages in a `SessionMessageStream` instead.
+    """,
     )
 
     @field_validator("message_list")
@@ -42,3 +50,64 @@ class SessionTransaction(AutoExpireMixin, JsonModel):
 
         assert _is_sorted(v), "Message list should be sorted by timestamp"
         return v
+
+
+def _to_str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class SessionMessageStream(object):
+    """
+    Redis Stream of the messages of a chat session, one entry per message.
+
+    Sending a message is an O(1) XADD and reading the history is a range
+    read from an entry id, so long sessions do not rewrite the whole
+    `SessionTransaction` on every message. Listeners can block on new
+    entries with XREAD, starting from the `stream_id` of the last message
+    they saw. The stream expires like the sessions do.
+    """
+
+    key_prefix = "sotopia:session_messages:"
+
+    def __init__(self, session_id: str, db: "redis.Redis[bytes] | None" = None) -> None:
+        self.session_id = session_id
+        self.key = f"{self.key_prefix}{session_id}"
+        self._db = db if db is not None else SessionTransaction.db()
+
+    def append(self, sender: str, message: str) -> MessageTransaction:
+        fields = {
+            "timestamp_str": str(datetime.now().timestamp()),
+            "sender": sender,
+            "message": message,
+        }
+        pipeline = self._db.pipeline()
+        pipeline.xadd(self.key, fields)
+        pipeline.expire(self.key, DEFAULT_EXPIRE_TIME)
+        stream_id, _ = pipeline.execute()
+        return MessageTransaction(stream_id=_to_str(stream_id), **fields)
+
+    def range(
+        self, after_id: str = "", count: int | None = None
+    ) -> list[MessageTransaction]:
+        """The messages after the entry `after_id` (exclusive), or from the start."""
+        return self.parse_entries(
+            self._db.xrange(
+                self.key, min=f"({after_id}" if after_id else "-", count=count
+            )
+        )
+
+    def delete(self) -> None:
+        self._db.delete(self.key)
+
+    @staticmethod
+    def parse_entries(
+        entries: list[tuple[Any, dict[Any, Any]]],
+    ) -> list[MessageTransaction]:
+        """Messages from the entries returned by XRANGE or XREAD."""
+        return [
+            MessageTransaction(
+                stream_id=_to_str(stream_id),
+                **{_to_str(key): _to_str(value) for key, value in fields.items()},
+            )
+            for stream_id, fields in entries
+        ]
@@ -1,3 +1,9 @@
+import json
+import time
+import uuid
+from typing import NamedTuple
+
+import redis
 from redis_om import JsonModel
 from redis_om.model.model import Field
 
@@ -9,3 +15,129 @@ class MatchingInWaitingRoom(AutoExpireMixin, JsonModel):
     client_ids: list[str] = Field(default_factory=lambda: [])
     session_ids: list[str] = Field(default_factory=lambda: [])
     session_id_retrieved: list[str] = Field(default_factory=lambda: [])
+
+
+# Pairs the two longest-waiting clients, or lets a client that waited alone
+# for longer than the timeout play solo. Clients that stopped polling are
+# dropped first, so they are never paired.
+_JOIN_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[3])
+for _, client_id in ipairs(stale) do
+    redis.call('ZREM', KEYS[1], client_id)
+    redis.call('ZREM', KEYS[3], client_id)
+end
+local assigned = redis.call('HGET', KEYS[2], ARGV[1])
+if assigned then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return {assigned, ''}
+end
+redis.call('ZADD', KEYS[1], 'NX', ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+local waiting = redis.call('ZRANGE', KEYS[1], 0, 1, 'WITHSCORES')
+local match
+if #waiting == 4 then
+    redis.call('ZREM', KEYS[1], waiting[1], waiting[3])
+    redis.call('ZREM', KEYS[3], waiting[1], waiting[3])
+    match = {client_ids = {waiting[1], waiting[3]}, session_ids = {ARGV[5], ARGV[6]}}
+elseif #waiting == 2 and waiting[1] == ARGV[1]
+        and tonumber(ARGV[2]) - tonumber(waiting[2]) > tonumber(ARGV[4]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    match = {client_ids = {ARGV[1]}, session_ids = {ARGV[5]}}
+else
+    return {'', ''}
+end
+local session_id = ''
+for i, client_id in ipairs(match.client_ids) do
+    if client_id == ARGV[1] then
+        session_id = match.session_ids[i]
+    else
+        redis.call('HSET', KEYS[2], client_id, match.session_ids[i])
+    end
+end
+redis.call('EXPIRE', KEYS[2], ARGV[7])
+local announcement = cjson.encode(match)
+redis.call('PUBLISH', ARGV[8], announcement)
+return {session_id, announcement}
+"""
+
+
+def _to_str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class WaitingRoomMatch(NamedTuple):
+    client_ids: list[str]
+    session_ids: list[str]
+
+
+class WaitingRoom(object):
+    """
+    Matchmaking of the clients waiting for a chat session.
+
+    Waiting clients are a sorted set by join time. Every `join` call is one
+    Lua script that pairs the two longest-waiting clients in O(log n), so
+    concurrent joiners never race for the same partner. Each formed match
+    is announced on the `channel` pub/sub channel and returned to the one
+    caller that formed it, which starts the session; the other clients get
+    their session id on their next `join`.
+
+    Args:
+        timeout (float): seconds a client waits alone before playing solo
+        stale_after (float): seconds without a `join` before a client is dropped
+    """
+
+    key_prefix = "sotopia:waiting_room"
+    channel = "sotopia:waiting_room:matches"
+
+    def __init__(
+        self,
+        timeout: float = 1.0,
+        stale_after: float = 30.0,
+        db: "redis.Redis[bytes] | None" = None,
+    ) -> None:
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.queue_key = f"{self.key_prefix}:queue"
+        self.assignments_key = f"{self.key_prefix}:assignments"
+        self.last_seen_key = f"{self.key_prefix}:last_seen"
+        self._db = db if db is not None else MatchingInWaitingRoom.db()
+        self._join = self._db.register_script(_JOIN_SCRIPT)
+
+    def join(self, client_id: str) -> tuple[str, WaitingRoomMatch | None]:
+        """
+        Join or keep waiting; poll it until the session id is not empty.
+
+        Returns:
+            tuple[str, WaitingRoomMatch | None]: the session id of the client,
+            or "" while it waits, and the match if this call formed one
+        """
+        now = time.time()
+        session_id, announcement = self._join(
+            keys=[self.queue_key, self.assignments_key, self.last_seen_key],
+            args=[
+                client_id,
+                now,
+                now - self.stale_after,
+                self.timeout,
+                str(uuid.uuid4()),
+                str(uuid.uuid4()),
+                int(self.stale_after * 10),
+                self.channel,
+            ],
+        )
+        match = WaitingRoomMatch(**json.loads(announcement)) if announcement else None
+        return _to_str(session_id), match
+
+    def leave(self, client_id: str) -> None:
+        pipeline = self._db.pipeline()
+        pipeline.zrem(self.queue_key, client_id)
+        pipeline.zrem(self.last_seen_key, client_id)
+        pipeline.hdel(self.assignments_key, client_id)
+        pipeline.execute()
+
+    def clear(self) -> None:
+        self._db.delete(self.queue_key, self.assignments_key, self.last_seen_key)
+
+    def __len__(self) -> int:
+        return int(self._db.zcard(self.queue_key))
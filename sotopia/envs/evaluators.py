@@ -6,12 +6,19 @@ from typing import Generic, TypeVar
 import gin
 from pydantic import BaseModel, validate_call
 
-from sotopia.generation_utils import PydanticOutputParser, agenerate
+from sotopia.generation_utils import (
+    PydanticOutputParser,
+    agenerate,
+    get_model_capabilities,
+)
+from sotopia.generation_utils.generate import PromptLayout
 from sotopia.messages import (
     AgentAction,
     Message,
+    MessageLog,
     ScriptEnvironmentResponse,
 )
+from sotopia.utils import validate_public_call
 
 log = logging.getLogger("evaluators")
 
@@ -41,11 +48,34 @@ class Evaluator(abc.ABC):
 
 
 class RuleBasedTerminatedEvaluator(Evaluator):
+    """
+    Terminate when the conversation is too long, an agent leaves, or it stales.
+
+    The run of trailing "none" actions is read off a `MessageLog` (e.g. the
+    env's inbox) in O(1), and found by scanning a plain list backwards.
+    """
+
     def __init__(self, max_turn_number: int = 20, max_stale_turn: int = 2) -> None:
         self.max_turn_number = max_turn_number
         self.max_stale_turn = max_stale_turn
 
-    @validate_call
+    def _stale_count(self, messages: list[tuple[str, Message]]) -> int:
+        if isinstance(messages, MessageLog):
+            return messages.stale_streak
+        stale_count = 0
+        for message in messages[::-1]:
+            if message[0] == "Environment":
+                continue
+            assert isinstance(message[1], AgentAction)
+            if message[1].action_type == "none":
+                stale_count += 1
+            else:
+                break
+            if stale_count > self.max_stale_turn:
+                break
+        return stale_count
+
+    @validate_public_call
     def __call__(
         self, turn_number: int, messages: list[tuple[str, Message]]
     ) -> list[tuple[str, tuple[tuple[str, int | float | bool], str]]]:
@@ -63,18 +93,7 @@ class RuleBasedTerminatedEvaluator(Evaluator):
             and messages[-1][1].action_type == "leave"
         )
         # Rule 3: If the conversation is stale for too long, terminate the conversation
-        stale_count = 0
-        for message in messages[::-1]:
-            if message[0] == "Environment":
-                continue
-            assert isinstance(message[1], AgentAction)
-            if message[1].action_type == "none":
-                stale_count += 1
-            else:
-                break
-            if stale_count > self.max_stale_turn:
-                break
-        stale_too_long = stale_count > self.max_stale_turn
+        stale_too_long = self._stale_count(messages) > self.max_stale_turn
         terminated = conversation_too_long or p1_leaving or p2_leaving or stale_too_long
         reasons_for_termination = (
             f"{'The conversation is too long; ' if conversation_too_long else ''}"
@@ -113,29 +132,28 @@ class EpisodeLLMEvaluator(Evaluator, Generic[T_eval_dim]):
         )
 
     @gin.configurable
-    @validate_call
+    @validate_public_call
     async def __acall__(
         self,
         turn_number: int,
         messages: list[tuple[str, Message]] | None,
         history: str = "",
         temperature: float = 0.0,
+        prompt_layout: PromptLayout = "default",
     ) -> list[tuple[str, tuple[tuple[str, int | float | bool], str]]]:
         # filter did nothing
         if not history and messages:
-            messages_filtered = [
-                (x, y)
-                for x, y in messages
-                if "did nothing" not in y.to_natural_language()
-            ]
+            # the env's message log renders each message once per episode
+            texts = (
+                messages.texts()
+                if isinstance(messages, MessageLog)
+                else [y.to_natural_language() for _, y in messages]
+            )
             history = "\n".join(
                 [
-                    (
-                        f"{x} {y.to_natural_language()}"
-                        if x != "Environment"
-                        else y.to_natural_language()
-                    )
-                    for x, y in messages_filtered
+                    f"{x} {text}" if x != "Environment" else text
+                    for (x, _), text in zip(messages, texts)
+                    if "did nothing" not in text
                 ]
             )
 
@@ -146,13 +164,21 @@ class EpisodeLLMEvaluator(Evaluator, Generic[T_eval_dim]):
                     Based on previous interactions, evaluate how well participants achieve their goals.
                     Please following the format:
                     {format_instructions}
+                """
+                if prompt_layout == "default"
+                else """Evaluate how well participants achieve their goals, based on the interactions below.
+                    Please following the format:
+                    {format_instructions}
+                    {history}
                 """,
                 input_values=dict(history=history),
                 output_parser=PydanticOutputParser[self.response_format_class](  # type: ignore[name-defined]
                     pydantic_object=self.response_format_class
                 ),
                 temperature=temperature,
-                structured_output=self.model_name.startswith("custom/structured"),
+                structured_output=get_model_capabilities(
+                    self.model_name
+                ).structured_output,
             )
             response_list = []
             # TODO: multiple agents
@@ -188,6 +214,8 @@ class EpisodeLLMEvaluator(Evaluator, Generic[T_eval_dim]):
             return []
 
 
+# The aggregators validate every call, internal or not: their input is the
+# evaluators' output, which is small and may come from a custom evaluator.
 @validate_call
 def _reduce(
     responses_per_reducer: list[tuple[tuple[str, float | int | bool], str]],
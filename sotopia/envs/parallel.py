@@ -9,7 +9,6 @@ from gymnasium.spaces.dict import Dict
 from gymnasium.spaces.discrete import Discrete
 from gymnasium.spaces.text import Text
 from pettingzoo.utils.env import ParallelEnv
-from pydantic import validate_call
 from redis_om.model.model import NotFoundError
 
 from sotopia.agents.llm_agent import Agents
@@ -21,17 +20,23 @@ from sotopia.database.persistent_profile import (
 from sotopia.messages import (
     ActionType,
     AgentAction,
+    MessageLog,
     MessengerMixin,
     Observation,
     ScriptBackground,
+    ScriptEnvironmentResponse,
     SimpleMessage,
 )
 from sotopia.renderers import RenderContext, XMLRenderer
+from sotopia.utils import trusted_internal_calls, validate_public_call
 
 from .evaluators import Evaluator, unweighted_aggregate_evaluate
 
 TBackground = TypeVar("TBackground", bound=ScriptBackground)
 
+# XMLRenderer is stateless, so a single instance is shared by all envs
+_xml_renderer = XMLRenderer()
+
 
 def _actions_to_natural_language(actions: dict[str, AgentAction]) -> str:
     action_str = ""
@@ -102,7 +107,7 @@ def render_text_for_agent(
         "strategy_hint",
     ],
 ) -> str:
-    return XMLRenderer()(
+    return _xml_renderer(
         raw_text,
         RenderContext(viewer=f"agent_{agent_id}", tags_to_render=tags_to_render),
     )
@@ -117,13 +122,15 @@ def render_text_for_environment(
         "strategy_hint",
     ],
 ) -> str:
-    return XMLRenderer()(
+    return _xml_renderer(
         raw_text,
         RenderContext(viewer="environment", tags_to_render=tags_to_render),
     )
 
 
 class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMixin):
+    inbox: MessageLog
+
     def __init__(
         self,
         available_action_types: set[ActionType] = set(
@@ -181,6 +188,9 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             except NotFoundError:
                 raise ValueError(f"Agent with uuid {uuid_str} not found in database")
 
+    def reset_inbox(self) -> None:
+        self.inbox = MessageLog()
+
     @configurable
     def reset(
         self,
@@ -200,7 +210,7 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             omniscient (bool, optional): Whether the agents know the other agent's goal. Defaults to False.
         """
         super().__init__()
-        MessengerMixin.reset_inbox(self)
+        self.reset_inbox()
         assert (
             not options
             or "partial_background_file" not in options
@@ -313,7 +323,7 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             ),
         }
 
-    @validate_call
+    @validate_public_call
     def step(
         self, actions: dict[str, AgentAction] | dict[str, dict[str, int | str]]
     ) -> tuple[
@@ -333,10 +343,14 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             if isinstance(action, AgentAction):
                 complied_actions[key] = action
             else:
-                action["action_type"] = self.available_action_types[
-                    int(action["action_type"])
-                ]
-                complied_actions[key] = AgentAction.parse_obj(action)
+                complied_actions[key] = AgentAction.parse_obj(
+                    {
+                        **action,
+                        "action_type": self.available_action_types[
+                            int(action["action_type"])
+                        ],
+                    }
+                )
 
         # Masking actions from agent that are in turn
         for idx, agent in enumerate(self.agents):
@@ -421,6 +435,27 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             },
         )
 
+    async def _aevaluate(
+        self, evaluators: list[Evaluator]
+    ) -> ScriptEnvironmentResponse:
+        # the inbox is built by the env itself, so it is not re-validated on every turn
+        with trusted_internal_calls():
+            return unweighted_aggregate_evaluate(
+                list(
+                    itertools.chain(
+                        *await asyncio.gather(
+                            *[
+                                evaluator.__acall__(
+                                    turn_number=self.turn_number,
+                                    messages=self.inbox,
+                                )
+                                for evaluator in evaluators
+                            ]
+                        )
+                    )
+                )
+            )
+
     async def astep(
         self, actions: dict[str, AgentAction] | dict[str, dict[str, int | str]]
     ) -> tuple[
@@ -440,10 +475,14 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
             if isinstance(action, AgentAction):
                 complied_actions[key] = action
             else:
-                action["action_type"] = self.available_action_types[
-                    int(action["action_type"])
-                ]
-                complied_actions[key] = AgentAction.parse_obj(action)
+                complied_actions[key] = AgentAction.parse_obj(
+                    {
+                        **action,
+                        "action_type": self.available_action_types[
+                            int(action["action_type"])
+                        ],
+                    }
+                )
 
         # Masking actions from agent that are in turn
         for idx, agent in enumerate(self.agents):
@@ -456,38 +495,10 @@ class ParallelSotopiaEnv(ParallelEnv[str, Observation, AgentAction], MessengerMi
         for agent, action in complied_actions.items():
             self.recv_message(agent, action)
 
-        response = unweighted_aggregate_evaluate(
-            list(
-                itertools.chain(
-                    *await asyncio.gather(
-                        *[
-                            evaluator.__acall__(
-                                turn_number=self.turn_number,
-                                messages=self.inbox,
-                            )
-                            for evaluator in self.evaluators
-                        ]
-                    )
-                )
-            )
-        )
+        response = await self._aevaluate(self.evaluators)
 
         if response.terminated:
-            terminal_response = unweighted_aggregate_evaluate(
-                list(
-                    itertools.chain(
-                        *await asyncio.gather(
-                            *[
-                                evaluator.__acall__(
-                                    turn_number=self.turn_number,
-                                    messages=self.inbox,
-                                )
-                                for evaluator in self.terminal_evaluators
-                            ]
-                        )
-                    )
-                )
-            )
+            terminal_response = await self._aevaluate(self.terminal_evaluators)
             # incorporate terminal response into response
             response.p1_rate = response.p1_rate or terminal_response.p1_rate
             response.p2_rate = response.p2_rate or terminal_response.p2_rate
@@ -11,6 +11,7 @@ from pydantic import BaseModel, Field
 
 from sotopia.database import GoalDimension
 from sotopia.generation_utils.generate import agenerate
+from sotopia.generation_utils.model_capabilities import get_model_capabilities
 from sotopia.generation_utils.output_parsers import PydanticOutputParser
 
 
@@ -102,5 +103,6 @@ class Evaluator(BaseAgent[Observation, AgentAction]):
                 pydantic_object=self.response_format_class
             ),
             temperature=self.temperature,
+            structured_output=get_model_capabilities(self.model_name).structured_output,
         )
         return res.model_dump()["agents_evaluation"]
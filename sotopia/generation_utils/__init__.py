@@ -9,6 +9,19 @@ from .output_parsers import (
     ScriptOutputParser,
     PydanticOutputParser,
     ListOfIntOutputParser,
+    get_output_parse_stats,
+)
+from .cache import get_llm_cache, get_llm_cache_stats
+from .rate_limiter import (
+    get_rate_limiter,
+    get_rate_limiter_stats,
+    set_rate_limit_share,
+)
+from .model_capabilities import get_model_capabilities, warm_model_capabilities
+from .single_flight import (
+    get_single_flight,
+    get_single_flight_key_stats,
+    get_single_flight_stats,
 )
 
 __all__ = [
@@ -17,7 +30,18 @@ __all__ = [
     "ScriptOutputParser",
     "PydanticOutputParser",
     "ListOfIntOutputParser",
+    "get_output_parse_stats",
     "agenerate_env_profile",
     "agenerate",
     "agenerate_action",
+    "get_llm_cache",
+    "get_llm_cache_stats",
+    "get_rate_limiter",
+    "get_rate_limiter_stats",
+    "set_rate_limit_share",
+    "get_model_capabilities",
+    "warm_model_capabilities",
+    "get_single_flight",
+    "get_single_flight_stats",
+    "get_single_flight_key_stats",
 ]
@@ -0,0 +1,318 @@
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import gin
+import redis
+
+# Number of writes between two eviction passes of the persistent tiers.
+EVICTION_INTERVAL = 100
+# Number of hits between two writes of the batched access times of the SQLite tier.
+ACCESS_FLUSH_INTERVAL = 100
+
+
+def make_cache_key(
+    model_name: str,
+    prompt: str,
+    temperature: float,
+    response_format: str | None,
+    parser_type: str,
+) -> str:
+    """Content-addressed key of one LLM request."""
+    payload = json.dumps(
+        [model_name, prompt, temperature, response_format, parser_type],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(abc.ABC):
+    name = "base"
+    # whether `get`/`set` do I/O, and run in a worker thread when called from async code
+    blocking = True
+
+    @abc.abstractmethod
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU tier."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[str, float | None]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        self._entries[key] = (value, time.time() + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Persistent tier stored in a single SQLite file.
+
+    The access times that drive the LRU eviction are batched in memory and
+    written with the next `set`, or every `ACCESS_FLUSH_INTERVAL` hits, so
+    that a hit does not commit.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 100_000) -> None:
+        self.path = os.path.expanduser(path)
+        self.max_entries = max_entries
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_accessed_at "
+            "ON llm_cache (accessed_at)"
+        )
+        self._conn.commit()
+        self._writes = 0
+        self._accessed_at: dict[str, float] = {}
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._accessed_at[key] = now
+            if len(self._accessed_at) >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accessed_at()
+                self._conn.commit()
+        assert isinstance(value, str)
+        return value
+
+    def _flush_accessed_at(self) -> None:
+        self._conn.executemany(
+            "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed_at.items()],
+        )
+        self._accessed_at.clear()
+
+    def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl if ttl is not None else None, now),
+            )
+            self._accessed_at.pop(key, None)
+            self._flush_accessed_at()
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed_at.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class RedisCache(CacheBackend):
+    """Shared tier stored in the sotopia Redis database (`REDIS_OM_URL`)."""
+
+    name = "redis"
+
+    def __init__(self, prefix: str = "sotopia:llm_cache:") -> None:
+        self.prefix = prefix
+        self._client = redis.from_url(
+            os.getenv("REDIS_OM_URL", "redis://localhost:6379")
+        )
+
+    def get(self, key: str) -> str | None:
+        value = self._client.get(self.prefix + key)
+        if value is None:
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        # Redis rejects a zero expiry, which `ex` rounds sub-second ttls down to
+        self._client.set(
+            self.prefix + key,
+            value,
+            px=max(int(ttl * 1000), 1) if ttl is not None else None,
+        )
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+
+class LLMResponseCache:
+    """
+    Tiered cache of raw LLM responses, checked from the fastest tier down.
+    A hit in a slower tier is written back to the faster ones.
+
+    Args:
+        backends (list[CacheBackend]): the tiers, fastest first
+        ttl (float | None): seconds before an entry expires, never if None
+        temperature_zero_only (bool): only cache requests sampled at temperature 0
+    """
+
+    def __init__(
+        self,
+        backends: list[CacheBackend],
+        ttl: float | None = None,
+        temperature_zero_only: bool = True,
+    ) -> None:
+        self.backends = backends
+        self.ttl = ttl
+        self.temperature_zero_only = temperature_zero_only
+        self.stats: Counter[str] = Counter()
+
+    def should_cache(self, temperature: float) -> bool:
+        return not self.temperature_zero_only or temperature == 0
+
+    def get(self, key: str) -> str | None:
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                self.stats["hits"] += 1
+                self.stats[f"{backend.name}_hits"] += 1
+                for faster_backend in self.backends[:index]:
+                    faster_backend.set(key, value, self.ttl)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        for backend in self.backends:
+            backend.set(key, value, self.ttl)
+
+    async def _aget_from(self, backend: CacheBackend, key: str) -> str | None:
+        if backend.blocking:
+            return await asyncio.to_thread(backend.get, key)
+        return backend.get(key)
+
+    async def _aset_to(self, backend: CacheBackend, key: str, value: str) -> None:
+        if backend.blocking:
+            await asyncio.to_thread(backend.set, key, value, self.ttl)
+        else:
+            backend.set(key, value, self.ttl)
+
+    async def aget(self, key: str) -> str | None:
+        """`get` for async code, with the I/O of the persistent tiers off the event loop."""
+        for index, backend in enumerate(self.backends):
+            value = await self._aget_from(backend, key)
+            if value is not None:
+                self.stats["hits"] += 1
+                self.stats[f"{backend.name}_hits"] += 1
+                for faster_backend in self.backends[:index]:
+                    await self._aset_to(faster_backend, key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def aset(self, key: str, value: str) -> None:
+        """`set` for async code, with the I/O of the persistent tiers off the event loop."""
+        for backend in self.backends:
+            await self._aset_to(backend, key, value)
+
+    def clear(self) -> None:
+        for backend in self.backends:
+            backend.clear()
+
+
+_llm_cache: LLMResponseCache | None = None
+
+
+@gin.configurable
+def get_llm_cache(
+    enabled: bool = False,
+    memory_max_entries: int = 1024,
+    sqlite_path: str | None = None,
+    sqlite_max_entries: int = 100_000,
+    use_redis: bool = False,
+    ttl: float | None = None,
+    temperature_zero_only: bool = True,
+) -> LLMResponseCache | None:
+    """
+    Get the process-wide LLM response cache, or None if caching is disabled.
+    The cache is opt-in, e.g. through gin:
+    `get_llm_cache.enabled = True` and `get_llm_cache.sqlite_path = "~/.cache/sotopia/llm.sqlite"`.
+    """
+    global _llm_cache
+    if not enabled:
+        return None
+    if _llm_cache is None:
+        backends: list[CacheBackend] = [MemoryCache(memory_max_entries)]
+        if sqlite_path:
+            backends.append(SQLiteCache(sqlite_path, sqlite_max_entries))
+        if use_redis:
+            backends.append(RedisCache())
+        _llm_cache = LLMResponseCache(
+            backends, ttl=ttl, temperature_zero_only=temperature_zero_only
+        )
+    return _llm_cache
+
+
+def get_llm_cache_stats() -> dict[str, int]:
+    """Hit/miss counters of the LLM response cache."""
+    return dict(_llm_cache.stats) if _llm_cache is not None else {}
+
+
+def reset_llm_cache() -> None:
+    """Drop the process-wide cache so that new gin bindings take effect."""
+    global _llm_cache
+    _llm_cache = None
@@ -1,11 +1,6 @@
 import logging
-import os
 from litellm import acompletion
-from litellm.utils import supports_response_schema
-from litellm.litellm_core_utils.get_supported_openai_params import (
-    get_supported_openai_params,
-)
-from typing import cast
+from typing import Any, Literal, cast
 
 import gin
 
@@ -19,7 +14,7 @@ from sotopia.messages.message_classes import (
     ScriptInteraction,
     ScriptInteractionReturnType,
 )
-from sotopia.utils import format_docstring
+from sotopia.utils import validate_public_call
 
 
 from sotopia.generation_utils.output_parsers import (
@@ -30,6 +25,11 @@ from sotopia.generation_utils.output_parsers import (
     EnvResponse,
     ScriptOutputParser,
 )
+from sotopia.generation_utils.cache import get_llm_cache, make_cache_key
+from sotopia.generation_utils.rate_limiter import estimate_tokens, get_rate_limiter
+from sotopia.generation_utils.single_flight import get_single_flight
+from sotopia.generation_utils.prompt_template import compile_template
+from sotopia.generation_utils.model_capabilities import get_model_capabilities
 
 # Configure logger
 log = logging.getLogger("sotopia.generation")
@@ -51,6 +51,75 @@ log.addHandler(console_handler)
 # subject to future OpenAI changes
 DEFAULT_BAD_OUTPUT_PROCESS_MODEL = "gpt-4o-mini"
 
+# "prefix_stable" puts the instructions first, then the growing history and
+# the per-turn fields last, so that consecutive prompts share a prefix that
+# provider prompt caching and vLLM prefix caching can reuse
+PromptLayout = Literal["default", "prefix_stable"]
+
+
+def _count_total_tokens(response: Any) -> int | None:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _count_prompt_tokens(response: Any) -> tuple[int, int]:
+    """Prompt tokens of the response, and how many of them the provider served from its prompt cache."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (
+        getattr(usage, "prompt_tokens", None) or 0,
+        getattr(details, "cached_tokens", None) or 0,
+    )
+
+
+async def _acompletion(
+    model: str,
+    messages: list[dict[str, str]],
+    rate_limit_key: str | None = None,
+    **kwargs: Any,
+) -> Any:
+    """
+    Call `litellm.acompletion` through the rate limiter shared by `rate_limit_key`.
+
+    `rate_limit_key` is the model name before `custom/...@base_url` names are
+    rewritten to `openai/...`, so that self-hosted endpoints are not limited
+    as OpenAI models; it defaults to `model`.
+    """
+    estimated_tokens = estimate_tokens(messages)
+    rate_limiter = get_rate_limiter(rate_limit_key or model)
+    response = await rate_limiter.run(
+        lambda: acompletion(model=model, messages=messages, **kwargs),
+        estimated_tokens=estimated_tokens,
+        count_tokens=_count_total_tokens,
+    )
+    prompt_tokens, cached_tokens = _count_prompt_tokens(response)
+    rate_limiter.stats["prompt_tokens"] += prompt_tokens
+    rate_limiter.stats["cached_prompt_tokens"] += cached_tokens
+    return response
+
+
+async def _acompletion_text(
+    request_key: str,
+    model: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    **kwargs: Any,
+) -> str:
+    """The content of the `_acompletion` response, shared with the identical requests in flight."""
+
+    async def complete() -> str:
+        response = await _acompletion(
+            model=model, messages=messages, temperature=temperature, **kwargs
+        )
+        content = response.choices[0].message.content
+        assert isinstance(content, str)
+        return content
+
+    single_flight = get_single_flight()
+    if single_flight is None or not single_flight.should_coalesce(temperature):
+        return await complete()
+    return await single_flight.run(request_key, complete)
+
 
 @validate_call
 async def format_bad_output(
@@ -73,7 +142,7 @@ async def format_bad_output(
         "format_instructions": format_instructions,
     }
     content = template.format(**input_values)
-    response = await acompletion(
+    response = await _acompletion(
         model=model_name,
         response_format={"type": "json_object"},
         messages=[{"role": "user", "content": content}],
@@ -85,7 +154,7 @@ async def format_bad_output(
 
 
 @gin.configurable
-@validate_call
+@validate_public_call
 async def agenerate(
     model_name: str,
     template: str,
@@ -99,65 +168,82 @@ async def agenerate(
     """Generate text using LiteLLM instead of Langchain."""
     # Format template with input values
     if "format_instructions" not in input_values:
-        input_values["format_instructions"] = output_parser.get_format_instructions()
-
-    # Process template
-    template = format_docstring(template)
-
-    # Replace template variables
-    for key, value in input_values.items():
-        template = template.replace(f"{{{key}}}", str(value))
+        input_values = {
+            **input_values,
+            "format_instructions": output_parser.get_format_instructions(),
+        }
+
+    template = compile_template(template).render(input_values)
+
+    # identifies the request both in the cache and among the requests in flight
+    request_key = make_cache_key(
+        model_name,
+        template,
+        temperature,
+        output_parser.pydantic_object.__qualname__
+        if structured_output and isinstance(output_parser, PydanticOutputParser)
+        else None,
+        type(output_parser).__qualname__,
+    )
+    cache = get_llm_cache()
+    cache_key: str | None = None
+    cached_result: str | None = None
+    if cache is not None and cache.should_cache(temperature):
+        cache_key = request_key
+        cached_result = await cache.aget(cache_key)
 
-    if model_name.startswith("custom"):
-        base_url, api_key = (
-            model_name.split("@")[1],
-            os.environ.get("CUSTOM_API_KEY", "EMPTY"),
-        )
-        model_name = model_name.split("@")[0].replace("custom/", "openai/")
-    else:
-        base_url = None
-        api_key = None
+    capabilities = get_model_capabilities(model_name)
+    rate_limit_key, model_name = model_name, capabilities.model
+    base_url, api_key = capabilities.base_url, capabilities.api_key
 
     if structured_output:
-        if not base_url:
-            params = get_supported_openai_params(model=model_name)
-            assert params is not None
-            assert (
-                "response_format" in params
-            ), "response_format is not supported in this model"
-            assert supports_response_schema(
-                model=model_name
-            ), "response_schema is not supported in this model"
+        assert (
+            capabilities.supports_response_format
+        ), "response_format is not supported in this model"
+        assert (
+            capabilities.supports_response_schema
+        ), "response_schema is not supported in this model"
         messages = [{"role": "user", "content": template}]
 
         assert isinstance(
             output_parser, PydanticOutputParser
         ), "structured output only supported in PydanticOutputParser"
-        response = await acompletion(
-            model=model_name,
-            messages=messages,
-            response_format=output_parser.pydantic_object,
-            drop_params=True,  # drop params to avoid model error if the model does not support it
-            temperature=temperature,
-            base_url=base_url,
-            api_key=api_key,
-        )
-        result = response.choices[0].message.content
+        if cached_result is not None:
+            result = cached_result
+        else:
+            result = await _acompletion_text(
+                request_key,
+                model=model_name,
+                messages=messages,
+                response_format=output_parser.pydantic_object,
+                drop_params=True,  # drop params to avoid model error if the model does not support it
+                temperature=temperature,
+                base_url=base_url,
+                api_key=api_key,
+                rate_limit_key=rate_limit_key,
+            )
         log.info(f"Generated result: {result}")
         assert isinstance(result, str)
-        return cast(OutputType, output_parser.parse(result))
+        structured_result = cast(OutputType, output_parser.parse(result))
+        if cache is not None and cache_key is not None and cached_result is None:
+            await cache.aset(cache_key, result)
+        return structured_result
 
     messages = [{"role": "user", "content": template}]
 
-    response = await acompletion(
-        model=model_name,
-        messages=messages,
-        temperature=temperature,
-        drop_params=True,
-        api_base=base_url,
-        api_key=api_key,
-    )
-    result = response.choices[0].message.content
+    if cached_result is not None:
+        result = cached_result
+    else:
+        result = await _acompletion_text(
+            request_key,
+            model=model_name,
+            messages=messages,
+            temperature=temperature,
+            drop_params=True,
+            api_base=base_url,
+            api_key=api_key,
+            rate_limit_key=rate_limit_key,
+        )
 
     try:
         parsed_result = output_parser.parse(result)
@@ -176,7 +262,11 @@ async def agenerate(
             use_fixed_model_version,
         )
         parsed_result = output_parser.parse(reformat_result)
+        # cache the output that could be parsed
+        result = reformat_result
 
+    if cache is not None and cache_key is not None and cached_result is None:
+        await cache.aset(cache_key, result)
     log.info(f"Generated result: {parsed_result}")
     return parsed_result
 
@@ -242,7 +332,7 @@ async def agenerate_relationship_profile(
 
 
 @gin.configurable
-@validate_call
+@validate_public_call
 async def agenerate_action(
     model_name: str,
     history: str,
@@ -254,12 +344,28 @@ async def agenerate_action(
     script_like: bool = False,
     bad_output_process_model: str | None = None,
     use_fixed_model_version: bool = True,
+    prompt_layout: PromptLayout = "default",
 ) -> AgentAction:
     """
     Using langchain to generate an example episode
     """
     try:
-        if script_like:
+        if script_like and prompt_layout == "prefix_stable":
+            template = """
+                Now you are a famous playwright, your task is to continue writing one turn for agent {agent} under a given background and history to help {agent} reach social goal. Please continue the script based on the previous turns. You can only generate one turn at a time.
+                You can find {agent}'s background and goal in the 'Here is the context of the interaction' field.
+                You should try your best to achieve {agent}'s goal in a way that align with their character traits.
+                Additionally, maintaining the conversation's naturalness and realism is essential (e.g., do not repeat what other people has already said before).
+                Note: The script can be ended if 1. one agent have achieved social goals, 2. this conversation makes the agent uncomfortable, 3. the agent find it uninteresting/you lose your patience, 4. or for other reasons you think it should stop.
+
+                Please only generate a JSON string including the action type and the argument.
+                Your action should follow the given format:
+                {format_instructions}
+                {history}.
+                The script has proceeded to Turn #{turn_number}. Current available action types are
+                {action_list}.
+            """
+        elif script_like:
             # model as playwright
             template = """
                 Now you are a famous playwright, your task is to continue writing one turn for agent {agent} under a given background and history to help {agent} reach social goal. Please continue the script based on the previous turns. You can only generate one turn at a time.
@@ -275,6 +381,22 @@ async def agenerate_action(
                 Your action should follow the given format:
                 {format_instructions}
             """
+        elif prompt_layout == "prefix_stable":
+            template = """
+                Imagine you are {agent}, your task is to act/speak as {agent} would, keeping in mind {agent}'s social goal.
+                You can find {agent}'s goal (or background) in the 'Here is the context of the interaction' field.
+                Note that {agent}'s goal is only visible to you.
+                You should try your best to achieve {agent}'s goal in a way that align with their character traits.
+                Additionally, maintaining the conversation's naturalness and realism is essential (e.g., do not repeat what other people has already said before).
+                Note: You can "leave" this conversation if 1. you have achieved your social goals, 2. this conversation makes you uncomfortable, 3. you find it uninteresting/you lose your patience, 4. or for other reasons you want to leave.
+
+                Please only generate a JSON string including the action type and the argument.
+                Your action should follow the given format:
+                {format_instructions}
+                {history}.
+                You are at Turn #{turn_number}. Your available action types are
+                {action_list}.
+            """
         else:
             # Normal case, model as agent
             template = """
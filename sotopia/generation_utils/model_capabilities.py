@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Iterable
+
+from litellm.litellm_core_utils.get_supported_openai_params import (
+    get_supported_openai_params,
+)
+from litellm.utils import supports_response_schema
+
+# Upper bound of the memoized model names
+MODEL_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class ModelCapabilities:
+    """
+    What sotopia needs to know about a model name before calling it.
+
+    `custom/<model>@<base_url>` names are served by an OpenAI compatible server
+    at `base_url`, with the `CUSTOM_API_KEY` environment variable as API key;
+    `custom/structured...` names opt into structured output. The support of
+    structured output is only looked up in litellm's model metadata when it
+    is first needed.
+    """
+
+    model: str
+    base_url: str | None
+    structured_output: bool
+
+    @property
+    def api_key(self) -> str | None:
+        # read at call time, the memoized record outlives changes of the environment
+        if self.base_url is None:
+            return None
+        return os.environ.get("CUSTOM_API_KEY", "EMPTY")
+
+    @cached_property
+    def supports_response_format(self) -> bool:
+        # the capabilities of custom servers are not known to litellm, trust the model name
+        if self.base_url is not None:
+            return True
+        params = get_supported_openai_params(model=self.model)
+        return params is not None and "response_format" in params
+
+    @cached_property
+    def supports_response_schema(self) -> bool:
+        if self.base_url is not None:
+            return True
+        return supports_response_schema(model=self.model)
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def get_model_capabilities(model_name: str) -> ModelCapabilities:
+    """Resolve `model_name` once; litellm's model metadata does not change at runtime."""
+    if model_name.startswith("custom"):
+        return ModelCapabilities(
+            model=model_name.split("@")[0].replace("custom/", "openai/"),
+            base_url=model_name.split("@")[1],
+            structured_output=model_name.startswith("custom/structured"),
+        )
+    return ModelCapabilities(model=model_name, base_url=None, structured_output=False)
+
+
+def warm_model_capabilities(model_names: Iterable[str]) -> None:
+    """Resolve the model names of a run ahead of its first requests."""
+    for model_name in set(model_names):
+        get_model_capabilities(model_name)
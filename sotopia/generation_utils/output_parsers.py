@@ -1,12 +1,168 @@
 import json
 import re
-from typing import Generic, Type, TypeVar, Optional
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable, Generic, Iterator, Type, TypeVar, Optional
 from pydantic import BaseModel, Field
 import json_repair
 
 OutputType = TypeVar("OutputType", bound=object)
 T = TypeVar("T", bound=BaseModel)
 
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|$)", re.DOTALL)
+_parse_stats: Counter[str] = Counter()
+# Upper bound of the cached format instructions, one per output schema
+SCHEMA_CACHE_SIZE = 256
+
+
+def _strip_code_fence(text: str) -> str:
+    match = _CODE_FENCE.search(text)
+    return match.group(1) if match else text
+
+
+def _outside_strings(text: str) -> Iterator[tuple[int, str]]:
+    """Yield the index and character of each character of `text` outside the JSON strings."""
+    in_string = escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        else:
+            yield index, char
+
+
+def _strip_surrounding_text(text: str) -> str:
+    start = text.find("{")
+    if start == -1:
+        return text
+    depth = 0
+    for index, char in _outside_strings(text[start:]):
+        if char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start : start + index + 1]
+    # cut off before the object closes, left to the truncated rung
+    return text[start:]
+
+
+def _remove_trailing_commas(text: str) -> str:
+    dropped: set[int] = set()
+    comma: int | None = None
+    for index, char in _outside_strings(text):
+        if char in "}]" and comma is not None:
+            dropped.add(comma)
+        if not char.isspace():
+            comma = index if char == "," else None
+    return "".join(char for index, char in enumerate(text) if index not in dropped)
+
+
+def _single_to_double_quotes(text: str) -> str:
+    """Rewrite the single-quoted strings of `text` as JSON strings."""
+    out: list[str] = []
+    quote: str | None = None
+    chars = iter(text)
+    for char in chars:
+        if quote is None:
+            if char in "'\"":
+                quote = char
+                char = '"'
+        elif char == "\\":
+            escaped = next(chars, "")
+            char = escaped if escaped == "'" else char + escaped
+        elif char == quote:
+            quote = None
+            char = '"'
+        elif char == '"':
+            char = '\\"'
+        out.append(char)
+    return "".join(out)
+
+
+def _close_truncated_json(text: str) -> str:
+    """Close the string, arrays and objects left open by an output cut off mid-JSON."""
+    closers: list[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    if not closers and not in_string:
+        return text
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(closers))
+
+
+# cheap local fixes, each applied on top of the previous ones until the output decodes
+REPAIR_LADDER: tuple[tuple[str, Callable[[str], str]], ...] = (
+    ("strict", lambda text: text),
+    ("code_fence", _strip_code_fence),
+    ("surrounding_text", _strip_surrounding_text),
+    ("trailing_commas", _remove_trailing_commas),
+    ("single_quotes", _single_to_double_quotes),
+    ("truncated", _close_truncated_json),
+)
+
+
+def decode_json_object(result: str) -> tuple[dict[str, Any], str]:
+    """
+    Decode the JSON object of an LLM output, climbing `REPAIR_LADDER` as long as it does not decode.
+
+    Returns the object and the name of the rung that decoded it; `json_repair`
+    is the last resort before giving up with a ValueError.
+    """
+    text = result
+    for rung, repair in REPAIR_LADDER:
+        repaired = repair(text)
+        if repaired == text and rung != "strict":
+            continue
+        text = repaired
+        try:
+            decoded = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(decoded, dict):
+            return decoded, rung
+    decoded = json_repair.loads(result)
+    if isinstance(decoded, dict):
+        return decoded, "json_repair"
+    raise ValueError(f"No JSON object found in the output: {result}")
+
+
+def get_output_parse_stats() -> dict[str, int]:
+    """How many outputs each rung of the repair ladder parsed, and how many could not be parsed."""
+    return dict(_parse_stats)
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def _schema_format_instructions(pydantic_object: Type[BaseModel]) -> str:
+    return json.dumps(pydantic_object.model_json_schema())
+
 
 class EnvResponse(BaseModel):
     reasoning: str = Field(
@@ -28,18 +184,20 @@ class PydanticOutputParser(OutputParser[T], Generic[T]):
     pydantic_object: Type[T]
 
     def parse(self, result: str) -> T:
-        json_result = json_repair.loads(result)
-        assert isinstance(json_result, dict)
-        if "properties" in json_result:
-            return self.pydantic_object.model_validate_json(
-                json.dumps(json_result["properties"])
-            )
-        else:
-            parsed_result = self.pydantic_object.model_validate_json(result)
-            return parsed_result
+        try:
+            json_result, rung = decode_json_object(result)
+            # some models answer with the filled in schema
+            if isinstance(json_result.get("properties"), dict):
+                json_result, rung = json_result["properties"], "properties"
+            parsed_result = self.pydantic_object.model_validate(json_result)
+        except ValueError:
+            _parse_stats["failed"] += 1
+            raise
+        _parse_stats[rung] += 1
+        return parsed_result
 
     def get_format_instructions(self) -> str:
-        return json.dumps(self.pydantic_object.model_json_schema())
+        return _schema_format_instructions(self.pydantic_object)
 
 
 class EnvResponsePydanticOutputParser(PydanticOutputParser[EnvResponse]):
@@ -0,0 +1,44 @@
+import re
+from functools import lru_cache
+from typing import Mapping
+
+from sotopia.utils import format_docstring
+
+# Upper bound of the compiled template cache. Prompts are built from a small
+# set of templates that are rendered on every turn.
+TEMPLATE_CACHE_SIZE = 1024
+
+_SLOT = re.compile(r"\{(\w+)\}")
+
+
+class CompiledTemplate:
+    """A prompt template normalized by `format_docstring` and split around its `{name}` slots."""
+
+    __slots__ = ("literals", "slots")
+
+    def __init__(self, template: str) -> None:
+        normalized = format_docstring(template)
+        self.literals: list[str] = []
+        self.slots: list[str] = []
+        position = 0
+        for match in _SLOT.finditer(normalized):
+            self.literals.append(normalized[position : match.start()])
+            self.slots.append(match.group(1))
+            position = match.end()
+        self.literals.append(normalized[position:])
+
+    def render(self, input_values: Mapping[str, object]) -> str:
+        """Fill in the slots named in `input_values`; the other slots are left as they are."""
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            parts.append(
+                str(input_values[slot]) if slot in input_values else f"{{{slot}}}"
+            )
+            parts.append(literal)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(template: str) -> CompiledTemplate:
+    """The compiled form of `template`, shared by every render of it."""
+    return CompiledTemplate(template)
@@ -0,0 +1,283 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, TypeVar
+
+import gin
+
+log = logging.getLogger("sotopia.generation")
+
+T = TypeVar("T")
+
+# Rough number of characters per token, used to estimate the prompt size
+# before a request is sent. Actual usage is reconciled after the response.
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None) -> None:
+        assert rate_per_minute > 0, "rate_per_minute must be positive"
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Take tokens without waiting; the balance may go negative."""
+        self._refill()
+        self.tokens -= amount
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until `amount` tokens are available and take them.
+
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        amount = min(amount, self.capacity)
+        while True:
+            delay = self.wait_time(amount)
+            if delay <= 0:
+                self.tokens -= amount
+                return waited
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or (
+        type(error).__name__ == "RateLimitError"
+    )
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Requests/tokens per minute buckets plus a concurrency cap for one key.
+
+    Args:
+        name (str): the model or provider this limiter is shared by
+        requests_per_minute (float | None): request budget, unlimited if None
+        tokens_per_minute (float | None): token budget, unlimited if None
+        max_concurrency (int | None): maximum number of in-flight requests, unlimited if None
+        max_retries (int): how many times a rate-limited (429) request is retried
+        backoff_base (float): first backoff delay in seconds when the provider sends no Retry-After
+        backoff_max (float): upper bound of the exponential backoff delay in seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_concurrency: int | None = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ) -> None:
+        self.name = name
+        self.request_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats: defaultdict[str, float] = defaultdict(float)
+        self._backoff_until = 0.0
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+
+    @contextlib.asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        if self.max_concurrency is None:
+            yield
+            return
+        # asyncio primitives are bound to the loop they are first used in,
+        # and scripts often call `asyncio.run` more than once per process.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.BoundedSemaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            yield
+
+    async def _wait_for_budget(self, estimated_tokens: int) -> None:
+        waited = 0.0
+        delay = self._backoff_until - time.monotonic()
+        if delay > 0:
+            waited += delay
+            await asyncio.sleep(delay)
+        if self.request_bucket is not None:
+            waited += await self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            waited += await self.token_bucket.acquire(estimated_tokens)
+        if waited > 0:
+            self.stats["throttled"] += 1
+            self.stats["throttled_seconds"] += waited
+
+    def record_usage(self, actual_tokens: int, estimated_tokens: int) -> None:
+        """Reconcile the token bucket with the usage reported by the provider."""
+        self.stats["tokens"] += actual_tokens
+        if self.token_bucket is not None and actual_tokens != estimated_tokens:
+            self.token_bucket.consume(actual_tokens - estimated_tokens)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        count_tokens: Callable[[T], int | None] | None = None,
+    ) -> T:
+        """Run `call` once there is budget for it, retrying on rate limit errors."""
+        attempt = 0
+        while True:
+            async with self._slot():
+                await self._wait_for_budget(estimated_tokens)
+                self.stats["requests"] += 1
+                try:
+                    result = await call()
+                except Exception as e:
+                    if not _is_rate_limit_error(e):
+                        self.stats["errors"] += 1
+                        raise
+                    self.stats["rate_limited"] += 1
+                    if attempt >= self.max_retries:
+                        raise
+                    retry_after = _retry_after_seconds(e)
+                    delay = (
+                        retry_after
+                        if retry_after is not None
+                        else min(self.backoff_max, self.backoff_base * 2**attempt)
+                    )
+                    self._backoff_until = max(
+                        self._backoff_until, time.monotonic() + delay
+                    )
+                    log.warning(
+                        f"Rate limited by {self.name}, retrying in {delay:.1f}s "
+                        f"(attempt {attempt + 1}/{self.max_retries})"
+                    )
+                    self.stats["retries"] += 1
+                    attempt += 1
+                    continue
+            if count_tokens is not None:
+                actual_tokens = count_tokens(result)
+                if actual_tokens is not None:
+                    self.record_usage(actual_tokens, estimated_tokens)
+            return result
+
+
+_rate_limiters: dict[str, RateLimiter] = {}
+
+# Fraction of the configured budgets this process may use, e.g. 1/N in each
+# of N worker processes sharing the same API keys
+_rate_limit_share = 1.0
+
+
+@gin.configurable
+def get_rate_limiter(
+    model_name: str,
+    requests_per_minute: float | None = None,
+    tokens_per_minute: float | None = None,
+    max_concurrency: int | None = None,
+    max_retries: int = 3,
+    limits: dict[str, dict[str, Any]] = {},
+) -> RateLimiter:
+    """
+    Get the limiter shared by every request to `model_name`.
+
+    `limits` maps a model name (e.g. "gpt-4o") or a provider prefix
+    (e.g. "together_ai") to keyword arguments of `RateLimiter`. A model
+    matching a provider entry shares that provider's budget. Models that
+    match nothing get their own limiter built from the default arguments.
+    The provider of a self-hosted `custom/<model>@<base_url>` model is its
+    `base_url`, so each endpoint has its own budget.
+    All arguments can be bound through gin, e.g.
+    `get_rate_limiter.limits = {"openai": {"requests_per_minute": 500}}`.
+    """
+    if model_name.startswith("custom") and "@" in model_name:
+        provider = model_name.split("@", 1)[1]
+    else:
+        provider = model_name.split("/")[0]
+    if model_name in limits:
+        key, config = model_name, limits[model_name]
+    elif provider in limits:
+        key, config = provider, limits[provider]
+    else:
+        key, config = model_name, {}
+    if key not in _rate_limiters:
+        kwargs: dict[str, Any] = {
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+            "max_concurrency": max_concurrency,
+            "max_retries": max_retries,
+            **config,
+        }
+        if _rate_limit_share < 1:
+            for budget in ("requests_per_minute", "tokens_per_minute"):
+                if kwargs[budget]:
+                    kwargs[budget] = kwargs[budget] * _rate_limit_share
+            if kwargs["max_concurrency"]:
+                kwargs["max_concurrency"] = max(
+                    1, int(kwargs["max_concurrency"] * _rate_limit_share)
+                )
+        _rate_limiters[key] = RateLimiter(name=key, **kwargs)
+    return _rate_limiters[key]
+
+
+def get_rate_limiter_stats() -> dict[str, dict[str, float]]:
+    """Counters (requests, tokens, prompt_tokens, cached_prompt_tokens, throttled, rate_limited, retries, ...) per limiter."""
+    return {key: dict(limiter.stats) for key, limiter in _rate_limiters.items()}
+
+
+def reset_rate_limiters() -> None:
+    """Drop all limiters so that new gin bindings take effect."""
+    _rate_limiters.clear()
+
+
+def set_rate_limit_share(share: float) -> None:
+    """Scale the budgets of this process's limiters by `share` (0 < share <= 1).
+
+    Used when several processes run with the same API keys, so that together
+    they stay within the configured limits.
+    """
+    global _rate_limit_share
+    assert 0 < share <= 1, "share must be in (0, 1]"
+    _rate_limit_share = share
+    reset_rate_limiters()
+
+
+def estimate_tokens(messages: list[dict[str, str]]) -> int:
+    return sum(len(message.get("content") or "") for message in messages) // (
+        CHARS_PER_TOKEN
+    )
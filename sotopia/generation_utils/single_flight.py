@@ -0,0 +1,103 @@
+import asyncio
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Generic, TypeVar
+
+import gin
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces identical requests that are in flight at the same time.
+
+    The first caller of a key starts the call in its own task; later callers
+    of the same key await that task instead of issuing a duplicate request.
+    Cancelling one caller does not cancel the call for the others.
+
+    Args:
+        temperature_zero_only (bool): only coalesce requests sampled at temperature 0
+        max_tracked_keys (int): number of most recent keys `key_stats` keeps counters for
+    """
+
+    def __init__(
+        self, temperature_zero_only: bool = True, max_tracked_keys: int = 1024
+    ) -> None:
+        self.temperature_zero_only = temperature_zero_only
+        self.max_tracked_keys = max_tracked_keys
+        self.stats: Counter[str] = Counter()
+        self.key_stats: OrderedDict[str, Counter[str]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task[T]] = {}
+
+    def should_coalesce(self, temperature: float) -> bool:
+        return not self.temperature_zero_only or temperature == 0
+
+    def _count(self, key: str, event: str) -> None:
+        self.stats[event] += 1
+        key_stats = self.key_stats.setdefault(key, Counter())
+        key_stats[event] += 1
+        self.key_stats.move_to_end(key)
+        while len(self.key_stats) > self.max_tracked_keys:
+            self.key_stats.popitem(last=False)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Await the in-flight call of `key`, or start `call` if there is none."""
+        task = self._in_flight.get(key)
+        # tasks are bound to their loop, and scripts may call `asyncio.run` more than once
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+
+            async def run_call() -> T:
+                try:
+                    return await call()
+                finally:
+                    if self._in_flight.get(key) is task:
+                        del self._in_flight[key]
+
+            task = asyncio.ensure_future(run_call())
+            self._in_flight[key] = task
+            self._count(key, "requests")
+        else:
+            self._count(key, "coalesced")
+        return await asyncio.shield(task)
+
+
+_single_flight: SingleFlight[str] | None = None
+
+
+@gin.configurable
+def get_single_flight(
+    enabled: bool = True,
+    temperature_zero_only: bool = True,
+    max_tracked_keys: int = 1024,
+) -> SingleFlight[str] | None:
+    """
+    Get the process-wide single-flight layer of LLM requests, or None if it is disabled.
+    Sampled (temperature > 0) requests are not coalesced unless
+    `get_single_flight.temperature_zero_only = False`.
+    """
+    global _single_flight
+    if not enabled:
+        return None
+    if _single_flight is None:
+        _single_flight = SingleFlight(
+            temperature_zero_only=temperature_zero_only,
+            max_tracked_keys=max_tracked_keys,
+        )
+    return _single_flight
+
+
+def get_single_flight_stats() -> dict[str, int]:
+    """Numbers of requests issued and of requests coalesced into an in-flight one, see `get_single_flight_key_stats` per key."""
+    return dict(_single_flight.stats) if _single_flight is not None else {}
+
+
+def get_single_flight_key_stats() -> dict[str, dict[str, int]]:
+    """The `requests` and `coalesced` counters of each of the most recent request keys."""
+    if _single_flight is None:
+        return {}
+    return {key: dict(stats) for key, stats in _single_flight.key_stats.items()}
+
+
+def reset_single_flight() -> None:
+    global _single_flight
+    _single_flight = None
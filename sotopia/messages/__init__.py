@@ -7,6 +7,7 @@ from .message_classes import (
     ScriptEnvironmentResponse,
     SimpleMessage,
 )
+from .message_log import MessageLog
 from .messenger import MessengerMixin
 
 __all__ = [
@@ -18,4 +19,5 @@ __all__ = [
     "ActionType",
     "SimpleMessage",
     "MessengerMixin",
+    "MessageLog",
 ]
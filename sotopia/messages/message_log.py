@@ -0,0 +1,66 @@
+from typing import TYPE_CHECKING, Any, Iterable, SupportsIndex
+
+from .message_classes import AgentAction, Message
+
+
+class MessageLog(list[tuple[str, Message]]):
+    """
+    Append-only `(sender, message)` log, a drop-in for the inbox list of an env.
+
+    Alongside the messages it keeps the rendered text of each message (computed
+    once, on first use) and the number of consecutive "none" actions at the end
+    of the log, so that the evaluators read them every turn without rescanning
+    or re-rendering the log.
+    """
+
+    def __init__(self, messages: Iterable[tuple[str, Message]] = ()) -> None:
+        super().__init__()
+        self._texts: list[str | None] = []
+        # consecutive "none" actions at the end of the log, environment messages aside
+        self.stale_streak = 0
+        self.extend(messages)
+
+    def append(self, item: tuple[str, Message]) -> None:
+        sender, message = item
+        super().append(item)
+        self._texts.append(None)
+        if sender != "Environment":
+            self.stale_streak = (
+                self.stale_streak + 1
+                if isinstance(message, AgentAction) and message.action_type == "none"
+                else 0
+            )
+
+    def extend(self, items: Iterable[tuple[str, Message]]) -> None:
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items: Iterable[tuple[str, Message]]) -> "MessageLog":  # type: ignore[override,misc]
+        self.extend(items)
+        return self
+
+    if not TYPE_CHECKING:
+
+        def _not_append_only(self, *args: Any, **kwargs: Any) -> None:
+            raise TypeError("MessageLog is append-only")
+
+        insert = __setitem__ = __delitem__ = pop = remove = clear = sort = reverse = (
+            _not_append_only
+        )
+
+    def __reduce__(
+        self,
+    ) -> tuple[type["MessageLog"], tuple[list[tuple[str, Message]]]]:
+        # rebuilt from the messages, the rest is derived from them
+        return (MessageLog, (list(self),))
+
+    def text(self, index: SupportsIndex) -> str:
+        """The natural language rendering of the message at `index`, cached."""
+        text = self._texts[index]
+        if text is None:
+            text = self._texts[index] = self[index][1].to_natural_language()
+        return text
+
+    def texts(self, start: int = 0) -> list[str]:
+        """The natural language rendering of the messages from index `start` on."""
+        return [self.text(index) for index in range(start, len(self))]
@@ -1,5 +1,7 @@
 """XML Renderer for background, goal, observation, etc."""
 
+import re
+from functools import lru_cache
 from io import StringIO
 from typing import cast
 
@@ -40,37 +42,79 @@ def _render_xml(xml_node: etree._Element | str, context: RenderContext) -> str:
         return ""
 
 
-class XMLRenderer(BaseRenderer):
-    def __init__(self) -> None:
-        super().__init__()
-        self.parser = etree.XMLParser(recover=True, encoding="utf-8")
+# Upper bounds of the parsed tree and rendered string caches. The same
+# backgrounds, goals and observations are rendered for every agent and turn.
+PARSE_CACHE_SIZE = 1024
+RENDER_CACHE_SIZE = 4096
+
+_recover_parser = etree.XMLParser(recover=True, encoding="utf-8")
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_xml(xml_string: str) -> etree._Element:
+    """Parse `xml_string` leniently. The returned tree is shared and must not be mutated."""
+    try:
+        return etree.fromstring(xml_string)
+    except etree.XMLSyntaxError:
+        # try wrapping the xml_string with a pair of root tags
+        try:
+            return etree.fromstring(f"<root>{xml_string}</root>")
+        except etree.XMLSyntaxError:
+            # try escaping the xml_string
+            table = str.maketrans(
+                {
+                    "&": "&amp;",
+                }
+            )
+            try:
+                return etree.parse(
+                    StringIO(f"<root>{xml_string.translate(table)}</root>"),
+                    _recover_parser,
+                ).getroot()
+            except etree.XMLSyntaxError as e:
+                raise etree.XMLSyntaxError(
+                    f"Failed to parse xml_string: {xml_string}"
+                ) from e
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_xml_string(
+    xml_string: str, viewer: str, verbose: bool, tags_to_render: tuple[str, ...]
+) -> str:
+    # the caller's context was validated already
+    return _render_xml(
+        _parse_xml(xml_string),
+        RenderContext.model_construct(
+            viewer=viewer, verbose=verbose, tags_to_render=list(tags_to_render)
+        ),
+    )
+
 
+# characters the xml parser does not keep as they are: markup, entities, "\r"
+# (normalized), "]]>" and the characters XML does not allow (dropped on recovery)
+_NOT_PLAIN_TEXT = re.compile(
+    "[<&\r\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]|]]>"
+)
+
+
+def _is_plain_text(text: str) -> bool:
+    return _NOT_PLAIN_TEXT.search(text) is None
+
+
+class XMLRenderer(BaseRenderer):
     def __call__(
         self, xml_string: str, context: RenderContext = RenderContext()
     ) -> str:
         if not xml_string:
             return ""
-        try:
-            root = etree.fromstring(xml_string)
-        except etree.XMLSyntaxError:
-            # try wrapping the xml_string with a pair of root tags
-            try:
-                root = etree.fromstring(f"<root>{xml_string}</root>")
-            except etree.XMLSyntaxError:
-                # try escaping the xml_string
-                table = str.maketrans(
-                    {
-                        "&": "&amp;",
-                    }
-                )
-                try:
-                    root = etree.parse(
-                        StringIO(f"<root>{xml_string.translate(table)}</root>"),
-                        self.parser,
-                    ).getroot()
-                except etree.XMLSyntaxError as e:
-                    raise etree.XMLSyntaxError(
-                        f"Failed to parse xml_string: {xml_string}"
-                    ) from e
-
-        return _render_xml(root, context)
+        if (
+            context.viewer.startswith("agent_") or context.viewer == "environment"
+        ) and _is_plain_text(xml_string):
+            # plain text renders to itself for agents and the environment
+            return xml_string
+        return _render_xml_string(
+            xml_string,
+            context.viewer,
+            context.verbose,
+            tuple(context.tags_to_render),
+        )
@@ -1,12 +1,16 @@
 from typing import Any, Generator, Generic, Sequence, Type, TypeVar
 
 from sotopia.agents.base_agent import BaseAgent
+from sotopia.database.bulk_fetch import ProfileCache
 from sotopia.database.persistent_profile import (
     AgentProfile,
     EnvironmentProfile,
+    RelationshipProfile,
 )
 from sotopia.envs.parallel import ParallelSotopiaEnv
 
+from .relationship_index import RelationshipIndex
+
 ObsType = TypeVar("ObsType")
 ActType = TypeVar("ActType")
 
@@ -21,6 +25,41 @@ class BaseSampler(Generic[ObsType, ActType]):
     ) -> None:
         self.env_candidates = env_candidates
         self.agent_candidates = agent_candidates
+        # profiles are loaded in bulk and kept for the lifetime of the sampler
+        self.env_profiles = ProfileCache(EnvironmentProfile)
+        self.agent_profiles = ProfileCache(AgentProfile)
+        self.relationship_profiles = ProfileCache(RelationshipProfile)
+        self._relationship_index: RelationshipIndex | None = None
+
+    @property
+    def relationship_index(self) -> RelationshipIndex:
+        """
+        Relationship/age index, built on first use. The samplers index the
+        relationships created or deleted since their last `sample`; call
+        `relationship_index.refresh()` after editing relationships or agent ages.
+        """
+        if self._relationship_index is None:
+            self._relationship_index = RelationshipIndex(
+                self.relationship_profiles, self.agent_profiles
+            )
+        return self._relationship_index
+
+    def _prefetch_candidates(self) -> None:
+        """Bulk-load the candidates given as ids and cache the ones given as profiles."""
+        if self.env_candidates:
+            self.env_profiles.add(
+                env for env in self.env_candidates if not isinstance(env, str)
+            )
+            self.env_profiles.prefetch(
+                env for env in self.env_candidates if isinstance(env, str)
+            )
+        if self.agent_candidates:
+            self.agent_profiles.add(
+                agent for agent in self.agent_candidates if not isinstance(agent, str)
+            )
+            self.agent_profiles.prefetch(
+                agent for agent in self.agent_candidates if isinstance(agent, str)
+            )
 
     def sample(
         self,
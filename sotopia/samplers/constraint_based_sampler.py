@@ -1,4 +1,3 @@
-import ast
 import random
 from typing import Any, Generator, Type, TypeVar
 
@@ -6,53 +5,32 @@ from sotopia.agents.base_agent import BaseAgent
 from sotopia.database import (
     AgentProfile,
     EnvironmentProfile,
-    RelationshipProfile,
 )
 from sotopia.envs.parallel import ParallelSotopiaEnv
 
 from .base_sampler import BaseSampler, EnvAgentCombo
+from .relationship_index import RelationshipIndex
 
 ObsType = TypeVar("ObsType")
 ActType = TypeVar("ActType")
 
 
 def _get_fit_agents_for_one_env(
-    env_profile_id: str, agent_candidate_ids: set[str] | None, size: int
+    env_profile: EnvironmentProfile,
+    relationship_index: RelationshipIndex,
+    size: int,
 ) -> list[list[str]]:
-    env = EnvironmentProfile.get(env_profile_id)
-
-    relationship_constraint = env.relationship
-    available_relationships = RelationshipProfile.find(
-        RelationshipProfile.relationship == relationship_constraint
-    ).all()
-    age_contraint = env.age_constraint
+    age_contraint = env_profile.age_constraint
     assert isinstance(age_contraint, str)
-    if age_contraint != "[(18, 70), (18, 70)]":
-        age_contraint_list = ast.literal_eval(age_contraint)
-        available_relationships = [
-            relationship
-            for relationship in available_relationships
-            if (
-                age_contraint_list[0][0]
-                <= AgentProfile.get(relationship.agent_1_id).age  # type: ignore[attr-defined]
-                <= age_contraint_list[0][1]
-                and age_contraint_list[1][0]
-                <= AgentProfile.get(relationship.agent_2_id).age  # type: ignore[attr-defined]
-                <= age_contraint_list[1][1]
-            )
-        ]
+    available_relationships = relationship_index.query(
+        env_profile.relationship, age_contraint
+    )
     if len(available_relationships) < size:
         raise ValueError(
             f"Number of available relationships ({len(available_relationships)}) "
             f"is smaller than the required size ({size})"
         )
-    random.shuffle(available_relationships)
-    selected_relationship = available_relationships[:size]
-    fit_agents = []
-    for relationship in selected_relationship:
-        assert isinstance(relationship, RelationshipProfile)
-        fit_agents.append([relationship.agent_1_id, relationship.agent_2_id])
-    return fit_agents
+    return random.sample(available_relationships, size)
 
 
 class ConstraintBasedSampler(BaseSampler[ObsType, ActType]):
@@ -98,14 +76,10 @@ class ConstraintBasedSampler(BaseSampler[ObsType, ActType]):
                 raise ValueError("No agent candidates available for sampling.")
             self.agent_candidates = agent_candidates
 
-        agent_candidate_ids: set[str] | None = None
-        if self.agent_candidates:
-            agent_candidate_ids = set(
-                str(agent.pk) if not isinstance(agent, str) else agent
-                for agent in self.agent_candidates
-            )
-        else:
-            agent_candidate_ids = None
+        # load every profile needed for sampling in a few bulk round-trips,
+        # all filtering below happens in memory
+        self._prefetch_candidates()
+        self.relationship_index.update()
 
         if not replacement:
             assert self.env_candidates and len(self.env_candidates) == 1, (
@@ -122,26 +96,30 @@ class ConstraintBasedSampler(BaseSampler[ObsType, ActType]):
 
             assert env_profile_id, "Env candidate must have an id"
 
-            agents_which_fit_scenario = _get_fit_agents_for_one_env(
-                env_profile_id, agent_candidate_ids, size
-            )
-            env_profiles = (
-                [EnvironmentProfile.get(env_profile_id)] * size
+            env_profile = (
+                self.env_profiles[env_profile_id]
                 if isinstance(self.env_candidates[0], str)
-                else [self.env_candidates[0]] * size
+                else self.env_candidates[0]
             )
+            agents_which_fit_scenario = _get_fit_agents_for_one_env(
+                env_profile, self.relationship_index, size
+            )
+            env_profiles = [env_profile] * size
         else:
             for _ in range(size):
-                env_profile = random.choice(self.env_candidates)
-                if isinstance(env_profile, str):
-                    env_profile = EnvironmentProfile.get(env_profile)
+                env_candidate = random.choice(self.env_candidates)
+                env_profile = (
+                    self.env_profiles[env_candidate]
+                    if isinstance(env_candidate, str)
+                    else env_candidate
+                )
                 env_profiles.append(env_profile)
                 env_profile_id = env_profile.pk
                 assert env_profile_id, "Env candidate must have an id"
                 agents_which_fit_scenario.append(
-                    _get_fit_agents_for_one_env(env_profile_id, agent_candidate_ids, 1)[
-                        0
-                    ]
+                    _get_fit_agents_for_one_env(
+                        env_profile, self.relationship_index, 1
+                    )[0]
                 )
 
         assert len(env_profiles) == size, "Number of env_profiles is not equal to size"
@@ -153,7 +131,7 @@ class ConstraintBasedSampler(BaseSampler[ObsType, ActType]):
             env_profiles, agents_which_fit_scenario
         ):
             env = ParallelSotopiaEnv(env_profile=env_profile, **env_params)
-            agent_profiles = [AgentProfile.get(id) for id in agent_profile_id_list]
+            agent_profiles = [self.agent_profiles[id] for id in agent_profile_id_list]
 
             agents = [
                 agent_class(agent_profile=agent_profile, **agent_params)
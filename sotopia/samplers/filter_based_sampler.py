@@ -7,27 +7,26 @@ from sotopia.agents.base_agent import BaseAgent
 from sotopia.database import (
     AgentProfile,
     EnvironmentProfile,
-    RelationshipProfile,
+    ProfileCache,
 )
 from sotopia.envs.parallel import ParallelSotopiaEnv
 
 from .base_sampler import BaseSampler, EnvAgentCombo
+from .relationship_index import RelationshipIndex
 
 ObsType = TypeVar("ObsType")
 ActType = TypeVar("ActType")
 
-def age_filter(agent_id: str, age_constraint: str) -> bool:
-    agent = AgentProfile.get(agent_id)
-    age_constraint_list = ast.literal_eval(age_constraint)
+def age_filter(agent: AgentProfile, age_constraint: str) -> bool:
+    age_constraint_list: list[tuple[int, int]] = ast.literal_eval(age_constraint)
     return (
         age_constraint_list[0][0]
-        <= agent.age  # type: ignore[attr-defined]
+        <= agent.age
         <= age_constraint_list[0][1]
     )
     
-def occupation_filter(agent_id: str, occupation_constraint: str) -> bool:
+def occupation_filter(agent: AgentProfile, occupation_constraint: str) -> bool:
     # TODO: handle the case where occupation_constraint == nan
-    agent = AgentProfile.get(agent_id)
     occupation_constraint_list = ast.literal_eval(occupation_constraint)
     assert isinstance(occupation_constraint_list, list) or isinstance(occupation_constraint_list, str), "occupation_constraint should be a list or a string"
     if isinstance(occupation_constraint_list, str):
@@ -35,42 +34,47 @@ def occupation_filter(agent_id: str, occupation_constraint: str) -> bool:
     return agent.occupation == occupation_constraint
 
 from typing import Callable, List
-def filter_agents(filters: List[Callable[[str], bool]], agent_candidate_ids: List[str]) -> List[str]:
-    return [agent_id for agent_id in agent_candidate_ids if all([filter(agent_id) for filter in filters])]
+# filters are applied to profiles that are already loaded, they should not query Redis
+AgentFilter = Callable[[AgentProfile], bool]
+
+def filter_agents(filters: List[AgentFilter], agent_candidates: List[AgentProfile]) -> List[AgentProfile]:
+    return [agent for agent in agent_candidates if all([filter(agent) for filter in filters])]
 
 def _get_fit_agents_for_one_env(
-    env_profile_id: str, agent_candidate_ids: list[set[str]] | None, size: int
+    env_profile: EnvironmentProfile,
+    agent_candidate_ids: list[set[str]] | None,
+    size: int,
+    agent_profiles: ProfileCache[AgentProfile],
+    relationship_index: RelationshipIndex,
 ) -> list[list[str]]:
     if agent_candidate_ids is None:
         print("agent_candidate_ids is None, using relationship")
         return _get_fit_agents_for_one_env_by_relationship(
-            env_profile_id, agent_candidate_ids, size
+            env_profile, relationship_index, size
         )
     else:
         # provide a list of agent ids
         print("agent_candidate_ids is not None, using candidate") # TODO change to logging
         return _get_fit_agents_for_one_env_by_candidate(
-            env_profile_id, list([list(item) for item in agent_candidate_ids]), size
+            env_profile,
+            list([list(item) for item in agent_candidate_ids]),
+            agent_profiles,
+            size,
         )
 
 def _get_fit_agents_for_one_env_by_candidate(
-    env_profile_id: str, agent_candidate_ids: list[list[str]], size: int
+    env_profile: EnvironmentProfile,
+    agent_candidate_ids: list[list[str]],
+    agent_profiles: ProfileCache[AgentProfile],
+    size: int,
 ) -> list[list[str]]:
     """
         NOTE: 
         1. In this setting we assume the relations are determined by scenarios and manually verified by human
         2. We only do random sampling w replacement so sometimes the same agent may appear multiple times
     """
-    # 
-    env = EnvironmentProfile.get(env_profile_id)
-    age_constraint = env.age_constraint
-    occupation_constraint = env.occupation_constraint
-    age_filter_func = lambda agent_id: age_filter(agent_id, age_constraint)
-    occupation_filter_func = lambda agent_id: occupation_filter(agent_id, occupation_constraint)
-    
     fit_agents = agent_candidate_ids
     fit_agents_list = []
-    # fit_agents = filter_agents([age_filter_func], agent_candidate_ids)
     # all_names = set([AgentProfile.get(pk).first_name + AgentProfile.get(pk).last_name for pk in fit_agents])
     
     # all_agents = [pk for pk in AgentProfile.all_pks() if pk not in fit_agents and AgentProfile.get(pk).occupation not in ["Job Hunter", "Recruiter"] and AgentProfile.get(pk).first_name + AgentProfile.get(pk).last_name not in all_names]
@@ -78,10 +82,16 @@ def _get_fit_agents_for_one_env_by_candidate(
     # print("All names in fit_agents", all_names)
     # print("All names in all_agents", [AgentProfile.get(pk).first_name + AgentProfile.get(pk).last_name for pk in all_agents])
 
+    agent_profiles.prefetch(agent_id for agent_pool in fit_agents for agent_id in agent_pool)
+    full_names = {
+        agent_id: agent_profiles[agent_id].first_name + agent_profiles[agent_id].last_name
+        for agent_pool in fit_agents
+        for agent_id in agent_pool
+    }
     for _ in range(size):
         while True:
             agents = [random.choice(agent_pool) for agent_pool in fit_agents]
-            if AgentProfile.get(agents[0]).first_name + AgentProfile.get(agents[0]).last_name != AgentProfile.get(agents[1]).first_name + AgentProfile.get(agents[1]).last_name:
+            if full_names[agents[0]] != full_names[agents[1]]:
                 break
 
         # if len(fit_agents) < 2:
@@ -95,52 +105,50 @@ def _get_fit_agents_for_one_env_by_candidate(
     
 
 def _get_fit_agents_for_one_env_by_relationship(
-    env_profile_id: str, agent_candidate_ids: None, size: int
+    env_profile: EnvironmentProfile,
+    relationship_index: RelationshipIndex,
+    size: int,
 ) -> list[list[str]]:
-    env = EnvironmentProfile.get(env_profile_id)
-
-    relationship_constraint = env.relationship
-    available_relationships = RelationshipProfile.find(
-        RelationshipProfile.relationship == relationship_constraint
-    ).all()
-    age_contraint = env.age_constraint
+    age_contraint = env_profile.age_constraint
     assert isinstance(age_contraint, str)
-    if age_contraint != "[(18, 70), (18, 70)]":
-        age_contraint_list = ast.literal_eval(age_contraint)
-        available_relationships = [
-            relationship
-            for relationship in available_relationships
-            if (
-                age_contraint_list[0][0]
-                <= AgentProfile.get(relationship.agent_1_id).age  # type: ignore[attr-defined]
-                <= age_contraint_list[0][1]
-                and age_contraint_list[1][0]
-                <= AgentProfile.get(relationship.agent_2_id).age  # type: ignore[attr-defined]
-                <= age_contraint_list[1][1]
-            )
-        ]
+    available_relationships = relationship_index.query(
+        env_profile.relationship, age_contraint
+    )
     if len(available_relationships) < size:
         raise ValueError(
             f"Number of available relationships ({len(available_relationships)}) "
             f"is smaller than the required size ({size})"
         )
-    random.shuffle(available_relationships)
-    selected_relationship = available_relationships[:size]
-    fit_agents = []
-    for relationship in selected_relationship:
-        assert isinstance(relationship, RelationshipProfile)
-        fit_agents.append([relationship.agent_1_id, relationship.agent_2_id])
-    return fit_agents
+    return random.sample(available_relationships, size)
 
-def filter_agent_ids(filter_funcs: List[Callable[[str], bool]], agent_candidate_ids: List[str]) -> List[set[str]]:
-    return [set([agent_id for agent_id in agent_candidate_ids if filter_func(agent_id)]) for filter_func in filter_funcs]
+def filter_agent_ids(
+    filter_funcs: List[AgentFilter],
+    agent_candidate_ids: List[str],
+    agent_profiles: ProfileCache[AgentProfile] | None = None,
+) -> List[set[str]]:
+    """
+    The ids of the candidates that fit each filter. The candidate profiles are
+    loaded in bulk, and candidates without a profile fit no filter.
+    """
+    if agent_profiles is None:
+        agent_profiles = ProfileCache(AgentProfile)
+    agent_profiles.prefetch(agent_candidate_ids)
+    candidates = [
+        (agent_id, agent_profiles[agent_id])
+        for agent_id in agent_candidate_ids
+        if agent_id in agent_profiles
+    ]
+    return [
+        set(agent_id for agent_id, agent in candidates if filter_func(agent))
+        for filter_func in filter_funcs
+    ]
 
 class FilterBasedSampler(BaseSampler[ObsType, ActType]):
     def __init__(
         self,
         env_candidates: Sequence[EnvironmentProfile | str] | None = None,
         agent_candidates: Sequence[AgentProfile | str] | None = None,
-        filter_func: List[Callable[[str], bool]] = [lambda agent_id: True],
+        filter_func: List[AgentFilter] = [lambda agent: True],
     ) -> None:
         super().__init__(env_candidates, agent_candidates)
         self.filter_func = filter_func
@@ -177,11 +185,21 @@ class FilterBasedSampler(BaseSampler[ObsType, ActType]):
         env_profiles: list[EnvironmentProfile] = []
         agents_which_fit_scenario: list[list[str]] = []
 
+        # load the candidate profiles in bulk, sampling below happens in memory
+        self._prefetch_candidates()
+        if not self.agent_candidates:
+            self.relationship_index.update()
+
         agent_candidate_ids: list[set[str]] | None = None
         if self.agent_candidates:
-            agent_candidate_ids = [
-                set([cand_id for cand_id in self.agent_candidates if filter_func(cand_id)]) for filter_func in self.filter_func
+            candidate_pks = [
+                cand if isinstance(cand, str) else cand.pk
+                for cand in self.agent_candidates
             ]
+            # the filters run on the profiles prefetched above
+            agent_candidate_ids = filter_agent_ids(
+                self.filter_func, [pk for pk in candidate_pks if pk], self.agent_profiles
+            )
             
         else:
             agent_candidate_ids = None
@@ -204,30 +222,44 @@ class FilterBasedSampler(BaseSampler[ObsType, ActType]):
 
             assert env_profile_id, "Env candidate must have an id"
 
-            agents_which_fit_scenario = _get_fit_agents_for_one_env(
-                env_profile_id, agent_candidate_ids, size
-            )
-            env_profiles = (
-                [EnvironmentProfile.get(env_profile_id)] * size
+            env_profile = (
+                self.env_profiles[env_profile_id]
                 if isinstance(self.env_candidates[0], str)
-                else [self.env_candidates[0]] * size
+                else self.env_candidates[0]
             )
+            agents_which_fit_scenario = _get_fit_agents_for_one_env(
+                env_profile,
+                agent_candidate_ids,
+                size,
+                self.agent_profiles,
+                self.relationship_index,
+            )
+            env_profiles = [env_profile] * size
         else:
+            all_env_profiles = (
+                self.env_profiles.load_all() if not self.env_candidates else []
+            )
             for _ in range(size):
                 if self.env_candidates:
-                    env_profile = random.choice(self.env_candidates)
-                    if isinstance(env_profile, str):
-                        env_profile = EnvironmentProfile.get(env_profile)
+                    env_candidate = random.choice(self.env_candidates)
+                    env_profile = (
+                        self.env_profiles[env_candidate]
+                        if isinstance(env_candidate, str)
+                        else env_candidate
+                    )
                 else:
-                    env_profile_id = random.choice(list(EnvironmentProfile.all_pks()))
-                    env_profile = EnvironmentProfile.get(env_profile_id)
+                    env_profile = random.choice(all_env_profiles)
                 env_profiles.append(env_profile)
                 env_profile_id = env_profile.pk
                 assert env_profile_id, "Env candidate must have an id"
                 agents_which_fit_scenario.append(
-                    _get_fit_agents_for_one_env(env_profile_id, agent_candidate_ids, 1)[
-                        0
-                    ]
+                    _get_fit_agents_for_one_env(
+                        env_profile,
+                        agent_candidate_ids,
+                        1,
+                        self.agent_profiles,
+                        self.relationship_index,
+                    )[0]
                 )
 
         assert len(env_profiles) == size, "Number of env_profiles is not equal to size"
@@ -239,7 +271,7 @@ class FilterBasedSampler(BaseSampler[ObsType, ActType]):
             env_profiles, agents_which_fit_scenario
         ):
             env = ParallelSotopiaEnv(env_profile=env_profile, **env_params)
-            agent_profiles = [AgentProfile.get(id) for id in agent_profile_id_list]
+            agent_profiles = [self.agent_profiles[id] for id in agent_profile_id_list]
 
             agents = [
                 agent_class(agent_profile=agent_profile, **agent_params)
@@ -0,0 +1,151 @@
+import ast
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from functools import lru_cache
+from typing import Iterable, NamedTuple
+
+from sotopia.database import (
+    AgentProfile,
+    ProfileCache,
+    RelationshipProfile,
+    RelationshipType,
+)
+
+# Environments with this age constraint accept any pair of agents
+DEFAULT_AGE_CONSTRAINT = "[(18, 70), (18, 70)]"
+
+# Age used for agents whose profile is missing, it never satisfies an age range
+UNKNOWN_AGE = -1
+
+
+class _IndexedRelationship(NamedTuple):
+    agent_1_age: int
+    agent_2_age: int
+    pk: str
+    agent_1_id: str
+    agent_2_id: str
+
+
+@lru_cache(maxsize=256)
+def _parse_age_constraint(age_constraint: str) -> tuple[tuple[int, int], ...]:
+    return tuple(
+        (int(low), int(high)) for low, high in ast.literal_eval(age_constraint)
+    )
+
+
+class RelationshipIndex(object):
+    """
+    In-memory index of relationship profiles for constraint-based sampling.
+
+    Relationships are grouped by `RelationshipType` and, within a group,
+    sorted by the age of the first agent, so the pairs fitting an age
+    constraint are found with a binary search instead of a Redis query.
+    The samplers call `update`, which only loads the relationships created
+    since the last update; call `refresh` to pick up edited relationships
+    or agent ages.
+    """
+
+    def __init__(
+        self,
+        relationship_profiles: ProfileCache[RelationshipProfile],
+        agent_profiles: ProfileCache[AgentProfile],
+    ) -> None:
+        self.relationship_profiles = relationship_profiles
+        self.agent_profiles = agent_profiles
+        self._relationships: defaultdict[
+            RelationshipType, list[_IndexedRelationship]
+        ] = defaultdict(list)
+        self._indexed_pks: set[str] = set()
+
+    def _age(self, agent_id: str) -> int:
+        agent_profile = self.agent_profiles.get_or_none(agent_id)
+        return agent_profile.age if agent_profile is not None else UNKNOWN_AGE
+
+    def _add(self, pks: Iterable[str], refresh: bool) -> None:
+        pks = list(pks)
+        self.relationship_profiles.prefetch(pks, refresh=refresh)
+        relationship_profiles = [
+            self.relationship_profiles[pk]
+            for pk in pks
+            if pk in self.relationship_profiles
+        ]
+        self.agent_profiles.prefetch(
+            (
+                agent_id
+                for relationship in relationship_profiles
+                for agent_id in (relationship.agent_1_id, relationship.agent_2_id)
+            ),
+            refresh=refresh,
+        )
+        updated_types: set[RelationshipType] = set()
+        for relationship in relationship_profiles:
+            assert relationship.pk
+            relationship_type = RelationshipType(relationship.relationship)
+            self._relationships[relationship_type].append(
+                _IndexedRelationship(
+                    agent_1_age=self._age(relationship.agent_1_id),
+                    agent_2_age=self._age(relationship.agent_2_id),
+                    pk=relationship.pk,
+                    agent_1_id=relationship.agent_1_id,
+                    agent_2_id=relationship.agent_2_id,
+                )
+            )
+            updated_types.add(relationship_type)
+            self._indexed_pks.add(relationship.pk)
+        for relationship_type in updated_types:
+            self._relationships[relationship_type].sort()
+
+    def refresh(self) -> None:
+        """Reload every relationship and the ages of their agents."""
+        self._relationships = defaultdict(list)
+        self._indexed_pks = set()
+        self._add(RelationshipProfile.all_pks(), refresh=True)
+
+    def update(self) -> None:
+        """
+        Index the relationships created and drop the ones deleted since the last
+        update, loading only those. Ages of agents already loaded are reused.
+        """
+        pks = set(RelationshipProfile.all_pks())
+        removed_pks = self._indexed_pks - pks
+        if removed_pks:
+            for relationship_type, group in self._relationships.items():
+                self._relationships[relationship_type] = [
+                    relationship
+                    for relationship in group
+                    if relationship.pk not in removed_pks
+                ]
+            self._indexed_pks -= removed_pks
+        self._add(pks - self._indexed_pks, refresh=False)
+
+    def query(
+        self, relationship: RelationshipType, age_constraint: str | None = None
+    ) -> list[list[str]]:
+        """The [agent_1_id, agent_2_id] pairs of `relationship` fitting `age_constraint`."""
+        relationships = self._relationships.get(RelationshipType(relationship), [])
+        if age_constraint is None or age_constraint == DEFAULT_AGE_CONSTRAINT:
+            return [
+                [relationship.agent_1_id, relationship.agent_2_id]
+                for relationship in relationships
+            ]
+        (agent_1_low, agent_1_high), (agent_2_low, agent_2_high) = (
+            _parse_age_constraint(age_constraint)[:2]
+        )
+        start = bisect_left(
+            relationships,
+            agent_1_low,
+            key=lambda relationship: relationship.agent_1_age,
+        )
+        end = bisect_right(
+            relationships,
+            agent_1_high,
+            key=lambda relationship: relationship.agent_1_age,
+        )
+        return [
+            [relationship.agent_1_id, relationship.agent_2_id]
+            for relationship in relationships[start:end]
+            if agent_2_low <= relationship.agent_2_age <= agent_2_high
+        ]
+
+    def __len__(self) -> int:
+        return len(self._indexed_pks)
@@ -58,10 +58,12 @@ class UniformSampler(BaseSampler[ObsType, ActType]):
                 raise ValueError("No agent candidates available for sampling.")
             self.agent_candidates = agent_candidates
 
+        self._prefetch_candidates()
+
         for _ in range(size):
             env_profile = random.choice(self.env_candidates)
             if isinstance(env_profile, str):
-                env_profile = EnvironmentProfile.get(env_profile)
+                env_profile = self.env_profiles[env_profile]
             env = ParallelSotopiaEnv(env_profile=env_profile, **env_params)
 
             agent_profile_candidates = self.agent_candidates
@@ -72,7 +74,7 @@ class UniformSampler(BaseSampler[ObsType, ActType]):
                     agent_profile_candidates, n_agent
                 )
             agent_profiles = [
-                i if isinstance(i, AgentProfile) else AgentProfile.get(i)
+                i if isinstance(i, AgentProfile) else self.agent_profiles[i]
                 for i in agent_profiles_maybe_id
             ]
             agents = [
@@ -1,7 +1,16 @@
 import asyncio
 import itertools
 import logging
-from typing import Literal, Sequence, Type, AsyncGenerator, Union
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Iterable,
+    Literal,
+    Sequence,
+    Type,
+    Union,
+)
 
 import gin
 from pydantic import validate_call
@@ -15,17 +24,26 @@ from sotopia.agents import (
     ScriptWritingAgent,
 )
 from sotopia.agents.base_agent import BaseAgent
-from sotopia.database import EpisodeLog, NonStreamingSimulationStatus, SotopiaDimensions
+from sotopia.database import (
+    AgentProfile,
+    EnvAgentComboStorage,
+    EnvironmentProfile,
+    EpisodeLease,
+    EpisodeLog,
+    EpisodeQueue,
+    NonStreamingSimulationStatus,
+    SotopiaDimensions,
+    record_completed_episode,
+)
 from sotopia.envs import ParallelSotopiaEnv
 from sotopia.envs.evaluators import (
     EvaluationForTwoAgents,
     EpisodeLLMEvaluator,
     RuleBasedTerminatedEvaluator,
-    SotopiaDimensions,
-    SotopiaTruthfulnessDimensions,
     unweighted_aggregate_evaluate,
 )
 from sotopia.generation_utils.generate import agenerate_script
+from sotopia.generation_utils.model_capabilities import warm_model_capabilities
 from sotopia.messages import AgentAction, Message, Observation, SimpleMessage
 from sotopia.messages.message_classes import (
     ScriptBackground,
@@ -34,6 +52,14 @@ from sotopia.messages.message_classes import (
 from sotopia.samplers import BaseSampler, EnvAgentCombo
 
 
+class InvalidEpisodeError(Exception):
+    """Raised by `arun_one_episode` when the episode log is rejected by its `episode_validator`."""
+
+    def __init__(self, episode_log: EpisodeLog) -> None:
+        super().__init__(f"Invalid episode: rewards {episode_log.rewards}")
+        self.episode_log = episode_log
+
+
 @validate_call
 def run_sync_server(
     model_name_dict: dict[str, str],
@@ -123,10 +149,20 @@ async def arun_one_episode(
     episode_pk: str | None = None,
     streaming: bool = False,
     simulation_status: NonStreamingSimulationStatus | None = None,
+    episode_validator: Callable[[EpisodeLog], bool] | None = None,
+    raise_on_save_error: bool = False,
 ) -> Union[
     list[tuple[str, str, Message]],
     AsyncGenerator[list[list[tuple[str, str, Message]]], None],
 ]:
+    """
+    Run one episode of `env` with `agent_list`.
+
+    When `episode_validator` rejects the episode log (e.g. because the evaluation
+    failed), the log is not pushed to the database and `InvalidEpisodeError` is raised.
+    A failure to push the log is logged, and raised if `raise_on_save_error`, so
+    that callers such as the queue workers never count an unsaved episode as completed.
+    """
     agents = Agents({agent.agent_name: agent for agent in agent_list})
 
     async def generate_messages() -> (
@@ -226,6 +262,9 @@ async def arun_one_episode(
             )
             yield messages
 
+        if episode_validator is not None and not episode_validator(epilog):
+            raise InvalidEpisodeError(epilog)
+
         if push_to_db:
             try:
                 if episode_pk:
@@ -239,6 +278,14 @@ async def arun_one_episode(
             except Exception as e:
                 logging.error(f"Failed to save episode log: {e}")
                 print(f"Failed to save episode log: {e}")
+                if raise_on_save_error:
+                    raise
+            else:
+                try:
+                    record_completed_episode(epilog)
+                except Exception as e:
+                    # the episode is saved, the ledger is rebuilt when it next syncs
+                    logging.error(f"Failed to record the completed episode: {e}")
 
     if streaming:
         return generate_messages()
@@ -248,6 +295,196 @@ async def arun_one_episode(
         return flatten_listed_messages(last_messages)
 
 
+async def arun_episodes_with_limit(
+    env_agent_combo_iter: Iterable[EnvAgentCombo[Observation, AgentAction]],
+    max_concurrency: int,
+    omniscient: bool = False,
+    script_like: bool = False,
+    json_in_script: bool = False,
+    tag: str | None = None,
+    push_to_db: bool = False,
+) -> AsyncGenerator[list[tuple[str, str, Message]], None]:
+    """
+    Run episodes with at most `max_concurrency` of them in flight at any time.
+
+    A new combo is pulled from `env_agent_combo_iter` as soon as a running
+    episode finishes, so the iterator (e.g. a sampler) is consumed lazily.
+    Results are yielded in completion order, not in the order of the combos.
+
+    Args:
+        env_agent_combo_iter: the combos to run, usually produced by a sampler
+        max_concurrency (int): the maximum number of episodes running concurrently
+    """
+    assert max_concurrency > 0, "max_concurrency must be positive"
+    combo_iter = iter(env_agent_combo_iter)
+
+    def start_next() -> asyncio.Task[Any] | None:
+        env_agent_combo = next(combo_iter, None)
+        if env_agent_combo is None:
+            return None
+        return asyncio.create_task(
+            arun_one_episode(
+                env=env_agent_combo[0],
+                agent_list=env_agent_combo[1],
+                omniscient=omniscient,
+                script_like=script_like,
+                json_in_script=json_in_script,
+                tag=tag,
+                push_to_db=push_to_db,
+            )
+        )
+
+    in_flight: set[asyncio.Task[Any]] = set()
+    try:
+        while len(in_flight) < max_concurrency:
+            task = start_next()
+            if task is None:
+                break
+            in_flight.add(task)
+
+        while in_flight:
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            for finished in done:
+                task = start_next()
+                if task is not None:
+                    in_flight.add(task)
+                result = finished.result()
+                assert isinstance(
+                    result, list
+                ), f"Unexpected result type: {type(result)}"
+                yield result
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+def enqueue_env_agent_combos(
+    queue: EpisodeQueue,
+    env_agent_combo_pks: Iterable[str],
+    model_dict: dict[str, str],
+) -> int:
+    """
+    Push `EnvAgentComboStorage` pks to run with `model_dict` ({"env", "agent1", "agent2"}).
+
+    Each combo/model pair is pushed at most once, so producers can be re-run
+    to resume a sweep. Returns the number of newly pushed episodes.
+    """
+    return queue.push(
+        {"env_agent_combo_pk": pk, "model_dict": model_dict}
+        for pk in env_agent_combo_pks
+    )
+
+
+def build_env_agent_combo_from_queue_item(
+    item: dict[str, Any],
+) -> EnvAgentCombo[Observation, AgentAction]:
+    """Build the env and agents of an item pushed by `enqueue_env_agent_combos`."""
+    env_agent_combo_storage = EnvAgentComboStorage.get(item["env_agent_combo_pk"])
+    model_dict = item["model_dict"]
+    env = ParallelSotopiaEnv(
+        env_profile=EnvironmentProfile.get(env_agent_combo_storage.env_id),
+        model_name=model_dict["env"],
+        action_order="round-robin",
+        evaluators=[
+            RuleBasedTerminatedEvaluator(max_turn_number=20, max_stale_turn=2),
+        ],
+        terminal_evaluators=[
+            EpisodeLLMEvaluator(
+                model_dict["env"],
+                EvaluationForTwoAgents[SotopiaDimensions],
+            ),
+        ],
+    )
+    agents = [
+        LLMAgent(agent_profile=AgentProfile.get(agent_id), model_name=model_name)
+        for agent_id, model_name in zip(
+            env_agent_combo_storage.agent_ids,
+            [model_dict["agent1"], model_dict["agent2"]],
+        )
+    ]
+    return env, agents
+
+
+async def arun_episode_queue_worker(
+    queue: EpisodeQueue,
+    build_env_agent_combo: Callable[
+        [dict[str, Any]], EnvAgentCombo[Observation, AgentAction]
+    ] = build_env_agent_combo_from_queue_item,
+    max_concurrency: int = 10,
+    max_attempts: int = 3,
+    push_to_db: bool = True,
+    episode_validator: Callable[[EpisodeLog], bool] | None = None,
+    wait_for_items: bool = False,
+    poll_interval: float = 5.0,
+) -> None:
+    """
+    Run the episodes of `queue` until it is drained, with `max_concurrency` in flight.
+
+    Claimed episodes are heartbeated while they run. An episode that raised
+    or was rejected by `episode_validator` is put back in the queue until it
+    has been tried `max_attempts` times, then recorded as failed. An episode
+    whose lease was lost (e.g. the worker stalled and another one took over)
+    is not saved, so every item completes once.
+
+    Args:
+        queue (EpisodeQueue): the queue, whose tag is used for the episode logs
+        build_env_agent_combo: builds the env and agents of a queue item
+        wait_for_items (bool): keep polling for new items instead of returning once the queue is drained
+        poll_interval (float): seconds between two polls when there is nothing to claim
+    """
+    assert max_concurrency > 0, "max_concurrency must be positive"
+
+    async def keep_alive(lease: EpisodeLease) -> None:
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            if not queue.heartbeat(lease):
+                logging.warning(f"Lost the lease of queue item {lease.item_id}")
+                return
+
+    async def run_one(lease: EpisodeLease) -> None:
+        def validate(episode_log: EpisodeLog) -> bool:
+            if episode_validator is not None and not episode_validator(episode_log):
+                return False
+            return queue.holds(lease)
+
+        heartbeat = asyncio.create_task(keep_alive(lease))
+        try:
+            env, agent_list = build_env_agent_combo(lease.item)
+            await arun_one_episode(
+                env=env,
+                agent_list=agent_list,
+                tag=queue.tag,
+                push_to_db=push_to_db,
+                episode_validator=validate,
+                raise_on_save_error=True,
+            )
+        except Exception as e:
+            logging.error(
+                f"Attempt {lease.attempt}/{max_attempts} of queue item {lease.item_id} failed: {e}"
+            )
+            queue.fail(lease, requeue=lease.attempt < max_attempts)
+        else:
+            queue.complete(lease)
+        finally:
+            heartbeat.cancel()
+
+    async def worker() -> None:
+        while True:
+            lease = queue.claim()
+            if lease is not None:
+                await run_one(lease)
+            elif wait_for_items or not queue.is_drained():
+                # leases held by other workers may still expire and come back
+                await asyncio.sleep(poll_interval)
+            else:
+                return
+
+    await asyncio.gather(*(worker() for _ in range(max_concurrency)))
+
+
 @gin.configurable
 async def run_async_server(
     sampler: BaseSampler[Observation, AgentAction] = BaseSampler(),
@@ -260,6 +497,7 @@ async def run_async_server(
     tag: str | None = None,
     push_to_db: bool = False,
     using_async: bool = True,
+    max_concurrency: int | None = None,
 ) -> list[list[tuple[str, str, Message]]]:
     """
     Doc incomplete
@@ -268,6 +506,7 @@ async def run_async_server(
         omniscient (bool): Whether the agent knows the goal of the other, default to False
         script_like (bool): Whether we generate the turn in script like manner, default to False
         json_in_script (bool): Whether we requires the script generator to return json (Only valid when script_like is True), default to False
+        max_concurrency (int | None): When set, at most this many episodes run at once and a new episode starts as soon as one finishes; results are returned in completion order. Default to None, which runs the whole batch at once
 
     Note: env_agent_combo_list is optional. When it defaults to [], sampler is used
     else the sampler is not used. Please pass in BaseSampler or simply not specify it when using this option.
@@ -278,6 +517,7 @@ async def run_async_server(
     assert (
         model_dict or env_agent_combo_list
     ), "please provide model_dict or env_agent_combo_list"
+    warm_model_capabilities(model_dict.values())
 
     # Create Environment and agents
     # This step will be moved to outside this function
@@ -329,6 +569,20 @@ async def run_async_server(
                 for model_name in agents_model_dict.values()
             ],
         )
+    if max_concurrency is not None:
+        return [
+            result
+            async for result in arun_episodes_with_limit(
+                env_agent_combo_iter,
+                max_concurrency=max_concurrency,
+                omniscient=omniscient,
+                script_like=script_like,
+                json_in_script=json_in_script,
+                tag=tag,
+                push_to_db=push_to_db,
+            )
+        ]
+
     episode_futures = [
         arun_one_episode(
             env=env_agent_combo[0],
@@ -455,11 +709,14 @@ async def aevaluate_one_episode(
     model: str = "gpt-4o",
     tag: str | None = None,
     push_to_db: bool = False,
+    response_format_class: type[EvaluationForTwoAgents[Any]] = EvaluationForTwoAgents[
+        SotopiaDimensions
+    ],
 ) -> dict[str, object]:
     history = "\n".join(episode.render_for_humans()[1][:-2])
-    evaluator = EpisodeLLMEvaluator(
+    evaluator: EpisodeLLMEvaluator[Any] = EpisodeLLMEvaluator(
         model_name=model,
-        response_format_class=EvaluationForTwoAgents[SotopiaTruthfulnessDimensions],
+        response_format_class=response_format_class,
     )
     response = unweighted_aggregate_evaluate(
         list(
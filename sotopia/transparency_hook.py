@@ -40,7 +40,7 @@ class TransparentLLMAgent(LLMAgent):
         if self._goal is None:
             self._goal = await agenerate_goal(
                 self.model_name,
-                background=self.inbox[0][1].to_natural_language(),  # type: ignore[index]
+                background=self._rendered_inbox[0],
             )
 
         # No-op branch unchanged
@@ -54,7 +54,7 @@ class TransparentLLMAgent(LLMAgent):
         )
 
         # Conversation history without the CoT instruction
-        history = "\n".join(y.to_natural_language() for _, y in self.inbox)
+        history = self.rendered_history()
         print("DEBUG: history =", history)
 
         action = await agenerate_action(
@@ -1,6 +1,71 @@
+import functools
+import inspect
 import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, TypeVar, cast
+
+from pydantic import validate_call
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_trust_internal_calls = True
+_in_internal_call: ContextVar[bool] = ContextVar(
+    "sotopia_in_internal_call", default=False
+)
 
 
 def format_docstring(docstring: str) -> str:
     """Format a docstring for use in a prompt template."""
     return re.sub("\n +", "\n", docstring).strip()
+
+
+def set_trust_internal_calls(enabled: bool) -> None:
+    """
+    Whether calls made from inside sotopia skip `validate_public_call` validation.
+
+    On by default; turn it off to validate every call, e.g. when debugging a custom env or evaluator.
+    """
+    global _trust_internal_calls
+    _trust_internal_calls = enabled
+
+
+@contextmanager
+def trusted_internal_calls() -> Iterator[None]:
+    """Run the `validate_public_call` functions called in this block without validating their arguments."""
+    token = _in_internal_call.set(True)
+    try:
+        yield
+    finally:
+        _in_internal_call.reset(token)
+
+
+def validate_public_call(func: F) -> F:
+    """
+    `pydantic.validate_call` for the entry points that are also called internally on every turn.
+
+    A call from user code is validated, and the calls it makes in turn are
+    trusted: e.g. `env.step` validates its actions once, but the evaluators
+    it calls with the env's own inbox do not re-validate it.
+    """
+    validated = validate_call(func)
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _trust_internal_calls and _in_internal_call.get():
+                return await func(*args, **kwargs)
+            with trusted_internal_calls():
+                return await validated(*args, **kwargs)
+
+        return cast(F, async_wrapper)
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if _trust_internal_calls and _in_internal_call.get():
+            return func(*args, **kwargs)
+        with trusted_internal_calls():
+            return validated(*args, **kwargs)
+
+    return cast(F, wrapper)
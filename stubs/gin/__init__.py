@@ -14,6 +14,10 @@ def config_str() -> str:
     return ""
 
 
+def parse_config(bindings: str, skip_unknown: bool = False) -> None:
+    pass
+
+
 def parse_config_files_and_bindings(*_: Any, **__: Any) -> None:
     pass
 
@@ -16,6 +16,10 @@ class RedisModel(BaseModel, abc.ABC, metaclass=ModelMeta):
 
     @classmethod
     def delete(cls, pk: Any) -> None: ...
+    @classmethod
+    def db(cls) -> redis.Redis[bytes]: ...
+    @classmethod
+    def make_primary_key(cls, pk: Any) -> str: ...
     def expire(self, num_seconds: int) -> None: ...  # pipeline arg can be added here
 
 class HashModel(RedisModel, abc.ABC):
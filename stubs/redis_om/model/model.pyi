@@ -42,3 +42,5 @@ def Field(
 
 class FindQuery:
     def all(self) -> list[JsonModel]: ...
+    def count(self) -> int: ...
+    def page(self, offset: int = 0, limit: int = 10) -> list[JsonModel]: ...
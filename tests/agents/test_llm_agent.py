@@ -0,0 +1,36 @@
+from sotopia.agents import LLMAgent
+from sotopia.messages import AgentAction, Observation, SimpleMessage
+
+
+def full_render(agent: LLMAgent, start: int = 0) -> str:
+    return "\n".join(
+        message.to_natural_language() for _, message in agent.inbox[start:]
+    )
+
+
+def test_rendered_history_matches_full_render() -> None:
+    agent = LLMAgent(agent_name="Alice")
+    agent.recv_message("Environment", SimpleMessage(message="Here is the context"))
+    for turn_number in range(1, 4):
+        agent.recv_message(
+            "Environment",
+            Observation(
+                last_turn=f"Bob said: hi {turn_number}",
+                turn_number=turn_number,
+                available_actions=["speak", "none"],
+            ),
+        )
+        agent.recv_message(
+            "Alice", AgentAction(action_type="speak", argument=f"hello {turn_number}")
+        )
+        for start in (0, 1, len(agent.inbox) - 1, len(agent.inbox)):
+            assert agent.rendered_history(start) == full_render(agent, start)
+
+    agent.reset_inbox()
+    assert agent.rendered_history() == full_render(agent) == ""
+    agent.recv_message("Environment", SimpleMessage(message="A new episode"))
+    assert agent.rendered_history() == full_render(agent) == "A new episode"
+
+    agent.reset()
+    agent.recv_message("Alice", AgentAction(action_type="none", argument=""))
+    assert agent.rendered_history() == full_render(agent)
@@ -0,0 +1,171 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from sotopia.agents import redis_agent
+from sotopia.agents.redis_agent import (
+    RedisAgent,
+    aclose_http_session,
+    get_http_session,
+)
+from sotopia.messages import AgentAction, Observation
+
+
+class StubChatServer(object):
+    """The endpoints of sotopia-chat's FastAPI server that RedisAgent calls, kept in memory."""
+
+    def __init__(self, client_reply: str | None) -> None:
+        self.client_reply = client_reply
+        self.messages: list[dict[str, str]] = []
+        self.locks: list[str] = []
+        self.connections = 0
+        self.wait_after_ids: list[str] = []
+        self.peers: set[Any] = set()
+        self._new_message = asyncio.Event()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self.app = web.Application(middlewares=[self.record_peer])
+        self.app.add_routes(
+            [
+                web.post("/connect/{session_id}/server/{sender_id}", self.connect),
+                web.post("/send/{session_id}/{sender_id}", self.send),
+                web.put("/lock/{session_id}/{sender_id}/{lock}", self.lock),
+                web.get("/wait/{session_id}", self.wait),
+            ]
+        )
+
+    @web.middleware
+    async def record_peer(self, request: web.Request, handler: Any) -> Any:
+        assert request.transport is not None
+        self.peers.add(request.transport.get_extra_info("peername"))
+        return await handler(request)
+
+    def _append(self, sender: str, message: str) -> None:
+        self.messages.append(
+            {
+                "timestamp_str": str(datetime.now().timestamp()),
+                "sender": sender,
+                "message": message,
+                "stream_id": f"{len(self.messages) + 1}-0",
+            }
+        )
+        self._new_message.set()
+        self._new_message = asyncio.Event()
+
+    async def _client_acts(self) -> None:
+        # the other agent of the session speaks before the client does
+        await asyncio.sleep(0.1)
+        self._append("other_server", "Turn #2: Bob said hi\n")
+        if self.client_reply is not None:
+            await asyncio.sleep(0.1)
+            self._append("client", self.client_reply)
+
+    async def connect(self, request: web.Request) -> web.Response:
+        self.connections += 1
+        return web.json_response([])
+
+    async def send(self, request: web.Request) -> web.Response:
+        body = await request.text()
+        self._append(
+            "server",
+            json.loads(body) if request.content_type == "application/json" else body,
+        )
+        return web.json_response(self.messages[-1:])
+
+    async def lock(self, request: web.Request) -> web.Response:
+        self.locks.append(request.match_info["lock"])
+        if request.match_info["lock"] == "action":
+            task = asyncio.create_task(self._client_acts())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return web.json_response([])
+
+    async def wait(self, request: web.Request) -> web.Response:
+        after_id = request.query["after_id"]
+        self.wait_after_ids.append(after_id)
+
+        def messages_after() -> list[dict[str, str]]:
+            stream_ids = [message["stream_id"] for message in self.messages]
+            return self.messages[stream_ids.index(after_id) + 1 :]
+
+        if not messages_after():
+            try:
+                await asyncio.wait_for(
+                    self._new_message.wait(), float(request.query["timeout"])
+                )
+            except asyncio.TimeoutError:
+                pass
+        return web.json_response(messages_after())
+
+
+async def _start_server(
+    monkeypatch: pytest.MonkeyPatch, client_reply: str | None
+) -> tuple[StubChatServer, TestServer]:
+    chat_server = StubChatServer(client_reply)
+    server = TestServer(chat_server.app)
+    await server.start_server()
+    monkeypatch.setenv("FASTAPI_URL", str(server.make_url("")).rstrip("/"))
+    monkeypatch.setattr(redis_agent, "LONG_POLL_SECONDS", 0.05)
+    return chat_server, server
+
+
+@pytest.mark.asyncio
+async def test_redis_agent_long_polls_for_the_client(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    reply = AgentAction(action_type="speak", argument="Hello!")
+    chat_server, server = await _start_server(monkeypatch, reply.model_dump_json())
+    session = get_http_session()
+    try:
+        # constructed in async code, the agent connects right away
+        agent = RedisAgent(agent_name="server", session_id="session")
+        await asyncio.sleep(0.05)
+        assert chat_server.connections == 1
+
+        action = await agent.aact(
+            Observation(
+                last_turn="Alice said hi", turn_number=1, available_actions=["speak"]
+            )
+        )
+        assert action == reply
+        assert chat_server.connections == 1
+        assert chat_server.locks == ["action", "no action"]
+        # the poll that saw the other agent's message resumes after it
+        assert chat_server.wait_after_ids[0] == "1-0"
+        assert chat_server.wait_after_ids[-1] == "2-0"
+        assert len(chat_server.wait_after_ids) > 2
+        # every request went through the shared session, over one kept-alive connection
+        assert get_http_session() is session
+        assert len(chat_server.peers) == 1
+    finally:
+        await aclose_http_session()
+        await server.close()
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_redis_agent_leaves_when_the_client_is_silent(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    chat_server, server = await _start_server(monkeypatch, None)
+    monkeypatch.setattr(redis_agent, "CLIENT_MESSAGE_TIMEOUT", 0.3)
+    try:
+        agent = RedisAgent(agent_name="server", session_id="session")
+        action = await agent.aact(
+            Observation(
+                last_turn="Alice said hi", turn_number=1, available_actions=["speak"]
+            )
+        )
+        assert action == AgentAction(action_type="leave", argument="")
+        assert chat_server.locks == ["action", "no action"]
+        # the reason for leaving is posted as JSON
+        assert chat_server.messages[-1]["message"] == (
+            "Someone has left or the conversation is too long."
+        )
+    finally:
+        await aclose_http_session()
+        await server.close()
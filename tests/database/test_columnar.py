@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+from sotopia.database import EpisodeLog
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+from sotopia.database.columnar import (  # noqa: E402
+    episodes_to_arrow,
+    exported_episode_pks,
+    read_parquet_table,
+    write_episodes_to_parquet,
+)
+
+
+def _episode(pk: str, tag: str, dimensions: list[str]) -> EpisodeLog:
+    return EpisodeLog(
+        pk=pk,
+        environment="tmppk_environment",
+        agents=["tmppk_agent1", "tmppk_agent2"],
+        tag=tag,
+        models=["gpt-4", "gpt-4", "gpt-4"],
+        messages=[
+            [
+                ("Environment", "John Doe", "Scenario"),
+                ("Environment", "Jane Doe", "Scenario"),
+                ("John Doe", "Environment", 'said: "Hi"'),
+            ],
+            [("Jane Doe", "Environment", "did nothing")],
+        ],
+        reasoning="reasoning",
+        rewards=[
+            (1.0, {dimension: 1.0 for dimension in dimensions}),
+            (2.0, {dimension: 2.0 for dimension in dimensions}),
+        ],
+    )
+
+
+def test_episodes_to_arrow() -> None:
+    tables = episodes_to_arrow(
+        [_episode("tmppk_1", "tag_a", ["goal", "believability"])]
+    )
+    assert tables["episodes"].num_rows == 1
+    assert tables["turns"].num_rows == 4
+    assert tables["turns"].column("turn_index").to_pylist() == [0, 0, 0, 1]
+    assert tables["rewards"].column("goal").to_pylist() == [1.0, 2.0]
+    assert tables["rewards"].column("agent_id").to_pylist() == [
+        "tmppk_agent1",
+        "tmppk_agent2",
+    ]
+
+
+def test_write_and_read_parquet(tmp_path: Path) -> None:
+    root = str(tmp_path)
+    assert exported_episode_pks(root) == set()
+    assert (
+        write_episodes_to_parquet([_episode("tmppk_1", "tag_a", ["goal"])], root) == 1
+    )
+    # a later batch with another tag and an extra reward dimension
+    write_episodes_to_parquet([_episode("tmppk_2", "tag/b", ["goal", "secret"])], root)
+    assert exported_episode_pks(root) == {"tmppk_1", "tmppk_2"}
+
+    rewards = read_parquet_table(root, "rewards")
+    assert rewards.num_rows == 4
+    assert sorted(rewards.column("tag").to_pylist()) == [
+        "tag/b",
+        "tag/b",
+        "tag_a",
+        "tag_a",
+    ]
+    tag_b_rewards = read_parquet_table(
+        root, "rewards", columns=["secret"], filter=ds.field("tag") == "tag/b"
+    )
+    assert tag_b_rewards.column("secret").to_pylist() == [1.0, 2.0]
+    tag_a_rewards = read_parquet_table(
+        root, "rewards", columns=["secret"], filter=ds.field("tag") == "tag_a"
+    )
+    assert tag_a_rewards.column("secret").to_pylist() == [None, None]
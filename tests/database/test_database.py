@@ -6,9 +6,13 @@ from pydantic.error_wrappers import ValidationError
 from sotopia.agents import LLMAgent
 from sotopia.database import (
     AgentProfile,
+    CompletionLedger,
     EnvironmentProfile,
     EpisodeLog,
     CustomEvaluationDimension,
+    ProfileCache,
+    SessionMessageStream,
+    fetch_many,
 )
 from sotopia.envs.parallel import ParallelSotopiaEnv
 from sotopia.messages import SimpleMessage
@@ -45,6 +49,69 @@ def test_create_agent_profile() -> None:
     AgentProfile.delete(pk)
 
 
+def test_fetch_many_and_profile_cache() -> None:
+    AgentProfile(pk="tmppk_bulk_1", first_name="John", last_name="Doe").save()
+    AgentProfile(pk="tmppk_bulk_2", first_name="Jane", last_name="Doe").save()
+    profiles = fetch_many(AgentProfile, ["tmppk_bulk_1", "tmppk_bulk_2", "missing"])
+    assert set(profiles) == {"tmppk_bulk_1", "tmppk_bulk_2"}
+    assert profiles["tmppk_bulk_2"].first_name == "Jane"
+
+    cache = ProfileCache(AgentProfile)
+    cache.prefetch(["tmppk_bulk_1"])
+    assert "tmppk_bulk_1" in cache and "tmppk_bulk_2" not in cache
+    # misses are read through
+    assert cache["tmppk_bulk_2"].first_name == "Jane"
+    assert len(cache) == 2
+    AgentProfile.delete("tmppk_bulk_1")
+    AgentProfile.delete("tmppk_bulk_2")
+
+
+def test_completion_ledger() -> None:
+    tag = "tmptag_completion_ledger"
+    episode = EpisodeLog(
+        pk="tmppk_ledger_episode",
+        environment="env",
+        agents=["agent1", "agent2"],
+        tag=tag,
+        models=["eval", "model1", "model2"],
+        messages=[],
+        rewards=[0.0, 0.0],
+    )
+    episode.save()
+    ledger = CompletionLedger(tag)
+    ledger.sync(force=True)
+    done_key = CompletionLedger.combo_key(
+        "env", ["agent1", "agent2"], ["eval", "model1", "model2"]
+    )
+    missing_key = CompletionLedger.combo_key(
+        "env", ["agent2", "agent1"], ["eval", "model1", "model2"]
+    )
+    assert ledger.contains_many([done_key, missing_key]) == [True, False]
+    ledger.remove(episode)
+    assert ledger.contains_many([done_key]) == [False]
+    ledger.add(episode)
+    assert len(ledger) == 1
+    # syncing again is a no-op until the episodes with the tag change
+    ledger.sync()
+    assert len(ledger) == 1
+    EpisodeLog.delete("tmppk_ledger_episode")
+    ledger.sync()
+    assert len(ledger) == 0
+
+
+def test_session_message_stream() -> None:
+    stream = SessionMessageStream("tmpsession_message_stream")
+    stream.delete()
+    first = stream.append("server", "hello")
+    second = stream.append("client", "hi")
+    assert [message.message for message in stream.range()] == ["hello", "hi"]
+    assert stream.range(after_id=first.stream_id) == [second]
+    assert stream.range(after_id=second.stream_id) == []
+    assert float(first.timestamp_str) <= float(second.timestamp_str)
+    stream.delete()
+    assert stream.range() == []
+
+
 def test_create_custom_dimension() -> None:
     custom_dimension = CustomEvaluationDimension(
         name="verbosity_custom",
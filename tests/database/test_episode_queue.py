@@ -0,0 +1,62 @@
+from fakeredis import FakeRedis
+
+from sotopia.database import EpisodeQueue
+
+
+def test_episode_queue() -> None:
+    queue = EpisodeQueue("tmptag_episode_queue", lease_seconds=60, db=FakeRedis())
+    items = [{"env_id": "env", "index": str(i)} for i in range(3)]
+    assert queue.push(items) == 3
+    # pushing the same items again is a no-op
+    assert queue.push(items) == 0
+    assert len(queue) == 3
+    first, second = queue.claim(), queue.claim()
+    assert first is not None and second is not None
+    assert [first.item["index"], second.item["index"]] == ["0", "1"]
+    assert first.attempt == 1
+    assert queue.heartbeat(first) and queue.holds(first)
+    assert queue.complete(first)
+    assert not queue.complete(first)
+    assert queue.push(items[:1]) == 0
+    assert queue.fail(second, requeue=True)
+    assert queue.progress() == {
+        "pending": 2,
+        "leased": 0,
+        "completed": 1,
+        "failed": 0,
+    }
+
+    # a lease that is not renewed expires and the item is claimed again
+    queue.lease_seconds = -1
+    third = queue.claim()
+    assert third is not None and third.item["index"] == "2"
+    queue.lease_seconds = 60
+    again = queue.claim()
+    assert again is not None
+    assert again.item_id == second.item_id and again.attempt == 2
+    reclaimed = queue.claim()
+    assert reclaimed is not None and reclaimed.item_id == third.item_id
+    assert not queue.holds(third) and not queue.complete(third)
+
+    assert queue.fail(again)
+    assert queue.complete(reclaimed)
+    assert queue.is_drained()
+    assert queue.failures() == [items[1]]
+    assert queue.retry_failed() == 1
+    assert queue.progress()["failed"] == 0
+    retried = queue.claim()
+    assert retried is not None and retried.attempt == 1
+    queue.clear()
+    assert queue.claim() is None
+
+
+def test_episode_queue_runs_are_separate() -> None:
+    db = FakeRedis()
+    items = [{"env_id": "env", "index": "0"}]
+    first_run = EpisodeQueue("tmptag_episode_queue", db=db, run_id="first")
+    second_run = EpisodeQueue("tmptag_episode_queue", db=db, run_id="second")
+    assert first_run.push(items) == 1
+    # the same item is pending in both runs, and clearing one run leaves the other
+    assert second_run.push(items) == 1
+    first_run.clear()
+    assert len(first_run) == 0 and len(second_run) == 1
@@ -16,6 +16,7 @@ from sotopia.database import (
     agentprofiles_to_jsonl,
     episodes_to_csv,
     episodes_to_jsonl,
+    iter_episodes,
     jsonl_to_episodes,
     jsonl_to_relationshipprofiles,
     jsonl_to_environmentprofiles,
@@ -221,6 +222,15 @@ def test_episode_log_serialization(
             assert row["raw_rewards"] == str(episode_log.rewards)
             assert row["raw_rewards_prompt"] == episode_log.rewards_prompt
 
+    # stream the saved episode back out of Redis in pages
+    saved_episode_log = episode_log.model_copy(update={"pk": "tmppk_episode_log"})
+    saved_episode_log.save()
+    streamed_episode_logs = list(iter_episodes(tag=episode_log.tag, batch_size=1))
+    assert [log.pk for log in streamed_episode_logs] == ["tmppk_episode_log"]
+    episodes_to_jsonl(iter_episodes(tag=episode_log.tag), "/tmp/test_episode_log.jsonl")
+    rebuild_episode_log = jsonl_to_episodes("/tmp/test_episode_log.jsonl")[0]
+    assert saved_episode_log.dict() == rebuild_episode_log.dict()
+
 
 def test_relationship_profile_serialization() -> None:
     relationship_profile = RelationshipProfile(
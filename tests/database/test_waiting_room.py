@@ -0,0 +1,58 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fakeredis import FakeRedis
+
+from sotopia.database import WaitingRoom, WaitingRoomMatch
+
+
+def test_waiting_room_pairs_and_solo() -> None:
+    waiting_room = WaitingRoom(timeout=0.2, db=FakeRedis())
+    assert waiting_room.join("tmp_client_a") == ("", None)
+    session_id, match = waiting_room.join("tmp_client_b")
+    assert match is not None and match.client_ids == ["tmp_client_a", "tmp_client_b"]
+    assert session_id == match.session_ids[1]
+    # the partner picks up its session id on its next poll
+    assert waiting_room.join("tmp_client_a") == (match.session_ids[0], None)
+    assert len(waiting_room) == 0
+
+    # a client alone for longer than the timeout plays solo
+    assert waiting_room.join("tmp_client_c") == ("", None)
+    time.sleep(0.3)
+    session_id, match = waiting_room.join("tmp_client_c")
+    assert match == WaitingRoomMatch(
+        client_ids=["tmp_client_c"], session_ids=[session_id]
+    )
+
+
+def test_waiting_room_concurrent_clients() -> None:
+    # clients polling concurrently, as the chat server sees them; see
+    # examples/benchmark_waiting_room.py for thousands of them against a real Redis
+    waiting_room = WaitingRoom(timeout=3600, db=FakeRedis())
+    client_ids = [f"tmp_client_{uuid.uuid4()}" for _ in range(40)]
+    matches: list[WaitingRoomMatch] = []
+
+    def poll_until_matched(client_id: str) -> str:
+        while True:
+            session_id, match = waiting_room.join(client_id)
+            if match is not None:
+                matches.append(match)
+            if session_id:
+                return session_id
+            time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=len(client_ids)) as executor:
+        session_ids = list(executor.map(poll_until_matched, client_ids))
+
+    # everyone is paired exactly once, with the session id of their match
+    assert len(set(session_ids)) == len(client_ids)
+    assert all(len(match.client_ids) == 2 for match in matches)
+    assert Counter(
+        client_id for match in matches for client_id in match.client_ids
+    ) == Counter(client_ids)
+    assert {session_id for match in matches for session_id in match.session_ids} == set(
+        session_ids
+    )
+    assert len(waiting_room) == 0
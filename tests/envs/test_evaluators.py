@@ -1,4 +1,6 @@
 import asyncio
+import random
+from typing import Any, get_args
 
 import pytest
 
@@ -8,7 +10,14 @@ from sotopia.envs.evaluators import (
     RuleBasedTerminatedEvaluator,
     unweighted_aggregate_evaluate,
 )
-from sotopia.messages import AgentAction, ScriptBackground, SimpleMessage
+from sotopia.messages import (
+    ActionType,
+    AgentAction,
+    MessageLog,
+    ScriptBackground,
+    SimpleMessage,
+)
+from sotopia.utils import trusted_internal_calls
 from pydantic import BaseModel, Field
 
 
@@ -52,6 +61,38 @@ def test_rule_based_teminated_evaluator() -> None:
     )
 
 
+def test_rule_based_terminated_evaluator_message_log() -> None:
+    rng = random.Random(0)
+    action_types: list[ActionType] = list(get_args(ActionType))
+    evaluator = RuleBasedTerminatedEvaluator(max_turn_number=30, max_stale_turn=2)
+    stale_episodes = 0
+    for _ in range(100):
+        messages = MessageLog([("Environment", SimpleMessage(message="Background"))])
+        for turn_number in range(1, 30):
+            messages.append(
+                ("Environment", SimpleMessage(message=f"Turn #{turn_number}"))
+            )
+            for agent in ["Alice", "Bob"]:
+                action_type = rng.choices(action_types, weights=[4, 8, 1, 1, 0.2], k=1)[
+                    0
+                ]
+                messages.append(
+                    (agent, AgentAction(action_type=action_type, argument=""))
+                )
+            # validation would copy the log into a plain list
+            with trusted_internal_calls():
+                response = evaluator(turn_number=turn_number, messages=messages)
+            # the stale streak of the log agrees with a backward scan of the list
+            assert response == evaluator(
+                turn_number=turn_number, messages=list(messages)
+            )
+            (_, terminated), reasons = response[0][1]
+            if terminated:
+                stale_episodes += "The conversation stales for too long; " in reasons
+                break
+    assert stale_episodes > 0
+
+
 def test_unweighted_aggregate_evaluate() -> None:
     # Create some response objects
     response1 = (
@@ -84,6 +125,19 @@ def test_unweighted_aggregate_evaluate() -> None:
     assert result.p2_rate[0] == pytest.approx(5)
 
 
+def test_unweighted_aggregate_evaluate_validates_internal_calls() -> None:
+    responses: list[Any] = [("agent_1", (("believability", "5"), "reasoning"))]
+    # a public call validates and coerces the score
+    result = unweighted_aggregate_evaluate(responses)
+    assert isinstance(result.p1_rate, tuple)
+    assert result.p1_rate[0] == pytest.approx(5)
+    # the evaluator outputs are validated even on an internal call
+    with trusted_internal_calls():
+        result = unweighted_aggregate_evaluate(responses)
+    assert isinstance(result.p1_rate, tuple)
+    assert result.p1_rate[0] == pytest.approx(5)
+
+
 # Async tests
 @pytest.mark.asyncio
 async def test_rule_based_teminated_evaluator_async() -> None:
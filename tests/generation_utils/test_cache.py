@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import fakeredis
+import pytest
+
+from sotopia.generation_utils.cache import (
+    LLMResponseCache,
+    MemoryCache,
+    RedisCache,
+    SQLiteCache,
+    make_cache_key,
+)
+
+
+def test_make_cache_key() -> None:
+    key = make_cache_key("gpt-4o", "prompt", 0.0, None, "PydanticOutputParser")
+    assert key == make_cache_key("gpt-4o", "prompt", 0.0, None, "PydanticOutputParser")
+    assert key != make_cache_key("gpt-4o", "prompt", 0.7, None, "PydanticOutputParser")
+
+
+def test_memory_cache_lru_and_ttl() -> None:
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    # "b" is the least recently used entry
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    cache.set("d", "4", ttl=-1)
+    assert cache.get("d") is None
+
+
+def test_sqlite_cache_persists(tmp_path: Path) -> None:
+    path = str(tmp_path / "llm_cache.sqlite")
+    SQLiteCache(path).set("key", "value")
+    assert SQLiteCache(path).get("key") == "value"
+    SQLiteCache(path).set("expired", "value", ttl=-1)
+    assert SQLiteCache(path).get("expired") is None
+
+
+def test_redis_cache_sub_second_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr("redis.from_url", lambda url: client)
+    cache = RedisCache()
+    cache.set("key", "value", ttl=0.5)
+    assert cache.get("key") == "value"
+    assert 0 < client.pttl("sotopia:llm_cache:key") <= 500
+    cache.set("forever", "value")
+    assert client.pttl("sotopia:llm_cache:forever") == -1
+
+
+def test_tiered_cache_backfills_and_counts(tmp_path: Path) -> None:
+    memory = MemoryCache()
+    sqlite = SQLiteCache(str(tmp_path / "llm_cache.sqlite"))
+    sqlite.set("key", "value")
+    cache = LLMResponseCache([memory, sqlite])
+    assert cache.get("missing") is None
+    assert cache.get("key") == "value"
+    assert memory.get("key") == "value"
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+    assert cache.stats["sqlite_hits"] == 1
+    assert cache.should_cache(0.0)
+    assert not cache.should_cache(0.7)
+
+
+def test_sqlite_cache_batches_access_times(tmp_path: Path) -> None:
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = SQLiteCache(path)
+    cache.set("key", "value")
+    accessed_at = cache._conn.execute("SELECT accessed_at FROM llm_cache").fetchone()
+    assert cache.get("key") == "value"
+    # a hit does not write until the next set
+    assert cache._accessed_at
+    cache.set("other", "value")
+    assert not cache._accessed_at
+    assert (
+        cache._conn.execute(
+            "SELECT accessed_at FROM llm_cache WHERE key = 'key'"
+        ).fetchone()[0]
+        > accessed_at[0]
+    )
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache_async(tmp_path: Path) -> None:
+    memory = MemoryCache()
+    sqlite = SQLiteCache(str(tmp_path / "llm_cache.sqlite"))
+    cache = LLMResponseCache([memory, sqlite])
+    await cache.aset("key", "value")
+    assert sqlite.get("key") == "value"
+    memory.clear()
+    assert await cache.aget("key") == "value"
+    assert memory.get("key") == "value"
+    assert await cache.aget("missing") is None
+    assert cache.stats == {"hits": 1, "sqlite_hits": 1, "misses": 1}
@@ -1,8 +1,11 @@
 import pytest
+from types import SimpleNamespace
 from typing import Any
 
+from sotopia.generation_utils import generate
 from sotopia.generation_utils.generate import (
     agenerate,
+    agenerate_action,
 )
 
 from sotopia.messages import AgentAction
@@ -63,3 +66,47 @@ async def test_agenerate_structured_output() -> None:
         structured_output=True,
     )
     assert isinstance(output, AgentAction)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("script_like", [False, True])
+async def test_prefix_stable_prompts_share_the_history(
+    monkeypatch: pytest.MonkeyPatch, script_like: bool
+) -> None:
+    prompts: list[str] = []
+
+    async def fake_acompletion(**kwargs: Any) -> Any:
+        prompts.append(kwargs["messages"][0]["content"])
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(
+                        content=AgentAction(
+                            action_type="speak", argument="Hi"
+                        ).model_dump_json()
+                    )
+                )
+            ],
+            usage=None,
+        )
+
+    monkeypatch.setattr(generate, "acompletion", fake_acompletion)
+    history = "Here is the context of the interaction:\nAlice wants to borrow a book."
+    for turn_number in range(2):
+        await agenerate_action(
+            "gpt-4o-mini",
+            history=history,
+            turn_number=turn_number,
+            action_types=["none", "speak", "leave"],
+            agent="Alice",
+            goal="borrow a book",
+            script_like=script_like,
+            prompt_layout="prefix_stable",
+        )
+        history += f"\nTurn #{turn_number}: Alice said: Hi"
+    # the second turn only appends to the first turn's prompt up to the end of its history
+    first, second = prompts
+    history_end = first.index("borrow a book.") + len("borrow a book.")
+    assert second[:history_end] == first[:history_end]
+    assert "format_instructions" not in first
+    assert '"action_type"' in first[:history_end]
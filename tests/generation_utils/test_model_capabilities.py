@@ -0,0 +1,64 @@
+import pytest
+
+from sotopia.generation_utils import model_capabilities
+from sotopia.generation_utils.model_capabilities import (
+    get_model_capabilities,
+    warm_model_capabilities,
+)
+
+
+def test_custom_model_capabilities(monkeypatch: pytest.MonkeyPatch) -> None:
+    capabilities = get_model_capabilities(
+        "custom/structured-llama3.2:1b@http://localhost:8000/v1"
+    )
+    assert capabilities.model == "openai/structured-llama3.2:1b"
+    assert capabilities.base_url == "http://localhost:8000/v1"
+    assert capabilities.structured_output
+    # the API key is read when it is used, not when the model is first resolved
+    monkeypatch.setenv("CUSTOM_API_KEY", "first")
+    assert capabilities.api_key == "first"
+    monkeypatch.setenv("CUSTOM_API_KEY", "second")
+    assert (
+        get_model_capabilities(
+            "custom/structured-llama3.2:1b@http://localhost:8000/v1"
+        ).api_key
+        == "second"
+    )
+    assert not get_model_capabilities(
+        "custom/llama3.2:1b@http://localhost:8000/v1"
+    ).structured_output
+
+
+def test_model_capabilities_are_memoized() -> None:
+    get_model_capabilities.cache_clear()
+    warm_model_capabilities(["gpt-4o-mini", "gpt-4o-mini"])
+    assert get_model_capabilities.cache_info().currsize == 1
+    capabilities = get_model_capabilities("gpt-4o-mini")
+    assert get_model_capabilities.cache_info().hits == 1
+    assert capabilities.base_url is None
+    assert capabilities.api_key is None
+    assert capabilities.supports_response_format
+    assert capabilities.supports_response_schema
+
+
+def test_structured_output_support_is_looked_up_lazily(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    lookups: list[str] = []
+
+    def get_supported_openai_params(model: str) -> list[str]:
+        lookups.append(model)
+        return ["response_format"]
+
+    monkeypatch.setattr(
+        model_capabilities, "get_supported_openai_params", get_supported_openai_params
+    )
+    get_model_capabilities.cache_clear()
+    capabilities = get_model_capabilities("unknown-model")
+    assert capabilities.model == "unknown-model"
+    assert not capabilities.structured_output
+    assert lookups == []
+    assert capabilities.supports_response_format
+    assert capabilities.supports_response_format
+    assert lookups == ["unknown-model"]
+    get_model_capabilities.cache_clear()
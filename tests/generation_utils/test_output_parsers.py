@@ -0,0 +1,74 @@
+import pytest
+from pydantic import BaseModel
+
+from sotopia.generation_utils.output_parsers import (
+    PydanticOutputParser,
+    decode_json_object,
+    get_output_parse_stats,
+)
+
+
+class Reply(BaseModel):
+    action_type: str
+    argument: str
+
+
+@pytest.mark.parametrize(
+    "output, rung",
+    [
+        ('{"action_type": "speak", "argument": "hi"}', "strict"),
+        ('```json\n{"action_type": "speak", "argument": "hi"}\n```', "code_fence"),
+        (
+            'Sure! Here is my action: {"action_type": "speak", "argument": "hi"} Hope it helps.',
+            "surrounding_text",
+        ),
+        ('{"action_type": "speak", "argument": "hi",}', "trailing_commas"),
+        ("{'action_type': 'speak', 'argument': 'hi'}", "single_quotes"),
+        ('{"action_type": "speak", "argument": "hi', "truncated"),
+    ],
+)
+def test_decode_json_object_repair_ladder(output: str, rung: str) -> None:
+    assert decode_json_object(output) == (
+        {"action_type": "speak", "argument": "hi"},
+        rung,
+    )
+
+
+def test_decode_json_object_keeps_string_contents() -> None:
+    decoded, rung = decode_json_object(
+        "{'action_type': 'speak', 'argument': \"it's \\\"fine\\\", {ok}\"}"
+    )
+    assert decoded == {"action_type": "speak", "argument": 'it\'s "fine", {ok}'}
+    assert rung == "single_quotes"
+    decoded, rung = decode_json_object('{"a": [1, {"b": "c\\"')
+    assert decoded == {"a": [1, {"b": 'c"'}]}
+    assert rung == "truncated"
+    # commas and braces inside strings are left alone
+    decoded, rung = decode_json_object(
+        '{"action_type": "speak", "argument": "wait, ] and , }",}'
+    )
+    assert decoded == {"action_type": "speak", "argument": "wait, ] and , }"}
+    assert rung == "trailing_commas"
+    decoded, rung = decode_json_object(
+        '{"action_type": "speak", "argument": "Hello {name}, how are'
+    )
+    assert decoded == {"action_type": "speak", "argument": "Hello {name}, how are"}
+    assert rung == "truncated"
+    decoded, rung = decode_json_object(
+        'Action: {"action_type": "speak", "argument": "a } b"} (I said {hi})'
+    )
+    assert decoded == {"action_type": "speak", "argument": "a } b"}
+    assert rung == "surrounding_text"
+
+
+def test_pydantic_output_parser_records_rungs() -> None:
+    parser: PydanticOutputParser[Reply] = PydanticOutputParser(pydantic_object=Reply)
+    stats = get_output_parse_stats()
+    assert parser.parse(
+        '{"properties": {"action_type": "speak", "argument": "hi"}}'
+    ) == Reply(action_type="speak", argument="hi")
+    with pytest.raises(ValueError):
+        parser.parse('{"action_type": "speak"}')
+    new_stats = get_output_parse_stats()
+    assert new_stats["properties"] == stats.get("properties", 0) + 1
+    assert new_stats["failed"] == stats.get("failed", 0) + 1
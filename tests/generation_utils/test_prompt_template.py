@@ -0,0 +1,46 @@
+from sotopia.generation_utils.output_parsers import (
+    EnvResponse,
+    PydanticOutputParser,
+)
+from sotopia.generation_utils.prompt_template import compile_template
+from sotopia.utils import format_docstring
+
+
+def test_compiled_template_matches_replace() -> None:
+    template = """
+        Imagine you are {agent}, your task is to act/speak as {agent} would.
+        Here is the context: {history}
+        Your output should follow: {format_instructions}
+        Keep JSON braces like {"a": 1} and unknown slots like {missing} as they are.
+    """
+    input_values = {
+        "agent": "Alice",
+        "history": "Turn #1\n    Bob said: hi",
+        "format_instructions": '{"type": "object"}',
+    }
+    expected = format_docstring(template)
+    for key, value in input_values.items():
+        expected = expected.replace(f"{{{key}}}", value)
+
+    compiled = compile_template(template)
+    assert compiled.render(input_values) == expected
+    assert compiled.slots == [
+        "agent",
+        "agent",
+        "history",
+        "format_instructions",
+        "missing",
+    ]
+    assert compile_template(template) is compiled
+
+
+def test_format_instructions_are_cached() -> None:
+    parser: PydanticOutputParser[EnvResponse] = PydanticOutputParser(
+        pydantic_object=EnvResponse
+    )
+    instructions = parser.get_format_instructions()
+    assert (
+        instructions
+        is PydanticOutputParser(pydantic_object=EnvResponse).get_format_instructions()
+    )
+    assert '"p1_rate"' in instructions
@@ -0,0 +1,151 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from sotopia.generation_utils.rate_limiter import (
+    RateLimiter,
+    TokenBucket,
+    get_rate_limiter,
+    get_rate_limiter_stats,
+    reset_rate_limiters,
+    set_rate_limit_share,
+)
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def test_token_bucket_wait_time() -> None:
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    # one token per second
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_caps_concurrency() -> None:
+    limiter = RateLimiter("test", max_concurrency=2)
+    running = 0
+    max_running = 0
+
+    async def call() -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return 1
+
+    results = await asyncio.gather(*[limiter.run(call) for _ in range(6)])
+    assert results == [1] * 6
+    assert max_running == 2
+    assert limiter.stats["requests"] == 6
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_retries_rate_limit_errors() -> None:
+    limiter = RateLimiter("test", max_retries=2, backoff_base=0.01)
+    attempts = 0
+
+    async def call() -> str:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeRateLimitError()
+        return "ok"
+
+    assert await limiter.run(call) == "ok"
+    assert limiter.stats["rate_limited"] == 2
+    assert limiter.stats["retries"] == 2
+
+    with pytest.raises(ValueError):
+
+        async def failing_call() -> str:
+            raise ValueError()
+
+        await limiter.run(failing_call)
+    assert limiter.stats["errors"] == 1
+
+
+def test_get_rate_limiter_shares_provider_limits() -> None:
+    reset_rate_limiters()
+    limits = {"together_ai": {"requests_per_minute": 10}}
+    limiter_a = get_rate_limiter("together_ai/model-a", limits=limits)
+    limiter_b = get_rate_limiter("together_ai/model-b", limits=limits)
+    assert limiter_a is limiter_b
+    assert limiter_a.request_bucket is not None
+    assert get_rate_limiter("gpt-4o-mini", limits=limits) is not limiter_a
+    reset_rate_limiters()
+
+
+def test_get_rate_limiter_keys_custom_endpoints_by_base_url() -> None:
+    reset_rate_limiters()
+    limits = {
+        "openai": {"requests_per_minute": 10},
+        "http://localhost:8000/v1": {"max_concurrency": 4},
+    }
+    local = get_rate_limiter(
+        "custom/llama3.2:1b@http://localhost:8000/v1", limits=limits
+    )
+    assert local is get_rate_limiter(
+        "custom/structured-llama3.2:1b@http://localhost:8000/v1", limits=limits
+    )
+    assert local.max_concurrency == 4
+    assert local is not get_rate_limiter("openai/gpt-4o", limits=limits)
+    other = get_rate_limiter(
+        "custom/llama3.2:1b@http://localhost:8001/v1", limits=limits
+    )
+    assert other is not local and other.request_bucket is None
+    reset_rate_limiters()
+
+
+def test_set_rate_limit_share() -> None:
+    set_rate_limit_share(0.25)
+    try:
+        limiter = get_rate_limiter("gpt-4o", requests_per_minute=400, max_concurrency=2)
+        assert limiter.request_bucket is not None
+        assert limiter.request_bucket.capacity == 100
+        assert limiter.token_bucket is None
+        assert limiter.max_concurrency == 1
+    finally:
+        set_rate_limit_share(1.0)
+
+
+@pytest.mark.asyncio
+async def test_acompletion_counts_cached_prompt_tokens(monkeypatch: Any) -> None:
+    from sotopia.generation_utils import generate
+
+    async def fake_acompletion(**kwargs: Any) -> Any:
+        return SimpleNamespace(
+            usage=SimpleNamespace(
+                total_tokens=1200,
+                prompt_tokens=1000,
+                prompt_tokens_details=SimpleNamespace(cached_tokens=768),
+            )
+        )
+
+    monkeypatch.setattr(generate, "acompletion", fake_acompletion)
+    reset_rate_limiters()
+    await generate._acompletion(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}]
+    )
+    await generate._acompletion(
+        model="openai/llama3.2:1b",
+        messages=[{"role": "user", "content": "hi"}],
+        rate_limit_key="custom/llama3.2:1b@http://localhost:8000/v1",
+    )
+    stats = get_rate_limiter_stats()["gpt-4o-mini"]
+    assert stats["prompt_tokens"] == 1000
+    assert stats["cached_prompt_tokens"] == 768
+    assert "openai/llama3.2:1b" not in get_rate_limiter_stats()
+    assert (
+        get_rate_limiter_stats()["custom/llama3.2:1b@http://localhost:8000/v1"][
+            "prompt_tokens"
+        ]
+        == 1000
+    )
+    reset_rate_limiters()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from sotopia.generation_utils.single_flight import (
+    SingleFlight,
+    get_single_flight,
+    get_single_flight_key_stats,
+    get_single_flight_stats,
+    reset_single_flight,
+)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_identical_requests() -> None:
+    single_flight: SingleFlight[str] = SingleFlight()
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        call_number = calls
+        await asyncio.sleep(0.05)
+        return f"result {call_number}"
+
+    results = await asyncio.gather(
+        *[single_flight.run("a", call) for _ in range(5)],
+        single_flight.run("b", call),
+    )
+    assert calls == 2
+    assert results[:5] == ["result 1"] * 5
+    assert results[5] == "result 2"
+    assert single_flight.stats == {"requests": 2, "coalesced": 4}
+    assert single_flight.key_stats["a"] == {"requests": 1, "coalesced": 4}
+    assert single_flight.key_stats["b"] == {"requests": 1}
+
+    # a finished request is not reused
+    assert await single_flight.run("a", call) == "result 3"
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors_and_cancellation() -> None:
+    single_flight: SingleFlight[str] = SingleFlight()
+
+    async def failing_call() -> str:
+        await asyncio.sleep(0.05)
+        raise ValueError("bad request")
+
+    results = await asyncio.gather(
+        *[single_flight.run("a", failing_call) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+    async def slow_call() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    # cancelling the caller that started the request does not cancel it for the others
+    first = asyncio.ensure_future(single_flight.run("b", slow_call))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(single_flight.run("b", slow_call))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+
+
+def test_single_flight_config() -> None:
+    reset_single_flight()
+    assert get_single_flight(enabled=False) is None
+    assert get_single_flight_stats() == {}
+    assert get_single_flight_key_stats() == {}
+    single_flight = get_single_flight()
+    assert single_flight is not None
+    assert single_flight.should_coalesce(0.0)
+    assert not single_flight.should_coalesce(0.7)
+    assert get_single_flight() is single_flight
+
+    reset_single_flight()
+    single_flight = get_single_flight(temperature_zero_only=False, max_tracked_keys=2)
+    assert single_flight is not None
+    assert single_flight.should_coalesce(0.7)
+
+    async def call() -> str:
+        return "result"
+
+    async def run_all() -> None:
+        for key in ["a", "b", "c"]:
+            await single_flight.run(key, call)
+
+    asyncio.run(run_all())
+    assert list(single_flight.key_stats) == ["b", "c"]
+    assert get_single_flight_stats() == {"requests": 3}
+    assert get_single_flight_key_stats() == {"b": {"requests": 1}, "c": {"requests": 1}}
+    reset_single_flight()
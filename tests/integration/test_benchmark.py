@@ -1,14 +1,17 @@
-from sotopia.cli.benchmark.benchmark import get_avg_reward
+from sotopia.cli.benchmark.benchmark import get_avg_reward, t_critical_value
 from sotopia.database import EpisodeLog, AgentProfile, EnvironmentProfile
 import numpy as np
+import asyncio
 import json
+from collections import Counter
+from typing import Any, Callable
 
 from unittest.mock import patch
 
 from sotopia.cli.benchmark.benchmark import (
+    arun_benchmark_pipeline,
     benchmark,
     benchmark_display,
-    run_async_benchmark_in_batch,
 )
 from unittest import mock
 from unittest.mock import create_autospec
@@ -21,6 +24,7 @@ from sotopia.messages import AgentAction, Observation
 from sotopia.samplers import (
     EnvAgentCombo,
 )
+from sotopia.server import InvalidEpisodeError
 from sotopia.envs.evaluators import (
     EvaluationForTwoAgents,
     EpisodeLLMEvaluator,
@@ -187,6 +191,29 @@ def test_get_rewards() -> None:
     ), f"In error bound, expected {gt_bound}, got {extracted_bound} on dimensions {dimensions}"
 
 
+def test_t_critical_value() -> None:
+    # two-sided 95% (and 99%) critical values from a t table
+    assert np.isclose(t_critical_value(1), 12.706, atol=1e-3)
+    assert np.isclose(t_critical_value(2), 4.303, atol=1e-3)
+    assert np.isclose(t_critical_value(19), 2.093, atol=1e-3)
+    assert np.isclose(t_critical_value(1000), 1.962, atol=1e-3)
+    assert np.isclose(t_critical_value(10, 0.99), 3.169, atol=1e-3)
+
+
+def test_get_rewards_bootstrap() -> None:
+    target_episodes = get_mock_episodes()
+
+    test_rewards = get_avg_reward(
+        target_episodes, model_name, ci_method="bootstrap", seed=0
+    )
+    assert test_rewards["episode_count"][0] == len(target_episodes)
+    assert [test_rewards[dim][0] for dim in dimensions] == [7.0 for _ in dimensions]
+    # the episodes only take two values, 7 - d and 7 + d, half of the time each
+    for i, dim in enumerate(dimensions):
+        sem = abs(7.0 - i) / np.sqrt(len(target_episodes))
+        assert np.isclose(test_rewards[dim][1], 1.96 * sem, rtol=0.15)
+
+
 mock_delete_function = create_autospec(lambda pk: None)
 
 
@@ -228,55 +255,75 @@ def test_initialize_benchmark_combo(
         ), f"For env_id in item {idx}, expected {resp_item.env_id}, but got {new_item.env_id}"
 
 
-# TODO fix the method assignment issue in mypy, ref: https://github.com/python/mypy/issues/2427
-def test_run_async_benchmark_in_batch() -> None:
-    return_value = get_mock_episodes()[:10]
-    return_value[0].rewards = [0.0, 0.0]
-
-    env, agents = get_mock_env_agents_profile()
-
-    with patch("sotopia.database.EpisodeLog.delete", mock_delete_function), patch(
-        "sotopia.database.EpisodeLog.find", return_value=EpisodeLog
-    ), patch("sotopia.database.EpisodeLog.all", return_value=return_value), patch(
-        "sotopia.database.AgentProfile.find", return_value=AgentProfile
-    ), patch("sotopia.database.AgentProfile.all", return_value=agents), patch(
-        "sotopia.database.AgentProfile.get",
-        return_value=lambda pk: agents[0] if pk == agents[0].pk else agents[1],
+def test_arun_benchmark_pipeline() -> None:
+    env_agent_combo_storage_index_list = [
+        (EnvAgentComboStorage(env_id=env_id, agent_ids=["John", "Jane"]), "0")
+        for env_id in ["retried_env", "failed_env", "valid_env"]
+    ]
+    valid_rewards = get_mock_episodes()[0].rewards
+    attempts: Counter[str] = Counter()
+
+    async def fake_arun_one_episode(
+        env: str,
+        agent_list: list[str],
+        episode_validator: Callable[[EpisodeLog], bool],
+        **kwargs: Any,
+    ) -> None:
+        attempts[env] += 1
+        if env == "retried_env" and attempts[env] == 2:
+            raise RuntimeError("the model call failed")
+        # the evaluator falls back to float rewards when it fails to rate the episode
+        failed_evaluation = env == "failed_env" or (
+            env == "retried_env" and attempts[env] == 1
+        )
+        episode = EpisodeLog(
+            environment=env,
+            agents=agent_list,
+            tag="test",
+            models=model_pairs[0],
+            messages=[],
+            reasoning="",
+            rewards=[0.0, 0.0] if failed_evaluation else valid_rewards,
+            rewards_prompt="",
+        )
+        if not episode_validator(episode):
+            raise InvalidEpisodeError(episode)
+
+    with patch(
+        "sotopia.cli.benchmark.benchmark._build_env_agent_combo",
+        side_effect=lambda storage, index, model_names: (
+            storage.env_id,
+            storage.agent_ids,
+        ),
     ), patch(
-        "sotopia.database.EnvironmentProfile.find", return_value=EnvironmentProfile
-    ), patch("sotopia.database.EnvironmentProfile.all", return_value=[env]), patch(
-        "sotopia.database.EnvironmentProfile.get", return_value=lambda pk: env
+        "sotopia.cli.benchmark.benchmark.arun_one_episode", fake_arun_one_episode
     ):
-        assert (
-            len(EpisodeLog.find().all()) == 10
-        ), f"Expected 10 episodes in the database, but got {len(EpisodeLog.find().all())}"
-
-        env_agent_combo_list = [
-            compose_env_agent_combo(
-                env_profile=env,
-                agent_profiles=agents,
+        failed = asyncio.run(
+            arun_benchmark_pipeline(
+                env_agent_combo_storage_index_list=env_agent_combo_storage_index_list,
+                model_names={
+                    "env": "eval_model",
+                    "test_model": "test_model",
+                    "partner_model": "not_test_model",
+                },
+                max_concurrency=2,
+                max_attempts=3,
+                tag="test",
             )
-        ]
-
-        run_async_benchmark_in_batch(
-            env_agent_combo_list=env_agent_combo_list,
-            batch_size=1,
-            push_to_db=False,
-            tag="test",
         )
 
-        assert (
-            mock_delete_function.call_count == 1
-        ), f"Expected 1 call to delete, but got {mock_delete_function.call_count}"
+    # invalid and raising attempts are retried, up to `max_attempts` runs per combo
+    assert attempts == {"retried_env": 3, "failed_env": 3, "valid_env": 1}
+    assert failed == [env_agent_combo_storage_index_list[1]]
 
 
 mock_initialize = create_autospec(lambda: [])
 
 
 @patch("sotopia.cli.benchmark.benchmark.initialize_benchmark_combo")
-@patch("sotopia.cli.benchmark.benchmark.run_async_benchmark_in_batch")
+@patch("sotopia.cli.benchmark.benchmark.arun_benchmark_pipeline")
 def test_sotopia_benchmark(
-    mock_run_async_benchmark_in_batch: mock.Mock,
+    mock_arun_benchmark_pipeline: mock.Mock,
     mock_initialize_benchmark_combo: mock.Mock = mock_initialize,
 ) -> None:
     # Mainly test the benchmark workflow; Assume the benchmark_combo is correct
@@ -297,6 +344,7 @@ def test_sotopia_benchmark(
             only_show_performance=False,
             output_to_jsonl=False,
             push_to_db=False,
+            workers=1,
         )
         mock_initialize_benchmark_combo.assert_called_once_with("")
 
@@ -0,0 +1,32 @@
+import copy
+
+import pytest
+
+from sotopia.messages import AgentAction, MessageLog, SimpleMessage
+
+
+def test_message_log() -> None:
+    log = MessageLog([("Environment", SimpleMessage(message="Background"))])
+    log.append(("Environment", SimpleMessage(message="Turn #1")))
+    log.append(("Alice", AgentAction(action_type="speak", argument="Hi")))
+    log.extend(
+        [
+            ("Environment", SimpleMessage(message="Turn #2")),
+            ("Bob", AgentAction(action_type="none", argument="")),
+        ]
+    )
+    assert isinstance(log, list) and len(log) == 5
+    assert log.texts(2) == ['said: "Hi"', "Turn #2", "did nothing"]
+    # environment messages do not break the run of "none" actions
+    log.append(("Environment", SimpleMessage(message="Turn #3")))
+    log.append(("Alice", AgentAction(action_type="none", argument="")))
+    assert log.stale_streak == 2
+
+    log.append(("Bob", AgentAction(action_type="leave", argument="")))
+    assert log.stale_streak == 0
+
+    with pytest.raises(TypeError):
+        log.pop()
+    copied = copy.deepcopy(log)
+    assert isinstance(copied, MessageLog)
+    assert copied == log and copied.texts() == log.texts()
@@ -57,6 +57,31 @@ def test_nested_visibility() -> None:
     )
 
 
+def test_plain_text_and_cached_render() -> None:
+    renderer = XMLRenderer()
+    assert renderer("plain text", RenderContext(viewer="agent_0")) == "plain text"
+    assert renderer("plain text", RenderContext(viewer="environment")) == "plain text"
+    assert renderer("plain text", RenderContext.model_construct(viewer="other")) == ""
+    # text the xml parser does not keep as it is goes through lxml
+    assert renderer("a\x0bb\x00c", RenderContext(viewer="agent_0")) == "abc"
+    assert renderer("a]]>b", RenderContext(viewer="agent_0")) == "]>b"
+    for _ in range(2):
+        assert (
+            renderer(
+                "a<p viewer='agent_1'>b</p>c",
+                RenderContext(viewer="agent_0"),
+            )
+            == "ac"
+        )
+        assert (
+            renderer(
+                "a<p viewer='agent_1'>b</p>c",
+                RenderContext(viewer="agent_1"),
+            )
+            == "abc"
+        )
+
+
 def test_renderer_in_env() -> None:
     env = ParallelSotopiaEnv(
         env_profile=EnvironmentProfile(
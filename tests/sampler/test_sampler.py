@@ -1,5 +1,5 @@
 import random
-from typing import Any, Generator
+from typing import Any, Generator, Iterable
 
 import pytest
 
@@ -9,10 +9,16 @@ from sotopia.database.persistent_profile import (
     AgentProfile,
     EnvironmentProfile,
     RelationshipProfile,
+    RelationshipType,
 )
 from sotopia.envs.evaluators import RuleBasedTerminatedEvaluator
 from sotopia.messages import AgentAction, Observation
 from sotopia.samplers import ConstraintBasedSampler, UniformSampler
+from sotopia.samplers.filter_based_sampler import (
+    FilterBasedSampler,
+    age_filter,
+    occupation_filter,
+)
 
 
 @pytest.fixture
@@ -184,3 +190,96 @@ def test_constrain_sampler(
     )
     agents = Agents({agent.agent_name: agent for agent in agent_list})
     env.reset(agents=agents)
+
+
+def test_filter_sampler_filters_in_memory(
+    _test_create_episode_log_setup_and_tear_down: Any,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sampler = FilterBasedSampler[Observation, AgentAction](
+        env_candidates=["tmppk_environment"],
+        agent_candidates=["tmppk_agent1", "tmppk_agent2", "tmppk_agent3"],
+        filter_func=[
+            lambda agent: agent.first_name == "John",
+            lambda agent: (
+                age_filter(agent, "[(0, 10)]")
+                and not occupation_filter(agent, "'Doctor'")
+            ),
+        ],
+    )
+
+    def get(pk: str) -> AgentProfile:
+        raise AssertionError(f"{pk} should have been prefetched")
+
+    # the candidates are loaded in bulk before any filter runs
+    monkeypatch.setattr(AgentProfile, "get", get)
+    for _, agent_list in sampler.sample(
+        agent_classes=[LLMAgent] * 2,
+        replacement=False,
+        size=5,
+        agents_params=[{"model_name": "gpt-4o-mini"}] * 2,
+    ):
+        assert agent_list[0].profile.pk == "tmppk_agent1"
+        assert agent_list[1].profile.pk in ["tmppk_agent2", "tmppk_agent3"]
+
+
+def test_relationship_index(
+    _test_create_episode_log_setup_and_tear_down: Any,
+) -> None:
+    AgentProfile(first_name="Old", last_name="Doe", age=65, pk="tmppk_agent_old").save()
+    index = ConstraintBasedSampler[Observation, AgentAction]().relationship_index
+    index.refresh()
+    pairs = index.query(RelationshipType.acquaintance, "[(18, 70), (18, 70)]")
+    assert ["tmppk_agent1", "tmppk_agent2"] in pairs
+    assert ["tmppk_agent1", "tmppk_agent3"] in pairs
+    assert ["tmppk_agent1", "tmppk_agent_old"] not in pairs
+
+    # relationships added later are picked up by an update
+    RelationshipProfile(
+        agent_1_id="tmppk_agent1",
+        agent_2_id="tmppk_agent_old",
+        relationship=2,
+        pk="tmppk_relationship_old",
+    ).save()
+    index.update()
+    assert index.query(RelationshipType.acquaintance, "[(0, 10), (60, 70)]") == [
+        ["tmppk_agent1", "tmppk_agent_old"]
+    ]
+    assert index.query(RelationshipType.acquaintance, "[(0, 10), (18, 30)]") == []
+
+    # edited agent ages are picked up by a refresh
+    AgentProfile(first_name="Old", last_name="Doe", age=25, pk="tmppk_agent_old").save()
+    index.update()
+    assert index.query(RelationshipType.acquaintance, "[(0, 10), (18, 30)]") == []
+    index.refresh()
+    assert index.query(RelationshipType.acquaintance, "[(0, 10), (18, 30)]") == [
+        ["tmppk_agent1", "tmppk_agent_old"]
+    ]
+
+    RelationshipProfile.delete("tmppk_relationship_old")
+    AgentProfile.delete("tmppk_agent_old")
+    index.update()
+    assert ["tmppk_agent1", "tmppk_agent_old"] not in index.query(
+        RelationshipType.acquaintance
+    )
+
+
+def test_relationship_index_update_loads_new_pks(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    index = ConstraintBasedSampler[Observation, AgentAction]().relationship_index
+    added: list[set[str]] = []
+
+    def fake_add(pks: Iterable[str], refresh: bool) -> None:
+        assert not refresh
+        added.append(set(pks))
+        index._indexed_pks.update(pks)
+
+    monkeypatch.setattr(index, "_add", fake_add)
+    pks = ["a", "b"]
+    monkeypatch.setattr(RelationshipProfile, "all_pks", lambda: iter(pks))
+    index.update()
+    pks = ["b", "c"]
+    index.update()
+    assert added == [{"a", "b"}, {"c"}]
+    assert len(index) == 2
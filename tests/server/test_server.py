@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from sotopia import server
+from sotopia.messages import AgentAction, Observation, SimpleMessage
+
+
+@pytest.mark.asyncio
+async def test_arun_episodes_with_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    running = 0
+    max_running = 0
+    cancelled: list[int] = []
+
+    async def fake_arun_one_episode(env: int, **kwargs: Any) -> Any:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        try:
+            # later combos finish first
+            await asyncio.sleep(0.01 * (10 - env))
+        except asyncio.CancelledError:
+            cancelled.append(env)
+            raise
+        finally:
+            running -= 1
+        return [("Environment", "agent", SimpleMessage(message=str(env)))]
+
+    monkeypatch.setattr(server, "arun_one_episode", fake_arun_one_episode)
+
+    def combos() -> Any:
+        return ((env, []) for env in range(10))
+
+    results = [
+        result
+        async for result in server.arun_episodes_with_limit(combos(), max_concurrency=3)
+    ]
+    envs = [int(result[0][2].to_natural_language()) for result in results]
+    assert max_running == 3
+    assert sorted(envs) == list(range(10))
+    # results come in completion order
+    assert envs[:3] != [0, 1, 2]
+
+    # closing the generator early cancels and awaits the episodes in flight
+    episodes = server.arun_episodes_with_limit(combos(), max_concurrency=3)
+    await episodes.__anext__()
+    await episodes.aclose()
+    assert running == 0
+    assert len(cancelled) == 2
+
+
+class FakeAgent(object):
+    def __init__(self, agent_name: str) -> None:
+        self.agent_name = agent_name
+        self.profile = SimpleNamespace(pk=agent_name)
+        self.model_name = "gpt-4o-mini"
+        self.goal = ""
+
+    def reset(self) -> None:
+        pass
+
+    async def aact(self, obs: Observation) -> AgentAction:
+        return AgentAction(action_type="leave", argument="")
+
+
+class FakeEnv(object):
+    agents = ["agent_1", "agent_2"]
+    profile = SimpleNamespace(pk="env", agent_goals=["goal 1", "goal 2"])
+    model_name = "gpt-4o-mini"
+
+    def _observations(self) -> dict[str, Observation]:
+        return {
+            agent_name: Observation(
+                last_turn="", turn_number=0, available_actions=["leave"]
+            )
+            for agent_name in self.agents
+        }
+
+    def reset(self, **kwargs: Any) -> dict[str, Observation]:
+        return self._observations()
+
+    async def astep(self, actions: dict[str, AgentAction]) -> tuple[Any, ...]:
+        return (
+            self._observations(),
+            {agent_name: 0.0 for agent_name in self.agents},
+            {agent_name: True for agent_name in self.agents},
+            {},
+            {
+                agent_name: {"comments": "", "complete_rating": 0.0}
+                for agent_name in self.agents
+            },
+        )
+
+
+@pytest.mark.asyncio
+async def test_arun_one_episode_save_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    save_error: Exception | None = None
+    record_error: Exception | None = None
+    recorded: list[Any] = []
+
+    class FakeEpisodeLog(SimpleNamespace):
+        def save(self) -> None:
+            if save_error is not None:
+                raise save_error
+
+    def record_completed_episode(episode: Any) -> None:
+        if record_error is not None:
+            raise record_error
+        recorded.append(episode)
+
+    monkeypatch.setattr(server, "EpisodeLog", FakeEpisodeLog)
+    monkeypatch.setattr(server, "record_completed_episode", record_completed_episode)
+
+    async def run(**kwargs: Any) -> Any:
+        return await server.arun_one_episode(
+            env=FakeEnv(),  # type: ignore[arg-type]
+            agent_list=[FakeAgent("agent_1"), FakeAgent("agent_2")],  # type: ignore[list-item]
+            tag="test",
+            push_to_db=True,
+            **kwargs,
+        )
+
+    await run()
+    assert len(recorded) == 1
+
+    # a failed save is logged, and only raised to the callers that ask for it
+    save_error = ConnectionError("redis is down")
+    await run()
+    with pytest.raises(ConnectionError):
+        await run(raise_on_save_error=True)
+    assert len(recorded) == 1
+
+    # the episode is saved even if the ledger is not updated, it is not run again
+    save_error, record_error = None, ConnectionError("redis is down")
+    await run(raise_on_save_error=True)